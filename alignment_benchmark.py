@@ -0,0 +1,131 @@
+"""
+Benchmark of reference-word alignment: C edit distance on word IDs against
+the old set matching and pure-Python dynamic programming.
+
+Usage:
+    python alignment_benchmark.py [--sizes 10 100 1000 5000] [--error-rate 0.2]
+"""
+
+import argparse
+import random
+import time
+
+from word_alignment import word_edit_ops, word_error_rate
+
+# Pure-Python O(n * m) DP gets slow beyond this many words
+PYTHON_DP_MAX_WORDS = 1000
+
+VOCABULARY = (
+    "the a and to of in is it you that he was for on are with as his they be "
+    "at one have this from or had by word but what some we can out other were "
+    "all there when up use your how said an each she which do their time if "
+    "will way about many then them write would like so these her long make "
+    "thing see him two has look more day could go come did number sound no "
+    "most people my over know water than call first who may down side been "
+    "now find any new work part take get place made live where after back"
+).split()
+
+
+def make_pair(size, error_rate, seed=0):
+    """Reference of `size` words and a hypothesis with random edits"""
+    rng = random.Random(seed)
+    reference = [rng.choice(VOCABULARY) for _ in range(size)]
+    hypothesis = []
+    for word in reference:
+        roll = rng.random()
+        if roll < error_rate / 2:
+            hypothesis.append(rng.choice(VOCABULARY))  # substitute
+        elif roll < error_rate * 3 / 4:
+            continue  # delete
+        else:
+            hypothesis.append(word)
+            if roll > 1 - error_rate / 4:
+                hypothesis.append(rng.choice(VOCABULARY))  # insert
+    return reference, hypothesis
+
+
+def set_matching(ref_words, hyp_words):
+    """The old approach: a reference word counts once if it occurs anywhere"""
+    hyp_set = set(hyp_words)
+    matched = []
+    for word in ref_words:
+        if word in hyp_set and word not in matched:
+            matched.append(word)
+    return len(matched)
+
+
+def python_levenshtein(s1, s2):
+    """The old nested pure-Python edit distance"""
+    if len(s1) < len(s2):
+        return python_levenshtein(s2, s1)
+    if len(s2) == 0:
+        return len(s1)
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def timed(function, *args, repeat=3):
+    """Best of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def benchmark(size, error_rate):
+    reference, hypothesis = make_pair(size, error_rate, seed=size)
+
+    set_ms, set_correct = timed(set_matching, reference, hypothesis)
+    c_ms, ops = timed(word_edit_ops, reference, hypothesis)
+    correct = sum(1 for op, _, _ in ops if op == "match")
+
+    if size <= PYTHON_DP_MAX_WORDS:
+        dp_ms, distance = timed(python_levenshtein, reference, hypothesis, repeat=1)
+        errors = sum(1 for op, _, _ in ops if op != "match")
+        assert distance == errors, (distance, errors)
+        dp = f"{dp_ms:9.2f}"
+    else:
+        dp = f"{'-':>9}"
+
+    print(
+        f"{size:6d} {set_ms:9.2f} {dp} {c_ms:9.2f}"
+        f" {set_correct / size:7.1%} {correct / size:7.1%}"
+        f" {word_error_rate(ops):6.1%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 50, 100, 500, 1000, 2000, 5000],
+        help="reference lengths in words",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.2, help="share of edited words"
+    )
+    args = parser.parse_args()
+
+    print("times in ms; accuracy = matched reference words / reference words")
+    print(
+        f"{'words':>6} {'set':>9} {'python-DP':>9} {'C-ID-ops':>9}"
+        f" {'set-acc':>7} {'ops-acc':>7} {'WER':>6}"
+    )
+    for size in args.sizes:
+        benchmark(size, args.error_rate)
+
+
+if __name__ == "__main__":
+    main()
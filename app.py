@@ -1,6 +1,5 @@
 import streamlit as st
 import whisper
-from pydub import AudioSegment
 import tempfile
 import os
 from datetime import datetime, timedelta
@@ -8,7 +7,47 @@ import pandas as pd
 import plotly.graph_objects as go
 from collections import Counter
 import json
-import re
+import io
+import queue
+
+try:
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+except ImportError:  # live coach mode is optional
+    webrtc_streamer = None
+
+from audio_decode import VIDEO_FORMATS, extract_audio_track, load_audio, write_wav
+from audio_probe import CorruptAudioError, check_upload_limits, probe_audio
+from chunked_ingest import transcribe_stream, use_chunked_ingest
+from denoise import spectral_gate
+from hallucination import filtered_transcribe
+from live_coach import (
+    LIVE_MODEL_SIZE,
+    RollingTranscriber,
+    frame_to_samples,
+    to_wav_bytes,
+)
+from rescoring import RescoreJob, has_recording_details, stale_records, stored_inputs
+from scoring import (
+    analyze_speech,
+    rule_file,
+    scoring_cache_stats,
+    scoring_version,
+)
+from speculative import SpeculativeJobs, content_key
+from signal_quality import SignalMeter
+from speech_timing import speech_timing
+from whisper_cache import (
+    LANGUAGE_REJECT_PROBABILITY,
+    detect_language,
+    install_encoder_cache,
+    language_name,
+)
+from word_alignment import (
+    build_word_table,
+    create_word_timeline_chart,
+    recognition_confidence,
+    word_table_to_record,
+)
 
 # Page config
 st.set_page_config(
@@ -90,12 +129,25 @@ if "model_size" not in st.session_state:
     st.session_state.model_size = "base"
 
 
+if "speculative_jobs" not in st.session_state:
+    st.session_state.speculative_jobs = SpeculativeJobs()
+
+if "rescore_job" not in st.session_state:
+    st.session_state.rescore_job = None
+
+
 @st.cache_resource
-def load_whisper_model(model_size="base"):
-    """Load Whisper model (only once)"""
+def load_whisper_model(model_size="base", encoder_cache=True):
+    """
+    Load Whisper model (only once per size and option); the live-coach
+    model skips the encoder cache, its rolling windows never repeat
+    """
     try:
         model = whisper.load_model(model_size)
-        return model
+        if not encoder_cache:
+            return model
+        # Reuse encoder output when the same recording is scored again
+        return install_encoder_cache(model)
     except Exception as e:
         st.error(f"Error loading Whisper model: {e}")
         return None
@@ -106,651 +158,227 @@ if st.session_state.model is None:
     st.session_state.model = load_whisper_model("base")
 
 
-def convert_audio_to_wav(audio_file):
-    """Convert audio file to standard WAV format"""
+def convert_audio_to_wav(audio_file, expected_seconds=None, report=st.error):
+    """Convert audio file to standard WAV format (errors go to `report`)"""
     try:
-        audio = AudioSegment.from_file(audio_file)
-        audio = audio.set_channels(1)
-        audio = audio.set_frame_rate(16000)
+        # 16 kHz mono float32 (WAV read directly, other formats via ffmpeg)
+        audio = load_audio(audio_file, expected_seconds)
 
         # Calculate duration for speech rate
-        duration_seconds = len(audio) / 1000.0
+        duration_seconds = len(audio) / 16000.0
 
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio.export(temp_file.name, format="wav")
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+            write_wav(temp_file, audio)
         return temp_file.name, duration_seconds
     except Exception as e:
-        st.error(f"Error converting audio: {e}")
+        report(f"Error converting audio: {e}")
         return None, 0
 
 
-def transcribe_audio(audio_path, model):
-    """Transcribe audio using Whisper with confidence check"""
+def transcribe_audio(audio_path, model, denoise=False, report=st.error):
+    """Transcribe audio using Whisper with confidence check (errors go to `report`)"""
     try:
-        result = model.transcribe(audio_path, language="en", word_timestamps=True)
+        audio = load_audio(audio_path)
+
+        # Noise, clipping, loudness and energy envelope of the recording
+        # as it was made (one pass over the samples)
+        meter = SignalMeter().add(audio)
+        signal = meter.metrics()
+
+        # Optional spectral gating against fan/classroom noise
+        if denoise:
+            audio = spectral_gate(audio)
+
+        # Language check on the first window, before the full decode
+        language, language_prob = detect_language(model, audio)
+        transcription_info = {
+            "language": language,
+            "language_probability": round(language_prob, 3),
+            "signal": signal,
+            "denoised": denoise,
+        }
+        if language != "en" and language_prob >= LANGUAGE_REJECT_PROBABILITY:
+            return None, 0, None, transcription_info
+
+        # Drop hallucinated segments (repetition loops, text over silence)
+        result = filtered_transcribe(model, audio, language="en", word_timestamps=True)
+        transcription_info["removed_segments"] = (
+            result["removed_segments"] + result["truncated_segments"]
+        )
 
         # Get transcribed text
         text = result["text"].strip()
 
-        # Calculate average confidence from segments
-        avg_confidence = 0
-        if "segments" in result and len(result["segments"]) > 0:
-            confidences = []
-            for segment in result["segments"]:
-                if "no_speech_prob" in segment:
-                    # Lower no_speech_prob = higher confidence
-                    confidence = 1.0 - segment["no_speech_prob"]
-                    confidences.append(confidence)
-
-            if confidences:
-                avg_confidence = sum(confidences) / len(confidences)
-
-        return text, avg_confidence
-    except Exception as e:
-        st.error(f"Error transcribing audio: {e}")
-        return None, 0
-
-
-def calculate_speech_rate(word_count, duration_seconds):
-    """
-    Calculate speaking rate (words per second)
-    Returns: words_per_second, speed_category
-    """
-    if duration_seconds <= 0:
-        return 0, "unknown"
-
-    wps = word_count / duration_seconds
-
-    # Categorize speed
-    if wps >= 2.5:
-        category = "fast"  # Fluent speaker
-    elif wps >= 1.5:
-        category = "normal"  # Average speaker
-    elif wps >= 1.0:
-        category = "slow"  # Beginner
-    else:
-        category = "very_slow"  # Very slow
-
-    return round(wps, 2), category
-
-
-def detect_fluent_speaker(text, word_count, speech_rate_wps):
-    """
-    Detect if student is a fluent speaker
-    Criteria:
-    - Word count ≥ 30
-    - OR speech rate > 2.5 words/sec
-    - OR has complex sentence structures
-
-    Returns: (is_fluent: bool, confidence_level: str)
-    """
-    is_fluent = False
-    confidence_level = "beginner"
-
-    # Criterion 1: Word count
-    if word_count >= 30:
-        is_fluent = True
-        confidence_level = "fluent"
-
-    # Criterion 2: Speech rate
-    if speech_rate_wps >= 2.5:
-        is_fluent = True
-        confidence_level = "fluent"
+        # Keep per-word timings and probabilities (timeline + history)
+        word_table = build_word_table(result.get("segments", []))
 
-    # Criterion 3: Complex structures
-    connectors = ["because", "although", "however", "therefore", "while", "since"]
-    text_lower = text.lower()
-    connector_count = sum(1 for conn in connectors if conn in text_lower)
+        # Pauses and articulation rate: word timestamps + energy envelope
+        transcription_info["timing"] = speech_timing(word_table, meter.envelope_db())
 
-    if connector_count >= 2 and word_count >= 20:
-        is_fluent = True
-        confidence_level = "advanced"
+        # Recognition confidence: duration-weighted word probability
+        avg_confidence = recognition_confidence(word_table, result.get("segments", []))
 
-    # Intermediate level
-    if not is_fluent and word_count >= 15 and speech_rate_wps >= 1.8:
-        confidence_level = "intermediate"
-
-    return is_fluent, confidence_level
+        return text, avg_confidence, word_table, transcription_info
+    except Exception as e:
+        report(f"Error transcribing audio: {e}")
+        return None, 0, None, None
 
 
-def check_pronunciation(text, whisper_confidence, word_count, is_fluent_speaker):
+def transcribe_long_audio(
+    audio_file,
+    model,
+    duration_seconds=None,
+    denoise=False,
+    cancelled=None,
+    report=st.error,
+):
     """
-    NEW FAIR PRONUNCIATION SCORING
-
-    Fluent speakers get protection:
-    - Base score: 1.5/2 (instead of 1.0)
-    - Floor score: 1.2/2 (instead of 0.3)
-    - Less penalty for low confidence
-
-    Returns: score (0-2), level, quality_score, warnings
+    Transcribe a long upload chunk by chunk (streamed decode, VAD per
+    chunk), so memory stays flat however long the recording is.
+    `duration_seconds` comes from the container header when known.
+    Returns: (duration_seconds, transcription_result), or None
     """
-    if word_count == 0:
-        return 0, "Needs practice", whisper_confidence, ["No speech detected"]
-
-    # Detect basic quality issues
-    words = text.split()
-    warnings = []
-    quality_score = whisper_confidence
-
-    # 1. Check for very short/fragmented words
-    very_short = [w for w in words if len(re.sub(r"[^a-zA-Z]", "", w)) <= 2]
-    very_short_ratio = len(very_short) / word_count if word_count > 0 else 0
-
-    if very_short_ratio > 0.5:
-        quality_score -= 0.1
-        warnings.append("Some words may be unclear")
-
-    # 2. Check for repeated words (stuttering)
-    word_list = [re.sub(r"[^a-z]", "", w.lower()) for w in words]
-    word_list = [w for w in word_list if w]
-
-    if len(word_list) > 1:
-        repeated_count = sum(
-            1
-            for i in range(len(word_list) - 1)
-            if word_list[i] == word_list[i + 1] and len(word_list[i]) > 2
+    try:
+        result = transcribe_stream(
+            model,
+            audio_file,
+            denoise=denoise,
+            cancelled=cancelled,
+            language="en",
+            word_timestamps=True,
         )
-        if repeated_count > 2:
-            quality_score -= 0.05
-            warnings.append("Audio may have stuttering")
-
-    quality_score = max(quality_score, 0.3)
-
-    # NEW SCORING LOGIC
-    if is_fluent_speaker:
-        # FLUENT SPEAKER: Protected scoring
-        base_score = 1.5  # Start from 1.5/2
-
-        # Minimal penalty for low confidence (natural for fast speech)
-        if quality_score < 0.4:
-            base_score -= 0.15  # Only -0.15 instead of -0.4
-        elif quality_score < 0.6:
-            base_score -= 0.05  # Only -0.05 instead of -0.2
-
-        # Bonus for very clear speech
-        if quality_score >= 0.85:
-            base_score += 0.15
-
-        score = max(base_score, 1.2)  # Floor: 1.2/2 for fluent speakers
-        score = min(score, 2.0)
-
-    else:
-        # BEGINNER/INTERMEDIATE: Standard scoring
-        base_score = 1.0
-
-        if quality_score < 0.5:
-            base_score -= 0.3
-        elif quality_score < 0.7:
-            base_score -= 0.15
-
-        score = max(base_score, 0.8)  # Floor: 0.8/2 for beginners
-        score = min(score, 2.0)
-
-    # Determine level
-    if score >= 1.7:
-        level = "Excellent"
-    elif score >= 1.3:
-        level = "Good"
-    elif score >= 1.0:
-        level = "Fair"
-    else:
-        level = "Needs practice"
-
-    return round(score, 1), level, quality_score, warnings
+        # Ingest may stop early (wrong language), the header knows the length
+        duration_seconds = duration_seconds or result["duration_seconds"]
+        transcription_info = {
+            "language": result["language"],
+            "language_probability": round(result["language_probability"], 3),
+            "signal": result["signal"],
+            "denoised": denoise,
+        }
+        if result["rejected"]:
+            return duration_seconds, (None, 0, None, transcription_info)
+
+        transcription_info["removed_segments"] = (
+            result["removed_segments"] + result["truncated_segments"]
+        )
+        word_table = build_word_table(result["segments"])
+        transcription_info["timing"] = speech_timing(word_table, result["envelope_db"])
+        avg_confidence = recognition_confidence(word_table, result["segments"])
+
+        return duration_seconds, (
+            result["text"],
+            avg_confidence,
+            word_table,
+            transcription_info,
+        )
+    except Exception as e:
+        report(f"Error transcribing audio: {e}")
+        return None
 
 
-def check_fluency(text, word_count, speech_rate_wps, is_fluent_speaker):
+def convert_and_transcribe(
+    audio_source, model, denoise=False, cancelled=None, report=st.error
+):
     """
-    NEW FLUENCY SCORING with bonuses
-
-    Scoring:
-    - 50+ words: 2.0/2 (perfect)
-    - 25-49 words: 1.8/2
-    - 15-24 words: 1.4/2
-    - 10-14 words: 1.0/2
-    - <10 words: 0.8/2
-
-    Bonuses:
-    - Has connectors: +0.2
-    - Fast speech (>2.5 wps): +0.2
-
-    Returns: score (0-2)
+    Convert and transcribe one recording (`cancelled` stops a stale run).
+    `denoise` adds spectral gating between conversion and transcription.
+    Errors go to `report` (st.error unless run off the script thread).
+    Returns: (duration_seconds, transcription_result), or None
     """
-    if word_count == 0:
-        return 0
-
-    # Base scoring by word count
-    if word_count >= 50:
-        score = 2.0
-    elif word_count >= 25:
-        score = 1.8
-    elif word_count >= 15:
-        score = 1.4
-    elif word_count >= 10:
-        score = 1.0
-    else:
-        score = 0.8
-
-    # Bonus 1: Connectors (shows organized thinking)
-    connectors = [
-        "and",
-        "but",
-        "because",
-        "so",
-        "also",
-        "however",
-        "therefore",
-        "while",
-    ]
-    text_lower = text.lower()
-    has_connectors = sum(1 for conn in connectors if conn in text_lower)
-
-    if has_connectors >= 2:
-        score += 0.2
-    elif has_connectors >= 1:
-        score += 0.1
-
-    # Bonus 2: Fast speech rate
-    if speech_rate_wps >= 2.5:
-        score += 0.2
-    elif speech_rate_wps >= 2.0:
-        score += 0.1
-
-    return max(min(round(score, 1), 2.0), 0.5)
-
+    # Read container headers first: reject oversized or corrupt files
+    # before spending any time decoding them
+    try:
+        audio_info = probe_audio(audio_source)
+    except CorruptAudioError as e:
+        report(f"❌ The audio file looks corrupt: {e}")
+        return None
+    problem = check_upload_limits(audio_info)
+    if problem:
+        report(f"❌ {problem}")
+        return None
 
-def check_grammar(text):
-    """
-    Basic grammar check
-    Returns score 0-2
-    """
-    words = text.lower().split()
-    score = 2.0
-
-    # Check for common errors
-    common_errors = [
-        ("i is", "i am"),
-        ("he are", "he is"),
-        ("she are", "she is"),
-        ("they is", "they are"),
-        ("we is", "we are"),
-    ]
+    # Phone videos: copy the audio track out, video frames are never decoded
+    if audio_info["format"] in VIDEO_FORMATS:
+        try:
+            audio_source = extract_audio_track(audio_source)
+        except RuntimeError as e:
+            report(f"❌ {e}")
+            return None
+
+    if use_chunked_ingest(audio_source):
+        return transcribe_long_audio(
+            audio_source,
+            model,
+            audio_info["duration_seconds"],
+            denoise,
+            cancelled,
+            report,
+        )
 
-    text_lower = text.lower()
-    error_count = 0
-
-    for wrong, correct in common_errors:
-        if wrong in text_lower:
-            error_count += 1
-            score -= 0.5
-
-    # Check for basic sentence structure
-    has_verb = any(
-        word in words
-        for word in [
-            "is",
-            "am",
-            "are",
-            "have",
-            "has",
-            "like",
-            "love",
-            "play",
-            "go",
-            "do",
-            "can",
-            "will",
-        ]
+    wav_path, duration_seconds = convert_audio_to_wav(
+        audio_source, audio_info["duration_seconds"], report
     )
+    if not wav_path:
+        return None
 
-    if not has_verb and len(words) > 3:
-        score -= 0.5
-
-    return max(round(score, 1), 1.0)
-
-
-def check_vocabulary(text):
-    """
-    Check vocabulary diversity
-    Returns score 0-2
-    """
-    words = text.lower().split()
-    words_clean = [re.sub(r"[^a-z]", "", w) for w in words]
-    words_clean = [w for w in words_clean if len(w) > 2]
-
-    if len(words_clean) == 0:
-        return 1.0
-
-    # Calculate diversity
-    unique_words = set(words_clean)
-    diversity = len(unique_words) / len(words_clean)
-
-    score = 1.0
-
-    if diversity >= 0.7:
-        score = 2.0
-    elif diversity >= 0.5:
-        score = 1.5
-    else:
-        score = 1.0
+    try:
+        if cancelled is not None and cancelled.is_set():
+            return None
+        transcription_result = transcribe_audio(wav_path, model, denoise, report)
+    finally:
+        try:
+            os.unlink(wav_path)
+        except:
+            pass
 
-    return round(score, 1)
+    return duration_seconds, transcription_result
 
 
-def check_communication(text, topic, word_count, is_fluent_speaker):
+def prepare_recording(audio_source, model, denoise=False, cancelled=None):
     """
-    Check communication effectiveness
-
-    Fluent speakers get bonus for complexity
-    Returns score 0-2
+    convert_and_transcribe on the session's worker thread, which has no
+    script context: error messages come back with the result and are shown
+    when Analyze collects it
+    Returns: (prepared, error_messages)
     """
-    words = text.lower().split()
-    score = 1.0
-
-    # Length bonus
-    if word_count >= 30:
-        score += 0.5
-    elif word_count >= 20:
-        score += 0.3
-    elif word_count < 10:
-        score -= 0.3
-
-    # Check for connectors (organized thinking)
-    connectors = ["because", "and", "so", "but", "also", "however"]
-    has_connector = any(conn in words for conn in connectors)
-    if has_connector:
-        score += 0.3
-
-    # Check for personal response
-    personal_markers = ["i", "my", "me"]
-    has_personal = any(marker in words for marker in personal_markers)
-    if has_personal:
-        score += 0.2
-
-    # Bonus for fluent speakers with details
-    if is_fluent_speaker and word_count >= 40:
-        score += 0.2
-
-    return max(min(round(score, 1), 2.0), 0.5)
+    errors = []
+    prepared = convert_and_transcribe(
+        audio_source, model, denoise, cancelled, report=errors.append
+    )
+    return prepared, errors
 
 
-def apply_quality_adjustment(scores, quality_score, word_count, is_fluent_speaker):
+def speculation_key(audio_source, denoise=False):
     """
-    NEW SMART QUALITY ADJUSTMENT
-
-    Logic:
-    - Fluent speakers (≥30 words): Minimal penalty
-    - Beginners (<30 words): Standard penalty
-
-    Only affects: Fluency, Grammar, Vocabulary, Communication
-    Does NOT affect: Pronunciation (already handled separately)
+    Key of a recording for the current model and options; uploads and
+    recordings are identified by file_id and size, so reruns do not hash
+    the audio again (only other buffers are hashed)
     """
-    adjusted = scores.copy()
-
-    # Skip if quality is good
-    if quality_score >= 0.6:
-        return adjusted
-
-    if is_fluent_speaker:
-        # FLUENT SPEAKER: Protected from harsh penalties
-        if quality_score < 0.4:
-            multiplier = 0.85  # Only 15% reduction
-        elif quality_score < 0.6:
-            multiplier = 0.95  # Only 5% reduction
-        else:
-            multiplier = 1.0
-    else:
-        # BEGINNER: Standard penalties
-        if quality_score < 0.5:
-            multiplier = 0.70  # 30% reduction
-        elif quality_score < 0.7:
-            multiplier = 0.85  # 15% reduction
-        else:
-            multiplier = 1.0
-
-    # Apply to all except Pronunciation
-    adjusted["Fluency"] *= multiplier
-    adjusted["Grammar"] *= multiplier
-    adjusted["Vocabulary"] *= multiplier
-    adjusted["Communication"] *= multiplier
-
-    return adjusted
+    file_id = getattr(audio_source, "file_id", None)
+    if file_id is not None:
+        return content_key(
+            b"", file_id, audio_source.size, id(st.session_state.model), denoise
+        )
+    return content_key(audio_source.getvalue(), id(st.session_state.model), denoise)
 
 
-def generate_feedback(
-    transcribed_text,
-    breakdown,
+def save_result_to_history(
     topic,
-    quality_score,
-    is_fluent_speaker,
-    speech_rate_info,
+    transcribed,
+    score,
+    feedback,
+    breakdown=None,
+    word_table=None,
+    confidence=None,
+    duration=None,
+    version=None,
+    transcription_info=None,
 ):
     """
-    Generate intelligent feedback based on student level
-    """
-    feedback = []
-
-    word_count = len(transcribed_text.split())
-    wps, speed_category = speech_rate_info
-
-    # Quality warning (only if really bad)
-    if quality_score < 0.5 and not is_fluent_speaker:
-        feedback.append("### ⚠️ Audio Quality Notice\n")
-        feedback.append(f"**Recognition Quality: {quality_score*100:.0f}%**\n")
-        feedback.append("Some words may not be recognized correctly. Tips:")
-        feedback.append("- Speak clearly in a quiet room")
-        feedback.append("- Hold microphone close to your mouth")
-        feedback.append("- Try recording again if scores seem too low\n")
-        feedback.append("---\n")
-
-    # Fluent speaker notice (positive!)
-    if is_fluent_speaker:
-        feedback.append("### 🌟 Fluent Speaker Detected!\n")
-        feedback.append(
-            f"**Amazing!** You spoke **{word_count} words** at **{wps} words/second**!"
-        )
-        feedback.append(
-            "You're a confident English speaker! Keep up the excellent work! 🎉\n"
-        )
-        feedback.append("---\n")
-
-    feedback.append("### 📊 Your Performance\n")
-
-    # Fluency feedback
-    feedback.append("**Fluency & Speaking:**")
-    if breakdown["Fluency"] >= 1.8:
-        feedback.append(
-            "🌟 Outstanding! You spoke smoothly and naturally. Perfect fluency!"
-        )
-    elif breakdown["Fluency"] >= 1.5:
-        feedback.append("Great job! Your speech flows well. Very good!")
-    elif breakdown["Fluency"] >= 1.0:
-        feedback.append(
-            "Good effort! Try to speak a bit more to show your full ability."
-        )
-    else:
-        feedback.append("Keep practicing! Try to speak in longer, complete sentences.")
-
-    if wps >= 2.5:
-        feedback.append(
-            f"💨 **Speed Bonus!** You speak fast ({wps} words/sec) - sign of confidence!"
-        )
-
-    feedback.append("")
-
-    # Vocabulary feedback
-    feedback.append("**Vocabulary:**")
-    if breakdown["Vocabulary"] >= 1.5:
-        feedback.append("Wonderful! You used diverse and interesting words. Excellent!")
-    else:
-        feedback.append(
-            "Good! Try to use more descriptive words like 'amazing', 'beautiful', 'exciting'."
-        )
-    feedback.append("")
-
-    # Grammar feedback
-    feedback.append("**Grammar:**")
-    if breakdown["Grammar"] >= 1.5:
-        feedback.append("Excellent! Your grammar is correct. Well done!")
-    else:
-        feedback.append(
-            "Nice try! Remember complete sentences: 'I like...' instead of 'Like...'."
-        )
-    feedback.append("")
-
-    # Pronunciation feedback
-    feedback.append("**Pronunciation:**")
-    if is_fluent_speaker and quality_score < 0.7:
-        feedback.append(
-            "✅ **Note:** Lower confidence is NORMAL when speaking fast and fluently!"
-        )
-        feedback.append(
-            "Your pronunciation is likely very good - the system just had trouble keeping up with your speed!"
-        )
-    elif breakdown["Pronunciation"] >= 1.7:
-        feedback.append("Amazing! Crystal clear pronunciation. Keep it up!")
-    elif breakdown["Pronunciation"] >= 1.3:
-        feedback.append("Good! Your pronunciation is mostly clear.")
-    else:
-        feedback.append("Keep practicing! Speak slowly and clearly.")
-    feedback.append("")
-
-    # Communication feedback
-    feedback.append("**Communication:**")
-    if breakdown["Communication"] >= 1.5:
-        feedback.append(
-            "Fantastic! You communicated your ideas clearly and effectively!"
-        )
-    else:
-        feedback.append("Good start! Add more details: What? Why? How? When?")
-    feedback.append("")
-
-    # Overall suggestion
-    total_score = breakdown["Total"]
-    feedback.append("---")
-    feedback.append("### 💡 Next Steps:\n")
-
-    if is_fluent_speaker:
-        if total_score >= 8:
-            feedback.append(
-                "🏆 **You're excellent!** Challenge yourself with complex topics:"
-            )
-            feedback.append("- Debate topics (agree/disagree)")
-            feedback.append("- Story narration")
-            feedback.append("- Explain processes or ideas")
-        else:
-            feedback.append("You speak well! Focus on:")
-            feedback.append("- Expanding vocabulary")
-            feedback.append("- Using more complex sentence structures")
-            feedback.append("- Adding more details and examples")
-    else:
-        if total_score >= 7:
-            feedback.append("Great progress! To get even better:")
-            feedback.append("- Try speaking for longer (aim for 25+ words)")
-            feedback.append("- Use connecting words: 'and', 'but', 'because'")
-        elif total_score >= 5:
-            feedback.append("You're improving! Next time:")
-            feedback.append("- Speak at least 15-20 words")
-            feedback.append("- Use complete sentences")
-            feedback.append("- Don't worry about mistakes!")
-        else:
-            feedback.append("Good start! Keep practicing:")
-            feedback.append("- Speak in simple, complete sentences")
-            feedback.append("- Practice every day")
-            feedback.append("- Start with short topics you like")
-
-    feedback.append("\n**Remember:** Every practice makes you better! Keep going! 🌈")
-
-    return "\n".join(feedback)
-
-
-def analyze_speech(transcribed_text, topic, whisper_confidence, duration_seconds):
-    """
-    MAIN ANALYSIS FUNCTION with fair scoring system
+    Save result to history (with per-word timings and confidence)
+    `confidence`, `duration`, `transcription_info` and the scoring `version`
+    let the result be re-scored when the scoring rules change (see rescoring.py)
     """
-    if not transcribed_text or len(transcribed_text.strip()) == 0:
-        return 0, "⚠️ No speech detected. Please try again.", {}
-
-    word_count = len(transcribed_text.split())
-
-    # Calculate speech rate
-    speech_rate_wps, speed_category = calculate_speech_rate(
-        word_count, duration_seconds
-    )
-
-    # Detect if fluent speaker
-    is_fluent_speaker, speaker_level = detect_fluent_speaker(
-        transcribed_text, word_count, speech_rate_wps
-    )
-
-    # Score each criterion with new logic
-    pronunciation_score, pronunciation_level, quality_score, warnings = (
-        check_pronunciation(
-            transcribed_text, whisper_confidence, word_count, is_fluent_speaker
-        )
-    )
-
-    fluency_score = check_fluency(
-        transcribed_text, word_count, speech_rate_wps, is_fluent_speaker
-    )
-
-    grammar_score = check_grammar(transcribed_text)
-    vocabulary_score = check_vocabulary(transcribed_text)
-    communication_score = check_communication(
-        transcribed_text, topic, word_count, is_fluent_speaker
-    )
-
-    # Collect scores
-    scores = {
-        "Pronunciation": pronunciation_score,
-        "Fluency": fluency_score,
-        "Grammar": grammar_score,
-        "Vocabulary": vocabulary_score,
-        "Communication": communication_score,
-    }
-
-    # Apply smart quality adjustment (protects fluent speakers)
-    adjusted_scores = apply_quality_adjustment(
-        scores, quality_score, word_count, is_fluent_speaker
-    )
-
-    # Calculate total
-    total_score = sum(adjusted_scores.values())
-    final_score_10 = round(total_score, 1)
-
-    # Create breakdown
-    breakdown = {
-        "Pronunciation": round(adjusted_scores["Pronunciation"], 1),
-        "Fluency": round(adjusted_scores["Fluency"], 1),
-        "Grammar": round(adjusted_scores["Grammar"], 1),
-        "Vocabulary": round(adjusted_scores["Vocabulary"], 1),
-        "Communication": round(adjusted_scores["Communication"], 1),
-        "Total": final_score_10,
-        "Confidence": round(quality_score * 100, 1),
-        "RawConfidence": round(whisper_confidence * 100, 1),
-        "WordCount": word_count,
-        "SpeechRate": speech_rate_wps,
-        "SpeedCategory": speed_category,
-        "IsFluentSpeaker": is_fluent_speaker,
-        "SpeakerLevel": speaker_level,
-        "DetectedWarnings": warnings,
-    }
-
-    # Generate feedback
-    feedback_text = generate_feedback(
-        transcribed_text,
-        breakdown,
-        topic,
-        quality_score,
-        is_fluent_speaker,
-        (speech_rate_wps, speed_category),
-    )
-
-    return final_score_10, feedback_text, breakdown
-
-
-def save_result_to_history(topic, transcribed, score, feedback, breakdown=None):
-    """Save result to history"""
     result = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -762,6 +390,11 @@ def save_result_to_history(topic, transcribed, score, feedback, breakdown=None):
         "word_count": len(transcribed.split()),
         "user": st.session_state.user_name,
         "breakdown": breakdown if breakdown else {},
+        "words": word_table_to_record(word_table),
+        "confidence": confidence,
+        "duration": duration,
+        "transcription_info": transcription_info,
+        "scoring_version": version,
     }
     st.session_state.history.append(result)
 
@@ -771,6 +404,8 @@ def export_history_to_csv():
     if not st.session_state.history:
         return None
     df = pd.DataFrame(st.session_state.history)
+    # Per-word data and recording details stay in the JSON backup only
+    df = df.drop(columns=["words", "transcription_info"], errors="ignore")
     return df.to_csv(index=False).encode("utf-8")
 
 
@@ -1028,49 +663,143 @@ with tab1:
         st.subheader("📤 Step 2b: Or upload audio file")
         uploaded_file = st.file_uploader(
             "Choose audio file:",
-            type=["wav", "mp3", "m4a", "ogg", "flac"],
-            help="Supported formats: WAV, MP3, M4A, OGG, FLAC",
+            type=["wav", "mp3", "m4a", "ogg", "flac", "mp4", "mov", "webm"],
+            help="Supported formats: WAV, MP3, M4A, OGG, FLAC, "
+            "or a video (MP4, MOV, WEBM) - only its audio is used",
         )
 
+    # Live coach: stream the microphone and show partial transcripts
+    with st.expander("🎧 Step 2c: Or practice live (see your words as you speak)"):
+        if webrtc_streamer is None:
+            st.info("Install `streamlit-webrtc` to enable live practice mode.")
+        else:
+            live_ctx = webrtc_streamer(
+                key="live-coach",
+                mode=WebRtcMode.SENDONLY,
+                audio_receiver_size=256,
+                media_stream_constraints={"audio": True, "video": False},
+            )
+            live_placeholder = st.empty()
+
+            if live_ctx.audio_receiver:
+                # One transcriber per recording, kept across reruns (a widget
+                # change while streaming must not drop the audio so far)
+                transcriber = st.session_state.get("live_transcriber")
+                if transcriber is None:
+                    transcriber = RollingTranscriber(
+                        load_whisper_model(LIVE_MODEL_SIZE, encoder_cache=False)
+                    )
+                    st.session_state.live_transcriber = transcriber
+                if transcriber.text:
+                    live_placeholder.info(f"🗣️ {transcriber.text}")
+                else:
+                    live_placeholder.info("🎙️ Listening... start speaking!")
+
+                while True:
+                    try:
+                        frames = live_ctx.audio_receiver.get_frames(timeout=1)
+                    except queue.Empty:
+                        break
+                    for frame in frames:
+                        if transcriber.push(frame_to_samples(frame)):
+                            live_placeholder.info(f"🗣️ {transcriber.text}")
+
+            elif "live_transcriber" in st.session_state:
+                # Recording stopped: hand the full audio to the normal analysis
+                transcriber = st.session_state.pop("live_transcriber")
+                live_audio = transcriber.finish()
+                if len(live_audio) > 0:
+                    st.session_state.live_audio = to_wav_bytes(live_audio)
+                    st.session_state.live_analyze_pending = True
+
+        if st.session_state.get("live_audio"):
+            st.audio(st.session_state.live_audio, format="audio/wav")
+
+    denoise = st.checkbox(
+        "🔇 Reduce background noise before transcribing",
+        value=False,
+        help="Removes steady noise (fans, hum, classroom chatter). "
+        "Adds a few milliseconds per second of audio.",
+    )
+
+    # Start converting and transcribing as soon as a recording lands, so
+    # Analyze mostly collects a finished result
+    speculative_source = uploaded_file if uploaded_file else audio_recording
+    if speculative_source and st.session_state.model:
+        key = speculation_key(speculative_source, denoise)
+        # Copy the upload only when a new job starts, not on every rerun
+        if not st.session_state.speculative_jobs.has(key):
+            st.session_state.speculative_jobs.submit(
+                key,
+                prepare_recording,
+                io.BytesIO(speculative_source.getvalue()),
+                st.session_state.model,
+                denoise,
+            )
+    else:
+        st.session_state.speculative_jobs.cancel()
+
     st.divider()
 
     # Analyze button
     st.subheader("🎯 Step 3: Check your speaking")
 
-    if st.button("🔍 Analyze My Speaking", type="primary", use_container_width=True):
+    live_audio = st.session_state.get("live_audio")
+    run_live_analysis = st.session_state.pop("live_analyze_pending", False)
+
+    if (
+        st.button("🔍 Analyze My Speaking", type="primary", use_container_width=True)
+        or run_live_analysis
+    ):
 
         if not topic_input:
             st.warning("⚠️ Please enter a topic first!")
-        elif not audio_recording and not uploaded_file:
+        elif not audio_recording and not uploaded_file and not live_audio:
             st.error("⚠️ Please record or upload your audio!")
         elif not st.session_state.model:
             st.error("⚠️ Model not loaded. Please load it in Settings.")
         else:
             with st.spinner("🔄 Processing your audio..."):
                 try:
-                    audio_source = uploaded_file if uploaded_file else audio_recording
-                    result = convert_audio_to_wav(audio_source)
-
-                    if result and result[0]:
-                        wav_path, duration_seconds = result
-
-                        with st.spinner("🎧 Listening to your speaking..."):
-                            transcription_result = transcribe_audio(
-                                wav_path, st.session_state.model
-                            )
-
-                            if transcription_result:
-                                transcribed_text, whisper_confidence = (
-                                    transcription_result
-                                )
-                            else:
-                                transcribed_text = None
-                                whisper_confidence = 0
-
-                        try:
-                            os.unlink(wav_path)
-                        except:
-                            pass
+                    if run_live_analysis or not (uploaded_file or audio_recording):
+                        audio_source = io.BytesIO(live_audio)
+                    else:
+                        audio_source = (
+                            uploaded_file if uploaded_file else audio_recording
+                        )
+                    # Collect the background run for this recording; one that
+                    # was not started yet (live recording, new model) runs on
+                    # the same worker, so the session never runs two at once
+                    jobs = st.session_state.speculative_jobs
+                    key = speculation_key(audio_source, denoise)
+                    if not jobs.has(key):
+                        jobs.submit(
+                            key,
+                            prepare_recording,
+                            io.BytesIO(audio_source.getvalue()),
+                            st.session_state.model,
+                            denoise,
+                        )
+                    with st.spinner("🎧 Listening to your speaking..."):
+                        prepared, errors = jobs.result(key) or (None, [])
+                    for message in errors:
+                        st.error(message)
+
+                    if prepared:
+                        duration_seconds, transcription_result = prepared
+
+                        if transcription_result:
+                            (
+                                transcribed_text,
+                                whisper_confidence,
+                                word_table,
+                                transcription_info,
+                            ) = transcription_result
+                        else:
+                            transcribed_text = None
+                            whisper_confidence = 0
+                            word_table = None
+                            transcription_info = None
 
                         if transcribed_text:
                             score, feedback, breakdown = analyze_speech(
@@ -1078,6 +807,7 @@ with tab1:
                                 topic_input,
                                 whisper_confidence,
                                 duration_seconds,
+                                transcription_info,
                             )
 
                             save_result_to_history(
@@ -1086,6 +816,11 @@ with tab1:
                                 score,
                                 feedback,
                                 breakdown,
+                                word_table,
+                                whisper_confidence,
+                                duration_seconds,
+                                breakdown["ScoringVersion"],
+                                transcription_info,
                             )
 
                             st.success("✅ Analysis complete!")
@@ -1119,6 +854,15 @@ with tab1:
                                     "Speed", f"{breakdown.get('SpeechRate', 0)} w/s"
                                 )
 
+                                if breakdown.get("PauseCount") is not None:
+                                    st.metric(
+                                        "Pauses",
+                                        breakdown["PauseCount"],
+                                        help=f"Longest pause: {breakdown['MaxPause']}s, "
+                                        f"articulation rate: "
+                                        f"{breakdown['ArticulationRate']} w/s",
+                                    )
+
                                 speed_cat = breakdown.get("SpeedCategory", "unknown")
                                 speed_emoji = {
                                     "fast": "🚀 Fast (Fluent!)",
@@ -1155,6 +899,19 @@ with tab1:
                                             f"🟢 Recognition: {conf_pct:.0f}% - Good"
                                         )
 
+                            # Per-word timeline from Whisper word timestamps
+                            if word_table is not None and len(word_table) > 0:
+                                with st.expander("⏱️ Word Timeline"):
+                                    st.plotly_chart(
+                                        create_word_timeline_chart(word_table),
+                                        use_container_width=True,
+                                    )
+                                    st.dataframe(
+                                        word_table,
+                                        use_container_width=True,
+                                        hide_index=True,
+                                    )
+
                             # Detailed scores
                             st.markdown("### 🎯 Your Scores")
 
@@ -1240,6 +997,15 @@ with tab1:
                             st.markdown("### 💬 Your Feedback")
                             st.markdown(feedback)
 
+                        elif (
+                            transcription_info
+                            and transcription_info["language"] != "en"
+                        ):
+                            st.error(
+                                f"❌ It sounds like you answered in "
+                                f"{language_name(transcription_info['language'])}. "
+                                "Please answer in English and try again!"
+                            )
                         else:
                             st.error(
                                 "❌ Could not understand the audio. Please try again."
@@ -1499,6 +1265,87 @@ with tab3:
             else:
                 st.error("❌ Could not load model. Please try again.")
 
+    # Scoring rules (rules/*.json, reloaded automatically when edited)
+    rules = rule_file()
+    st.caption(f"Scoring rules: **{rules.current().tag}**")
+    cache_stats = scoring_cache_stats()
+    st.caption(
+        "Score cache: {} hits / {} misses (feedback: {} / {})".format(
+            *cache_stats["analysis"], *cache_stats["feedback"]
+        )
+    )
+    if rules.error:
+        st.warning(f"Rule file change not applied: {rules.error}")
+
+    # Re-score results from older scoring versions (see rescoring.py)
+    job = st.session_state.rescore_job
+    if job is not None and job.history is not st.session_state.history:
+        job.cancel()  # history was cleared or restored
+        job = st.session_state.rescore_job = None
+    if job is not None and not job.running and not job.error:
+        job.apply()  # the worker only collects scores; records change here
+
+    stale = [
+        st.session_state.history[index]
+        for index in stale_records(st.session_state.history, scoring_version())
+        if stored_inputs(st.session_state.history[index])
+    ]
+    limited = sum(1 for record in stale if not has_recording_details(record))
+    if job is not None and job.running:
+        st.progress(
+            job.done / max(job.total, 1),
+            text=f"Re-scoring old results... {job.done}/{job.total}",
+        )
+        if st.button("🔄 Refresh progress"):
+            st.rerun()
+    elif stale:
+        st.info(
+            f"{len(stale)} saved result(s) were scored with an older version "
+            f"and are not comparable with new ones."
+        )
+        if limited:
+            st.caption(
+                f"{limited} of them were saved without their recording details "
+                "(audio quality, pauses, language); they are re-scored from "
+                "transcript, confidence and duration only."
+            )
+        if st.button("♻️ Re-score old results", use_container_width=True):
+            checkpoint = os.path.join(
+                tempfile.gettempdir(),
+                f"rescore_{content_key(b'', st.session_state.user_name)[:12]}.json",
+            )
+            st.session_state.rescore_job = RescoreJob(
+                st.session_state.history, checkpoint_path=checkpoint
+            ).start()
+            st.rerun()
+
+    if job is not None and not job.running:
+        if job.error:
+            st.error(f"Re-scoring stopped: {job.error}")
+        else:
+            st.success(
+                f"✅ Re-scored {job.done - job.skipped} result(s)"
+                + (
+                    f", {job.limited} without signal or timing inputs"
+                    if job.limited
+                    else ""
+                )
+                + (
+                    f", {job.skipped} without stored scores skipped"
+                    if job.skipped
+                    else ""
+                )
+            )
+        summary = job.drift_summary()
+        if not summary.empty:
+            st.markdown("**Score drift per criterion (new - old):**")
+            st.dataframe(summary, hide_index=True, use_container_width=True)
+            if job.limited:
+                st.caption(
+                    "Limited: records scored without signal or timing inputs "
+                    "(saved before recording details were stored)."
+                )
+
     st.divider()
 
     # Backup & Restore
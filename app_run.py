@@ -1,6 +1,5 @@
 import streamlit as st
 import whisper
-from pydub import AudioSegment
 import tempfile
 import os
 from datetime import datetime, timedelta
@@ -8,7 +7,24 @@ import pandas as pd
 import plotly.graph_objects as go
 from collections import Counter
 import json
-import re
+
+from audio_decode import load_audio, write_wav
+from hallucination import filtered_transcribe
+from scoring_rules import RULES_DIR, RuleFile
+from signal_quality import signal_metrics, signal_quality_penalty
+from text_analysis import analyze_text
+from whisper_cache import (
+    LANGUAGE_REJECT_PROBABILITY,
+    detect_language,
+    install_encoder_cache,
+    language_name,
+)
+from word_alignment import (
+    build_word_table,
+    create_word_timeline_chart,
+    recognition_confidence,
+    word_table_to_record,
+)
 
 # Page config
 st.set_page_config(
@@ -86,12 +102,19 @@ def load_whisper_model(model_size="base"):
     """Load Whisper model (only once)"""
     try:
         model = whisper.load_model(model_size)
-        return model
+        # Reuse encoder output when the same recording is scored again
+        return install_encoder_cache(model)
     except Exception as e:
         st.error(f"Error loading Whisper model: {e}")
         return None
 
 
+@st.cache_resource
+def load_scoring_rules(file_name="elementary.json"):
+    """Compile a scoring rule file once; it recompiles itself when edited"""
+    return RuleFile(os.path.join(RULES_DIR, file_name))
+
+
 # Auto-load model on first run
 if st.session_state.model is None:
     st.session_state.model = load_whisper_model("base")
@@ -100,11 +123,9 @@ if st.session_state.model is None:
 def convert_audio_to_wav(audio_file):
     """Convert audio file to standard WAV format"""
     try:
-        audio = AudioSegment.from_file(audio_file)
-        audio = audio.set_channels(1)
-        audio = audio.set_frame_rate(16000)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio.export(temp_file.name, format="wav")
+        audio = load_audio(audio_file)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+            write_wav(temp_file, audio)
         return temp_file.name
     except Exception as e:
         st.error(f"Error converting audio: {e}")
@@ -114,277 +135,222 @@ def convert_audio_to_wav(audio_file):
 def transcribe_audio(audio_path, model):
     """Transcribe audio using Whisper with confidence check"""
     try:
-        result = model.transcribe(audio_path, language="en", word_timestamps=True)
+        audio = load_audio(audio_path)
+
+        # Language check on the first window, before the full decode
+        language, language_prob = detect_language(model, audio)
+        transcription_info = {
+            "language": language,
+            "language_probability": round(language_prob, 3),
+            # Noise, clipping and loudness measured on the samples
+            "signal": signal_metrics(audio),
+        }
+        if language != "en" and language_prob >= LANGUAGE_REJECT_PROBABILITY:
+            return None, 0, None, transcription_info
+
+        # Drop hallucinated segments (repetition loops, text over silence)
+        result = filtered_transcribe(model, audio, language="en", word_timestamps=True)
+        transcription_info["removed_segments"] = (
+            result["removed_segments"] + result["truncated_segments"]
+        )
 
         # Get transcribed text
         text = result["text"].strip()
 
-        # Calculate average confidence from segments
-        avg_confidence = 0
-        if "segments" in result and len(result["segments"]) > 0:
-            confidences = []
-            for segment in result["segments"]:
-                if "no_speech_prob" in segment:
-                    # Lower no_speech_prob = higher confidence
-                    confidence = 1.0 - segment["no_speech_prob"]
-                    confidences.append(confidence)
+        # Keep per-word timings and probabilities (timeline + history)
+        word_table = build_word_table(result.get("segments", []))
 
-            if confidences:
-                avg_confidence = sum(confidences) / len(confidences)
+        # Recognition confidence: duration-weighted word probability
+        avg_confidence = recognition_confidence(word_table, result.get("segments", []))
 
-        return text, avg_confidence
+        return text, avg_confidence, word_table, transcription_info
     except Exception as e:
         st.error(f"Error transcribing audio: {e}")
-        return None, 0
+        return None, 0, None, None
 
 
-def detect_transcription_quality(text, whisper_confidence):
+def detect_transcription_quality(analysis, whisper_confidence, rules, signal=None):
     """
     Detect transcription quality using linguistic patterns (NOT content-specific)
+    plus measured signal quality when `signal` metrics are given
     Returns: (quality_score: float 0-1, warnings: list)
     """
+    r = rules["transcription_quality"]
     warnings = []
     quality_score = whisper_confidence
 
-    words = text.split()
-    word_count = len(words)
+    word_count = analysis.word_count
 
     if word_count == 0:
         return 0, ["No speech detected"]
 
     # 1. Check for very short/fragmented words (sign of poor audio)
-    very_short = [w for w in words if len(re.sub(r"[^a-zA-Z]", "", w)) <= 2]
-    very_short_ratio = len(very_short) / word_count
+    very_short_ratio = analysis.short_count / word_count
 
-    if very_short_ratio > 0.5:
-        quality_score -= 0.2
+    if very_short_ratio > r["short_word_ratio"]:
+        quality_score -= r["short_word_penalty"]
         warnings.append("Many short/unclear words detected")
 
     # 2. Check for repeated words (stuttering or audio glitch)
-    word_list = [re.sub(r"[^a-z]", "", w.lower()) for w in words]
-    word_list = [w for w in word_list if w]
-
-    if len(word_list) > 1:
-        repeated_count = 0
-        for i in range(len(word_list) - 1):
-            if word_list[i] == word_list[i + 1] and len(word_list[i]) > 2:
-                repeated_count += 1
-
-        if repeated_count > 2:
-            quality_score -= 0.1
-            warnings.append("Audio may have stuttering or glitches")
+    if analysis.repeated_count > r["repeated_words"]:
+        quality_score -= r["repeated_penalty"]
+        warnings.append("Audio may have stuttering or glitches")
 
     # 3. Check sentence structure completeness
-    sentences = [s.strip() for s in re.split(r"[.!?]+", text) if s.strip()]
+    sentences = analysis.sentence_tokens
 
     if len(sentences) > 0:
         incomplete_count = 0
-        for sent in sentences:
-            sent_words = sent.lower().split()
+        for sent_words in sentences:
             # Very basic: sentence should have at least subject + verb pattern
-            has_pronoun = any(
-                w in sent_words
-                for w in ["i", "you", "he", "she", "we", "they", "it", "my", "there"]
-            )
-            has_verb = any(
-                w in sent_words
-                for w in [
-                    "is",
-                    "are",
-                    "am",
-                    "was",
-                    "were",
-                    "have",
-                    "has",
-                    "had",
-                    "do",
-                    "does",
-                    "did",
-                    "can",
-                    "will",
-                    "like",
-                    "love",
-                    "want",
-                    "go",
-                    "play",
-                    "make",
-                ]
-            )
+            has_pronoun = not rules.words["sentence_pronouns"].isdisjoint(sent_words)
+            has_verb = not rules.words["sentence_verbs"].isdisjoint(sent_words)
 
-            if len(sent_words) > 4 and not (has_pronoun and has_verb):
+            if len(sent_words) > r["sentence_min_words"] and not (
+                has_pronoun and has_verb
+            ):
                 incomplete_count += 1
 
         if incomplete_count > len(sentences) // 2:
-            quality_score -= 0.15
+            quality_score -= r["incomplete_penalty"]
             warnings.append("Some sentences may be incomplete or unclear")
 
     # 4. Check for excessive special characters (sign of recognition failure)
-    special_char_count = len(re.findall(r"[^a-zA-Z0-9\s\.,!?\'-]", text))
-    if special_char_count > word_count * 0.1:
-        quality_score -= 0.15
+    if analysis.special_char_count > word_count * r["special_char_ratio"]:
+        quality_score -= r["special_char_penalty"]
         warnings.append("Audio contains unclear segments")
 
-    quality_score = max(quality_score, 0.1)
+    # 5. Measured audio quality (noise, clipping, loudness, DC offset)
+    signal_penalty, signal_warnings = signal_quality_penalty(signal)
+    quality_score -= signal_penalty
+    warnings.extend(signal_warnings)
+
+    quality_score = max(quality_score, r["floor"])
 
     return quality_score, warnings
 
 
-def check_pronunciation(text, whisper_confidence=1.0):
+def check_pronunciation(analysis, rules, whisper_confidence=1.0, signal=None):
     """
     Check pronunciation quality based on:
     1. Whisper confidence
     2. General linguistic quality (NOT content-specific)
     Returns score 0-2, level, adjusted confidence, and warnings
     """
-    words = text.split()
-    word_count = len(words)
-
-    if word_count == 0:
+    if analysis.word_count == 0:
         return 0, "Needs practice", whisper_confidence, ["No speech detected"]
 
+    r = rules["pronunciation"]
+
     # Detect quality issues using general patterns
-    quality_score, warnings = detect_transcription_quality(text, whisper_confidence)
+    quality_score, warnings = detect_transcription_quality(
+        analysis, whisper_confidence, rules, signal
+    )
 
     # Calculate pronunciation score
     score = quality_score * 2.0  # Convert 0-1 to 0-2
 
     # Cap score based on quality
-    if quality_score < 0.5:
-        score = min(score, 1.0)
-    elif quality_score < 0.7:
-        score = min(score, 1.5)
+    score = min(score, r["score_cap"](quality_score))
 
-    score = max(min(score, 2.0), 0.3)
+    score = max(min(score, r["max"]), r["min"])
 
     # Feedback level
-    if quality_score < 0.6:
+    if quality_score < r["needs_practice_below"]:
         level = "Needs practice"
-    elif score >= 1.7:
-        level = "Good"
-    elif score >= 1.2:
-        level = "Fair"
     else:
-        level = "Needs practice"
+        level = r["level"](score)
 
     return round(score, 1), level, quality_score, warnings
 
 
-def check_fluency(text):
+def check_fluency(analysis, rules):
     """
     Check fluency based on response length
     Returns score 0-2
     """
-    words = text.split()
-    word_count = len(words)
+    word_count = analysis.word_count
 
     if word_count == 0:
         return 0
 
     # Simple scoring based on length
-    if word_count < 10:
-        score = 0.8
-    elif 10 <= word_count < 25:
-        score = 1.5
-    else:
-        score = 2.0
+    score = rules["fluency"]["word_count_score"](word_count)
 
     return round(score, 1)
 
 
-def check_grammar(text):
+def check_grammar(analysis, rules):
     """
     Basic grammar check
     Returns score 0-2
     """
-    words = text.lower().split()
-    score = 2.0
+    r = rules["grammar"]
+    score = r["base"]
 
     # Check for common errors
-    common_errors = [
-        ("i is", "i am"),
-        ("he are", "he is"),
-        ("she are", "she is"),
-        ("they is", "they are"),
-        ("we is", "we are"),
-    ]
-
-    text_lower = text.lower()
     error_count = 0
 
-    for wrong, correct in common_errors:
-        if wrong in text_lower:
+    for wrong, correct in rules.phrases["common_errors"]:
+        if wrong in analysis.phrases:
             error_count += 1
-            score -= 0.5
+            score -= r["error_penalty"]
 
     # Check for basic sentence structure
-    has_verb = any(
-        word in words
-        for word in ["is", "am", "are", "have", "has", "like", "love", "play", "go"]
-    )
+    has_verb = not rules.words["basic_verbs"].isdisjoint(analysis.token_set)
 
-    if not has_verb and len(words) > 3:
-        score -= 0.5
+    if not has_verb and analysis.word_count > r["verb_check_min_words"]:
+        score -= r["missing_verb_penalty"]
 
-    return max(round(score, 1), 1.0)
+    return max(round(score, 1), r["floor"])
 
 
-def check_vocabulary(text):
+def check_vocabulary(analysis, rules):
     """
     Check vocabulary diversity
     Returns score 0-2
     """
-    words = text.lower().split()
-    words_clean = [re.sub(r"[^a-z]", "", w) for w in words]
-    words_clean = [w for w in words_clean if len(w) > 2]
+    r = rules["vocabulary"]
 
-    if len(words_clean) == 0:
-        return 1.0
+    if analysis.long_count == 0:
+        return r["empty_score"]
 
     # Calculate diversity
-    unique_words = set(words_clean)
-    diversity = len(unique_words) / len(words_clean)
-
-    score = 1.0
+    diversity = analysis.unique_long_count / analysis.long_count
 
-    if diversity >= 0.7:
-        score = 2.0
-    elif diversity >= 0.5:
-        score = 1.5
-    else:
-        score = 1.0
+    score = r["diversity_score"](diversity)
 
     return round(score, 1)
 
 
-def check_communication(text, topic):
+def check_communication(analysis, topic, rules):
     """
     Check if student answered the topic
     Returns score 0-2
     """
-    words = text.lower().split()
-    word_count = len(words)
+    r = rules["communication"]
+    word_count = analysis.word_count
 
-    score = 1.0
+    score = r["base"]
 
     # Length bonus
-    if word_count >= 20:
-        score += 0.5
-    elif word_count < 10:
-        score -= 0.3
+    score += r["length_bonus"](word_count)
 
     # Check for connectors (shows organized thinking)
-    connectors = ["because", "and", "so", "but", "also"]
-    has_connector = any(conn in words for conn in connectors)
+    has_connector = any(
+        conn in analysis.phrases for conn in rules.phrases["communication_connectors"]
+    )
     if has_connector:
-        score += 0.3
+        score += r["connector_bonus"]
 
     # Check for personal response markers
-    personal_markers = ["i", "my", "me"]
-    has_personal = any(marker in words for marker in personal_markers)
+    has_personal = any(
+        marker in analysis.phrases for marker in rules.phrases["personal_markers"]
+    )
     if has_personal:
-        score += 0.2
+        score += r["personal_bonus"]
 
-    return max(min(round(score, 1), 2.0), 0.5)
+    return max(min(round(score, 1), r["max"]), r["min"])
 
 
 def generate_feedback(transcribed_text, breakdown, topic, quality_score=1.0):
@@ -537,30 +503,54 @@ def generate_feedback(transcribed_text, breakdown, topic, quality_score=1.0):
     return "\n".join(feedback)
 
 
-def analyze_speech(transcribed_text, topic, whisper_confidence=1.0):
+def analyze_speech(
+    transcribed_text,
+    topic,
+    whisper_confidence=1.0,
+    transcription_info=None,
+    rules=None,
+):
     """
     Analyze speech with simplified criteria for elementary students
     Uses general linguistic patterns, NOT content-specific checks
+    (`rules` defaults to the current rules/elementary.json)
     Returns score, feedback, and breakdown
     """
     if not transcribed_text or len(transcribed_text.strip()) == 0:
         return 0, ["⚠️ No speech detected. Please try again."], {}
 
+    rules = rules or load_scoring_rules().current()
+
+    signal = transcription_info.get("signal") if transcription_info else None
+
+    # Tokenize once; every scorer reads the same analysis
+    analysis = analyze_text(transcribed_text, rules.matcher)
+
     # Score each criterion (0-2 points each)
     pronunciation_score, pronunciation_level, quality_score, detected_warnings = (
-        check_pronunciation(transcribed_text, whisper_confidence)
+        check_pronunciation(analysis, rules, whisper_confidence, signal)
     )
-    fluency_score = check_fluency(transcribed_text)
-    grammar_score = check_grammar(transcribed_text)
-    vocabulary_score = check_vocabulary(transcribed_text)
-    communication_score = check_communication(transcribed_text, topic)
+
+    # Flag answers that may not be in English (confident ones never get here)
+    if transcription_info and transcription_info["language"] != "en":
+        detected_warnings.append(
+            f"Answer may not be in English "
+            f"(detected: {language_name(transcription_info['language'])})"
+        )
+
+    # Repetition loops / text over silence were removed from the transcript
+    if transcription_info and transcription_info.get("removed_segments"):
+        detected_warnings.append(
+            "Repeated or unclear phrases were removed from the transcript"
+        )
+    fluency_score = check_fluency(analysis, rules)
+    grammar_score = check_grammar(analysis, rules)
+    vocabulary_score = check_vocabulary(analysis, rules)
+    communication_score = check_communication(analysis, topic, rules)
 
     # Apply quality penalty to all scores if recognition is questionable
-    quality_multiplier = 1.0
-    if quality_score < 0.5:
-        quality_multiplier = 0.6  # Reduce all scores by 40%
-    elif quality_score < 0.7:
-        quality_multiplier = 0.8  # Reduce all scores by 20%
+    # (0.6 below 50% quality, 0.8 below 70%)
+    quality_multiplier = rules["quality_adjustment"]["multiplier"](quality_score)
 
     # Apply multiplier to all scores except pronunciation (already considered)
     fluency_score *= quality_multiplier
@@ -590,7 +580,22 @@ def analyze_speech(transcribed_text, topic, whisper_confidence=1.0):
         "Total": final_score_10,
         "Confidence": round(quality_score * 100, 1),
         "RawConfidence": round(whisper_confidence * 100, 1),
+        "ScoringRules": rules.tag,
         "DetectedWarnings": detected_warnings,
+        "DetectedLanguage": (
+            transcription_info["language"] if transcription_info else "en"
+        ),
+        "LanguageConfidence": (
+            round(transcription_info["language_probability"] * 100, 1)
+            if transcription_info
+            else None
+        ),
+        "RemovedSegments": (
+            transcription_info.get("removed_segments", 0) if transcription_info else 0
+        ),
+        "SignalSNR": signal["snr_db"] if signal else None,
+        "ClippingRatio": signal["clipping_ratio"] if signal else None,
+        "LoudnessDBFS": signal["rms_dbfs"] if signal else None,
     }
 
     # Generate encouraging feedback
@@ -599,8 +604,10 @@ def analyze_speech(transcribed_text, topic, whisper_confidence=1.0):
     return final_score_10, feedback_text, breakdown
 
 
-def save_result_to_history(topic, transcribed, score, feedback, breakdown=None):
-    """Save result to history"""
+def save_result_to_history(
+    topic, transcribed, score, feedback, breakdown=None, word_table=None
+):
+    """Save result to history (with per-word timings and confidence)"""
     result = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -612,6 +619,7 @@ def save_result_to_history(topic, transcribed, score, feedback, breakdown=None):
         "word_count": len(transcribed.split()),
         "user": st.session_state.user_name,
         "breakdown": breakdown if breakdown else {},
+        "words": word_table_to_record(word_table),
     }
     st.session_state.history.append(result)
 
@@ -621,6 +629,8 @@ def export_history_to_csv():
     if not st.session_state.history:
         return None
     df = pd.DataFrame(st.session_state.history)
+    # Per-word data stays in the JSON backup only
+    df = df.drop(columns=["words"], errors="ignore")
     return df.to_csv(index=False).encode("utf-8")
 
 
@@ -908,12 +918,17 @@ with tab1:
                             )
 
                             if transcription_result:
-                                transcribed_text, whisper_confidence = (
-                                    transcription_result
-                                )
+                                (
+                                    transcribed_text,
+                                    whisper_confidence,
+                                    word_table,
+                                    transcription_info,
+                                ) = transcription_result
                             else:
                                 transcribed_text = None
                                 whisper_confidence = 0
+                                word_table = None
+                                transcription_info = None
 
                         try:
                             os.unlink(wav_path)
@@ -922,7 +937,10 @@ with tab1:
 
                         if transcribed_text:
                             score, feedback, breakdown = analyze_speech(
-                                transcribed_text, topic_input, whisper_confidence
+                                transcribed_text,
+                                topic_input,
+                                whisper_confidence,
+                                transcription_info,
                             )
 
                             # Show confidence warning if issues detected
@@ -948,6 +966,7 @@ with tab1:
                                 score,
                                 feedback,
                                 breakdown,
+                                word_table,
                             )
 
                             st.success("✅ Analysis complete!")
@@ -986,6 +1005,19 @@ with tab1:
                                             f"🟢 Recognition Confidence: {conf_pct:.0f}% - Good"
                                         )
 
+                            # Per-word timeline from Whisper word timestamps
+                            if word_table is not None and len(word_table) > 0:
+                                with st.expander("⏱️ Word Timeline"):
+                                    st.plotly_chart(
+                                        create_word_timeline_chart(word_table),
+                                        use_container_width=True,
+                                    )
+                                    st.dataframe(
+                                        word_table,
+                                        use_container_width=True,
+                                        hide_index=True,
+                                    )
+
                             # Detailed scores
                             st.markdown("### 🎯 Your Scores")
 
@@ -1071,6 +1103,15 @@ with tab1:
                             st.markdown("### 💬 Your Feedback")
                             st.markdown(feedback)
 
+                        elif (
+                            transcription_info
+                            and transcription_info["language"] != "en"
+                        ):
+                            st.error(
+                                f"❌ It sounds like you answered in "
+                                f"{language_name(transcription_info['language'])}. "
+                                "Please answer in English and try again!"
+                            )
                         else:
                             st.error(
                                 "❌ Could not understand the audio. Please try again."
@@ -1326,6 +1367,12 @@ with tab3:
             else:
                 st.error("❌ Could not load model. Please try again.")
 
+    # Scoring rules (rules/*.json, reloaded automatically when edited)
+    rule_file = load_scoring_rules()
+    st.caption(f"Scoring rules: **{rule_file.current().tag}**")
+    if rule_file.error:
+        st.warning(f"Rule file change not applied: {rule_file.error}")
+
     st.divider()
 
     # Backup & Restore
@@ -1,6 +1,5 @@
 import streamlit as st
 import whisper
-from pydub import AudioSegment
 import tempfile
 import os
 from datetime import datetime, timedelta
@@ -10,6 +9,29 @@ from collections import Counter
 import json
 import re
 
+from audio_decode import load_audio, write_wav
+from g2p import aggregate_problem_phonemes, problem_phonemes
+from hallucination import filtered_transcribe
+from near_miss import homophone_key, near_miss, reference_keys
+from phrase_matcher import PhraseMatcher
+from text_normalizer import normalize_reference, normalize_text
+from whisper_cache import (
+    LANGUAGE_REJECT_PROBABILITY,
+    detect_language,
+    install_encoder_cache,
+    language_name,
+    teacher_forced_word_probs,
+)
+from word_alignment import (
+    UNCLEAR_WORD_CONFIDENCE,
+    build_word_table,
+    create_word_timeline_chart,
+    force_align_reference,
+    word_edit_ops,
+    word_error_rate,
+    word_table_to_record,
+)
+
 # Cấu hình trang
 st.set_page_config(
     page_title="Phân tích Phát Âm Tiếng Anh",
@@ -86,7 +108,8 @@ def load_whisper_model(model_size="base"):
     """Load mô hình Whisper (chỉ load 1 lần)"""
     try:
         model = whisper.load_model(model_size)
-        return model
+        # Dùng lại kết quả encoder khi chấm lại cùng một bản ghi
+        return install_encoder_cache(model)
     except Exception as e:
         st.error(f"Lỗi khi load Whisper model: {e}")
         return None
@@ -100,11 +123,9 @@ if st.session_state.model is None:
 def convert_audio_to_wav(audio_file):
     """Chuyển đổi file audio về định dạng WAV chuẩn"""
     try:
-        audio = AudioSegment.from_file(audio_file)
-        audio = audio.set_channels(1)
-        audio = audio.set_frame_rate(16000)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio.export(temp_file.name, format="wav")
+        audio = load_audio(audio_file)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+            write_wav(temp_file, audio)
         return temp_file.name
     except Exception as e:
         st.error(f"Lỗi chuyển đổi audio: {e}")
@@ -114,11 +135,72 @@ def convert_audio_to_wav(audio_file):
 def transcribe_audio(audio_path, model):
     """Nhận dạng giọng nói từ file audio bằng Whisper"""
     try:
-        result = model.transcribe(audio_path, language="en")
-        return result["text"].strip()
+        audio = load_audio(audio_path)
+
+        # Kiểm tra ngôn ngữ trên cửa sổ đầu tiên, trước khi decode toàn bộ
+        language, language_prob = detect_language(model, audio)
+        transcription_info = {
+            "language": language,
+            "language_probability": round(language_prob, 3),
+        }
+        if language != "en" and language_prob >= LANGUAGE_REJECT_PROBABILITY:
+            return None, None, audio, transcription_info
+
+        # Lọc đoạn ảo giác (lặp cụm từ, đoạn im lặng) và dừng decode sớm
+        result = filtered_transcribe(model, audio, language="en", word_timestamps=True)
+        transcription_info["removed_segments"] = (
+            result["removed_segments"] + result["truncated_segments"]
+        )
+        # Giữ lại thời gian từng từ để căn chỉnh với câu gốc
+        word_table = build_word_table(result.get("segments", []), normalize_text)
+        return result["text"].strip(), word_table, audio, transcription_info
     except Exception as e:
         st.error(f"Lỗi nhận dạng giọng nói: {e}")
-        return None
+        return None, None, None, None
+
+
+# Các cụm từ của quy tắc chấm điểm, biên dịch một lần thành bộ so khớp
+COMMON_ERRORS = [
+    ("i is", "i am"),
+    ("he are", "he is"),
+    ("she are", "she is"),
+    ("they is", "they are"),
+    ("we is", "we are"),
+    ("i does", "i do"),
+    ("he do", "he does"),
+    ("she do", "she does"),
+]
+# Từ vô nghĩa / ngẫu nhiên (dấu hiệu phát âm kém)
+NONSENSE_WORDS = ["hver", "ung", "isch", "artstrom", "justarta", "matery", "الت", "ال"]
+# Pattern lặp lại bất thường
+REPETITIVE_PATTERNS = ["me me", "i i", "you you", "the the the"]
+BASIC_STRUCTURE_WORDS = ["is", "am", "are", "have", "can", "my", "i", "you", "we"]
+CONNECTORS = ["because", "and", "so", "but", "also", "however", "therefore"]
+INTRO_PHRASES = ["my name", "i am", "my favorite", "i like", "i love"]
+
+# Mẹo luyện các âm hay sai (ký hiệu IPA như g2p.PHONEMES)
+PHONEME_TIPS = {
+    "θ": "đặt đầu lưỡi giữa hai hàm răng rồi thổi hơi (think, three)",
+    "ð": "như /θ/ nhưng rung dây thanh (this, mother)",
+    "r": "cong lưỡi về sau, không chạm vòm miệng (right, very)",
+    "l": "đầu lưỡi chạm lợi trên (light, feel)",
+    "v": "răng trên chạm môi dưới và rung (very, love)",
+    "s": "giữ âm gió rõ ở cuối từ (bus, likes)",
+    "z": "như /s/ nhưng rung dây thanh (is, zoo)",
+    "ʃ": "tròn môi, đẩy hơi mạnh (she, fish)",
+    "i": "kéo dài và căng môi (sheep, eat)",
+    "ɪ": "ngắn và thả lỏng (ship, it)",
+    "æ": "mở rộng miệng, giữa 'a' và 'e' (cat, bag)",
+}
+
+RULE_PHRASES = PhraseMatcher(
+    [wrong for wrong, _ in COMMON_ERRORS]
+    + NONSENSE_WORDS
+    + REPETITIVE_PATTERNS
+    + BASIC_STRUCTURE_WORDS
+    + CONNECTORS
+    + INTRO_PHRASES
+)
 
 
 def check_grammar_basic(text):
@@ -131,20 +213,9 @@ def check_grammar_basic(text):
     score = 2.0
 
     # Kiểm tra Subject-Verb Agreement cơ bản
-    common_errors = [
-        ("i is", "i am"),
-        ("he are", "he is"),
-        ("she are", "she is"),
-        ("they is", "they are"),
-        ("we is", "we are"),
-        ("i does", "i do"),
-        ("he do", "he does"),
-        ("she do", "she does"),
-    ]
-
-    text_lower = text.lower()
-    for wrong, correct in common_errors:
-        if wrong in text_lower:
+    phrases = RULE_PHRASES.found(text.lower())
+    for wrong, correct in COMMON_ERRORS:
+        if wrong in phrases:
             errors.append(f"Lỗi S-V: '{wrong}' → '{correct}'")
             score -= 0.3
 
@@ -264,7 +335,7 @@ def check_vocabulary(text):
     return max(min(score, 2.0), 0), issues
 
 
-def check_pronunciation(text, reference_text=None):
+def check_pronunciation(text, reference_text=None, reference_alignment=None):
     """
     Đánh giá phát âm dựa trên:
     1. Độ CHÍNH XÁC và MẠCH LẠC của transcription (nếu không có reference)
@@ -279,29 +350,14 @@ def check_pronunciation(text, reference_text=None):
 
     # ==== PHẦN 1: NẾU CÓ REFERENCE TEXT - SO SÁNH TRỰC TIẾP ====
     if reference_text and reference_text.strip():
-        return check_pronunciation_with_reference(text, reference_text)
+        score, feedback, _ = check_pronunciation_with_reference(
+            text, reference_text, reference_alignment
+        )
+        return score, feedback
 
     # ==== PHẦN 2: NẾU KHÔNG CÓ REFERENCE - ĐÁNH GIÁ DỰA TRÊN CHẤT LƯỢNG ====
-    # Các pattern báo hiệu phát âm KÉM (Whisper nhận dạng sai)
-    error_indicators = {
-        # Từ vô nghĩa / ngẫu nhiên
-        "nonsense_words": [
-            "hver",
-            "ung",
-            "hver",
-            "isch",
-            "artstrom",
-            "justarta",
-            "matery",
-            "hver",
-            "الت",
-            "ال",
-        ],
-        # Pattern lặp lại bất thường
-        "repetitive": ["me me", "I I", "you you", "the the the"],
-        # Từ quá ngắn không rõ nghĩa
-        "unclear_short": ["i", "a", "o", "u", "e"],  # Đơn lẻ, không có ngữ cảnh
-    }
+    # Các pattern báo hiệu phát âm KÉM (Whisper nhận dạng sai): một lượt quét
+    phrases = RULE_PHRASES.found(text.lower())
 
     # Phân tích chất lượng transcription
     issues = []
@@ -310,10 +366,9 @@ def check_pronunciation(text, reference_text=None):
     # 1. Kiểm tra từ vô nghĩa
     nonsense_count = 0
     nonsense_found = []
-    text_lower = text.lower()
 
-    for nonsense in error_indicators["nonsense_words"]:
-        if nonsense in text_lower:
+    for nonsense in NONSENSE_WORDS:
+        if nonsense in phrases:
             nonsense_count += 1
             nonsense_found.append(nonsense)
 
@@ -323,8 +378,8 @@ def check_pronunciation(text, reference_text=None):
 
     # 2. Kiểm tra pattern lặp lại bất thường
     repetition_count = 0
-    for pattern in error_indicators["repetitive"]:
-        if pattern in text_lower:
+    for pattern in REPETITIVE_PATTERNS:
+        if pattern in phrases:
             repetition_count += 1
 
     if repetition_count > 0:
@@ -349,10 +404,7 @@ def check_pronunciation(text, reference_text=None):
         issues.append(f"⚠️ Từ trung bình quá ngắn ({avg_word_length:.1f} ký tự)")
 
     # 5. Kiểm tra tính mạch lạc câu (có động từ, danh từ cơ bản)
-    has_basic_structure = any(
-        word in text_lower
-        for word in ["is", "am", "are", "have", "can", "my", "i", "you", "we"]
-    )
+    has_basic_structure = any(word in phrases for word in BASIC_STRUCTURE_WORDS)
 
     if not has_basic_structure:
         penalty += 0.3
@@ -423,77 +475,86 @@ def check_pronunciation(text, reference_text=None):
     return round(score, 1), feedback
 
 
-def check_pronunciation_with_reference(transcribed, reference):
+def check_pronunciation_with_reference(
+    transcribed, reference, reference_alignment=None
+):
     """
     So sánh transcribed text với reference text để đánh giá phát âm
     Sử dụng Word Error Rate (WER) và phân tích chi tiết
+    Nếu có reference_alignment (từ force_align_reference), so khớp theo thứ tự
+    và từ có độ tin cậy thấp chỉ được tính nửa điểm
+    Trả về: điểm, feedback, {âm IPA: số lần sai} (so sánh âm vị từng từ)
     """
 
-    # Chuẩn hóa text
-    def normalize(text):
-        text = text.lower()
-        text = re.sub(r"[^a-z\s]", "", text)  # Chỉ giữ chữ cái và space
-        return text.split()
-
-    ref_words = normalize(reference)
-    trans_words = normalize(transcribed)
+    # Chuẩn hóa text: đọc số thành chữ, mở rộng dạng viết tắt, chính tả Anh -> Mỹ
+    # (câu gốc chỉ chuẩn hóa một lần rồi cache)
+    ref_words = list(normalize_reference(reference))
+    trans_words = normalize_text(transcribed)
 
     if len(ref_words) == 0:
-        return 0, ["⚠️ Câu tham chiếu không hợp lệ"]
-
-    # Tính Word Error Rate (WER) bằng Levenshtein Distance
-    def levenshtein_distance(s1, s2):
-        if len(s1) < len(s2):
-            return levenshtein_distance(s2, s1)
-        if len(s2) == 0:
-            return len(s1)
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        return previous_row[-1]
-
-    # Phân tích chi tiết từng từ
-    correct_words = 0
-    missing_words = []
-    extra_words = []
+        return 0, ["⚠️ Câu tham chiếu không hợp lệ"], {}
 
-    # So sánh từng từ (simple alignment)
-    ref_set = set(ref_words)
-    trans_set = set(trans_words)
+    # Căn chỉnh từng từ theo thứ tự (edit distance trên ID từ, chạy bằng C):
+    # mỗi từ là khớp / nói nhầm / thiếu / thừa, từ lặp lại được tính đủ.
+    # Từ đồng âm (there/their, to/two) có cùng khóa nên được tính là khớp
+    ops = word_edit_ops(
+        reference_keys(tuple(ref_words)), [homophone_key(w) for w in trans_words]
+    )
 
-    # Từ đúng: có trong cả 2
-    matched_ref = []
-    matched_trans = []
+    # Từ thừa: nói thêm ngoài câu gốc (CHỈ ĐỂ HIỂN THỊ, KHÔNG TRỪ ĐIỂM)
+    extra_words = [trans_words[j] for op, _, j in ops if op == "insert"]
+    unclear_words = []
 
-    for word in ref_words:
-        if word in trans_set and word not in matched_ref:
+    if reference_alignment is not None and len(reference_alignment) == len(ref_words):
+        # Căn chỉnh theo thời gian từng từ (forced alignment)
+        is_match = (reference_alignment["status"] == "match").to_numpy()
+        is_unclear = is_match & (
+            reference_alignment["confidence"].to_numpy() < UNCLEAR_WORD_CONFIDENCE
+        )
+        aligned_words = reference_alignment["word"].to_numpy()
+
+        correct_words = int(is_match.sum())
+        unclear_words = aligned_words[is_unclear].tolist()
+        substituted = list(
+            zip(
+                aligned_words[~is_match].tolist(),
+                reference_alignment["heard"].to_numpy()[~is_match].tolist(),
+            )
+        )
+    else:
+        correct_words = sum(1 for op, _, _ in ops if op == "match")
+        substituted = [
+            (ref_words[i], trans_words[j] if j is not None else "")
+            for op, i, j in ops
+            if op in ("substitute", "delete")
+        ]
+
+    # Từ đồng âm (cùng cách đọc theo từ điển phát âm) = đúng.
+    # Khác âm (kể cả cặp tối thiểu như three/tree, ship/sheep) hoặc từ ngoài
+    # từ điển (chỉ đoán theo quy tắc, không chắc chắn) là từ sai
+    missing_words = []
+    wrong_pairs = []
+    misheard = []  # (từ gốc, từ nghe được) để so sánh âm vị
+    for ref_word, heard in substituted:
+        if heard and near_miss(ref_word, heard) == "homophone":
             correct_words += 1
-            matched_ref.append(word)
-            matched_trans.append(word)
+            continue
+        missing_words.append(ref_word)
+        if heard:
+            wrong_pairs.append(f"{ref_word} → {heard}")
+            misheard.append((ref_word, heard))
 
-    # Từ thiếu: có trong ref nhưng không khớp
-    for word in ref_words:
-        if word not in matched_ref:
-            missing_words.append(word)
-
-    # Từ thừa: có trong trans nhưng không khớp (CHỈ ĐỂ HIỂN THỊ, KHÔNG TRỪ ĐIỂM)
-    for word in trans_words:
-        if word not in matched_trans and word not in ref_set:
-            extra_words.append(word)
+    # Âm sai: so sánh âm vị (từ điển phát âm + quy tắc) của từ gốc và từ nghe được,
+    # chỉ với cặp tối thiểu (think → sink), không với một từ khác hẳn
+    sound_counts, sound_examples = problem_phonemes(misheard)
 
     # Tính accuracy CHỈ dựa trên từ ĐÚNG và THIẾU (bỏ qua từ thừa)
-    # Công thức: Accuracy = (Từ đúng) / (Tổng từ gốc)
-    accuracy = correct_words / len(ref_words)
+    # Công thức: Accuracy = (Từ đúng - 0.5 x Từ chưa rõ) / (Tổng từ gốc)
+    accuracy = (correct_words - 0.5 * len(unclear_words)) / len(ref_words)
     accuracy_percent = accuracy * 100
 
-    # Tính lỗi chỉ từ missing words
-    error_rate = len(missing_words) / len(ref_words)
+    # Word Error Rate thật: (nhầm + thiếu + thừa) / số từ gốc
+    error_rate = word_error_rate(ops)
 
     # Tính điểm pronunciation dựa trên accuracy
     if accuracy >= 0.95:
@@ -533,6 +594,27 @@ def check_pronunciation_with_reference(transcribed, reference):
     feedback.append(f"• Bạn nói: **{len(trans_words)}** từ")
     feedback.append(f"• Từ phát âm đúng: **{correct_words}/{len(ref_words)}** từ")
     feedback.append(f"• Từ thiếu/sai: **{len(missing_words)}** từ")
+    feedback.append(f"• Tỷ lệ lỗi từ (WER): **{error_rate * 100:.1f}%**")
+    if reference_alignment is not None and "reference_prob" in reference_alignment:
+        # Từ không chấm được (None) không tính vào độ khớp
+        reference_prob = pd.to_numeric(
+            reference_alignment["reference_prob"], errors="coerce"
+        )
+        scored = reference_prob.notna()
+        if scored.any():
+            audio_match = reference_prob[scored].mean() * 100
+            note = (
+                ""
+                if scored.all()
+                else f" *({int(scored.sum())}/{len(scored)} từ được chấm)*"
+            )
+            feedback.append(
+                f"• Độ khớp âm thanh với câu gốc: **{audio_match:.0f}%**{note}"
+            )
+    if unclear_words:
+        feedback.append(
+            f"• Từ phát âm chưa rõ: **{len(unclear_words)}** từ *(tính nửa điểm)*"
+        )
     if extra_words:
         feedback.append(
             f"• Từ mở rộng thêm: **{len(extra_words)}** từ *(không trừ điểm)*"
@@ -546,6 +628,34 @@ def check_pronunciation_with_reference(transcribed, reference):
         feedback.append(f"• {', '.join(missing_unique)}")
         feedback.append("")
 
+    if wrong_pairs:
+        feedback.append(f"**🔁 Từ NÓI NHẦM ({len(wrong_pairs)} từ):**")
+        feedback.append(f"• {', '.join(list(dict.fromkeys(wrong_pairs))[:15])}")
+        feedback.append("")
+
+    if sound_counts:
+        feedback.append("**🔤 ÂM CẦN LUYỆN:**")
+        for symbol, count in sound_counts.most_common(5):
+            line = f"• /{symbol}/ ({count} lần): {sound_examples[symbol][0]}"
+            if symbol in PHONEME_TIPS:
+                line += f" - *{PHONEME_TIPS[symbol]}*"
+            feedback.append(line)
+        if any(
+            example.endswith("†")
+            for symbol, _ in sound_counts.most_common(5)
+            for example in sound_examples[symbol][:1]
+        ):
+            feedback.append(
+                "• *† Từ ngoài từ điển phát âm: cách đọc được đoán theo quy tắc*"
+            )
+        feedback.append("")
+
+    if unclear_words:
+        feedback.append(f"**🔈 Từ CHƯA RÕ ({len(unclear_words)} từ):**")
+        unclear_unique = list(dict.fromkeys(unclear_words))[:15]
+        feedback.append(f"• {', '.join(unclear_unique)}")
+        feedback.append("")
+
     if extra_words:
         feedback.append(f"**➕ Từ MỞ RỘNG THÊM ({len(extra_words)} từ):**")
         extra_unique = list(set(extra_words))[:15]
@@ -585,7 +695,7 @@ def check_pronunciation_with_reference(transcribed, reference):
         feedback.append("**🌟 Điểm cộng:**")
         feedback.append("• Bạn đã mở rộng ý rất tốt! Tiếp tục phát triển kỹ năng này!")
 
-    return round(score, 1), feedback
+    return round(score, 1), feedback, dict(sound_counts)
 
 
 def check_communication(text):
@@ -607,33 +717,46 @@ def check_communication(text):
         issues.append("Câu trả lời quá ngắn, thiếu chi tiết")
 
     # Kiểm tra có từ nối (because, and, so, but) - thể hiện logic
-    connectors = ["because", "and", "so", "but", "also", "however", "therefore"]
-    has_connector = any(conn in words for conn in connectors)
+    phrases = RULE_PHRASES.found(text.lower())
+    has_connector = any(conn in phrases for conn in CONNECTORS)
     if has_connector:
         score += 0.3
     else:
         issues.append("Nên dùng từ nối để liên kết ý")
 
     # Kiểm tra có câu giới thiệu (my name, i am, i like, my favorite)
-    intro_phrases = ["my name", "i am", "my favorite", "i like", "i love"]
-    has_intro = any(phrase in text.lower() for phrase in intro_phrases)
+    has_intro = any(phrase in phrases for phrase in INTRO_PHRASES)
     if has_intro:
         score += 0.2
 
     return max(min(score, 2.0), 0), issues
 
 
-def analyze_speech(transcribed_text, audio_path=None, reference_text=None):
+def analyze_speech(
+    transcribed_text,
+    audio_path=None,
+    reference_text=None,
+    reference_alignment=None,
+    transcription_info=None,
+):
     """
     Phân tích bài nói theo 5 tiêu chí (mỗi tiêu chí /2 điểm, tổng /10)
     """
     if not transcribed_text or len(transcribed_text.strip()) == 0:
         return 0, ["⚠️ Không nhận dạng được nội dung. Vui lòng thử lại."], {}
 
-    # Chấm từng tiêu chí
-    pronunciation_score, pronunciation_issues = check_pronunciation(
-        transcribed_text, reference_text
-    )
+    # Chấm từng tiêu chí (có câu gốc: so sánh cả âm vị)
+    problem_sounds = {}
+    if reference_text and reference_text.strip():
+        pronunciation_score, pronunciation_issues, problem_sounds = (
+            check_pronunciation_with_reference(
+                transcribed_text, reference_text, reference_alignment
+            )
+        )
+    else:
+        pronunciation_score, pronunciation_issues = check_pronunciation(
+            transcribed_text
+        )
     fluency_score, fluency_issues = check_fluency(transcribed_text)
     grammar_score, grammar_issues = check_grammar_basic(transcribed_text)
     vocabulary_score, vocabulary_issues = check_vocabulary(transcribed_text)
@@ -659,11 +782,39 @@ def analyze_speech(transcribed_text, audio_path=None, reference_text=None):
         "Vocabulary": vocabulary_score,
         "Communication": communication_score,
         "Total": total_score,
+        "DetectedLanguage": (
+            transcription_info["language"] if transcription_info else "en"
+        ),
+        "LanguageConfidence": (
+            round(transcription_info["language_probability"] * 100, 1)
+            if transcription_info
+            else None
+        ),
+        "RemovedSegments": (
+            transcription_info.get("removed_segments", 0) if transcription_info else 0
+        ),
+        "ProblemPhonemes": problem_sounds,
     }
 
     # Tạo feedback chi tiết
     feedback = []
 
+    # Cảnh báo nếu bài nói có thể không phải tiếng Anh
+    if transcription_info and transcription_info["language"] != "en":
+        feedback.append(
+            f"⚠️ **Bài nói có thể không phải tiếng Anh** "
+            f"(phát hiện: {language_name(transcription_info['language'])})"
+        )
+        feedback.append("")
+
+    # Thông báo nếu đã lọc bỏ đoạn nhận dạng lặp/ảo giác
+    if transcription_info and transcription_info.get("removed_segments"):
+        feedback.append(
+            f"⚠️ Đã loại bỏ **{transcription_info['removed_segments']}** đoạn "
+            "nhận dạng bị lặp hoặc không rõ (có thể do âm thanh kém)"
+        )
+        feedback.append("")
+
     feedback.append(
         f"📊 **TỔNG ĐIỂM: {total_score:.1f}/10** ({final_score_100:.0f}/100)"
     )
@@ -715,8 +866,10 @@ def analyze_speech(transcribed_text, audio_path=None, reference_text=None):
     return round(final_score_100, 1), feedback, breakdown
 
 
-def save_result_to_history(topic, transcribed, score, wrong_words, breakdown=None):
-    """Lưu kết quả vào lịch sử"""
+def save_result_to_history(
+    topic, transcribed, score, wrong_words, breakdown=None, word_table=None
+):
+    """Lưu kết quả vào lịch sử (kèm thời gian và độ tin cậy từng từ)"""
     result = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -729,6 +882,7 @@ def save_result_to_history(topic, transcribed, score, wrong_words, breakdown=Non
         "user": st.session_state.user_name,
         "mode": "Bài nói tự do",
         "breakdown": breakdown if breakdown else {},
+        "words": word_table_to_record(word_table),
     }
     st.session_state.history.append(result)
 
@@ -739,6 +893,8 @@ def export_history_to_csv():
         return None
 
     df = pd.DataFrame(st.session_state.history)
+    # Dữ liệu từng từ chỉ lưu trong bản sao lưu JSON
+    df = df.drop(columns=["words"], errors="ignore")
     return df.to_csv(index=False).encode("utf-8")
 
 
@@ -1044,9 +1200,12 @@ with tab1:
 
                     if wav_path:
                         with st.spinner("🎧 Đang nhận dạng giọng nói..."):
-                            transcribed_text = transcribe_audio(
-                                wav_path, st.session_state.model
-                            )
+                            (
+                                transcribed_text,
+                                word_table,
+                                audio,
+                                transcription_info,
+                            ) = transcribe_audio(wav_path, st.session_state.model)
 
                         try:
                             os.unlink(wav_path)
@@ -1054,8 +1213,48 @@ with tab1:
                             pass
 
                         if transcribed_text:
+                            # Căn chỉnh câu gốc với thời gian từng từ
+                            reference_alignment = None
+                            if (
+                                reference_text
+                                and reference_text.strip()
+                                and word_table is not None
+                            ):
+                                reference_alignment = force_align_reference(
+                                    list(normalize_reference(reference_text)),
+                                    word_table,
+                                )
+
+                                # Chấm teacher-forced: dùng lại encoder đã cache
+                                forced_probs = teacher_forced_word_probs(
+                                    st.session_state.model,
+                                    audio,
+                                    reference_text,
+                                    word_times=(
+                                        reference_alignment["start"].to_numpy(),
+                                        reference_alignment["end"].to_numpy(),
+                                    ),
+                                )
+                                if forced_probs and len(forced_probs) == len(
+                                    reference_alignment
+                                ):
+                                    reference_alignment["reference_prob"] = [
+                                        prob for _, prob in forced_probs
+                                    ]
+                                elif forced_probs:
+                                    st.warning(
+                                        "⚠️ Không chấm được độ khớp âm thanh: số từ "
+                                        f"chấm teacher-forced ({len(forced_probs)}) "
+                                        "khác số từ câu gốc "
+                                        f"({len(reference_alignment)})"
+                                    )
+
                             score, feedback, breakdown = analyze_speech(
-                                transcribed_text, wav_path, reference_text
+                                transcribed_text,
+                                wav_path,
+                                reference_text,
+                                reference_alignment,
+                                transcription_info,
                             )
                             save_result_to_history(
                                 topic_input,
@@ -1063,6 +1262,7 @@ with tab1:
                                 score,
                                 feedback,
                                 breakdown,
+                                word_table,
                             )
 
                             st.success("✅ Phân tích hoàn tất!")
@@ -1081,6 +1281,27 @@ with tab1:
                                 st.markdown("**🗣️ Nội dung bạn đã nói:**")
                                 st.info(transcribed_text)
 
+                            # Dòng thời gian từng từ (theo câu gốc nếu có)
+                            timeline_table = (
+                                reference_alignment
+                                if reference_alignment is not None
+                                else word_table
+                            )
+                            if timeline_table is not None and len(timeline_table) > 0:
+                                with st.expander("⏱️ Dòng thời gian từng từ"):
+                                    st.plotly_chart(
+                                        create_word_timeline_chart(
+                                            timeline_table,
+                                            title="⏱️ Dòng thời gian từng từ",
+                                        ),
+                                        use_container_width=True,
+                                    )
+                                    st.dataframe(
+                                        timeline_table,
+                                        use_container_width=True,
+                                        hide_index=True,
+                                    )
+
                             # Điểm số tổng quan
                             st.markdown("### 🎯 Kết quả chấm điểm")
 
@@ -1201,6 +1422,15 @@ with tab1:
                                 """
                                 )
 
+                        elif (
+                            transcription_info
+                            and transcription_info["language"] != "en"
+                        ):
+                            st.error(
+                                f"❌ Có vẻ bạn đã trả lời bằng "
+                                f"{language_name(transcription_info['language'])}. "
+                                "Vui lòng nói bằng tiếng Anh và thử lại!"
+                            )
                         else:
                             st.error(
                                 "❌ Không thể nhận dạng giọng nói. Vui lòng thử lại."
@@ -1360,6 +1590,28 @@ with tab2:
 
         st.divider()
 
+        # Âm hay sai qua các lần luyện (chế độ có câu gốc)
+        sound_totals = aggregate_problem_phonemes(st.session_state.history)
+        if sound_totals:
+            st.subheader("🔤 Âm hay phát âm sai")
+            sounds = sound_totals.most_common(10)
+            fig_sounds = go.Figure(
+                go.Bar(
+                    x=[f"/{symbol}/" for symbol, _ in sounds],
+                    y=[count for _, count in sounds],
+                    marker_color="#ff9800",
+                )
+            )
+            fig_sounds.update_layout(
+                xaxis_title="Âm", yaxis_title="Số lần sai", height=300
+            )
+            st.plotly_chart(fig_sounds, use_container_width=True)
+            for symbol, _ in sounds[:3]:
+                if symbol in PHONEME_TIPS:
+                    st.markdown(f"• **/{symbol}/**: {PHONEME_TIPS[symbol]}")
+
+            st.divider()
+
         # Xuất báo cáo
         st.subheader("📥 Xuất dữ liệu")
 
@@ -0,0 +1,429 @@
+"""
+Audio decoding straight to 16 kHz mono float32 NumPy arrays
+
+Uncompressed WAV (what st.audio_input records) is parsed with NumPy alone,
+without spawning ffmpeg. Other formats are decoded by ffmpeg, which writes
+raw float32 samples to a pipe that is read into one preallocated buffer
+(no AudioSegment copies, no int16 intermediate).
+"""
+
+import io
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+# Buffer capacity when the duration is not known in advance (grown as needed)
+INITIAL_BUFFER_SECONDS = 60
+
+# Resampling filter: zero crossings per side and Kaiser window shape
+RESAMPLE_ZERO_CROSSINGS = 16
+RESAMPLE_KAISER_BETA = 8.6
+RESAMPLE_BLOCK = 1 << 15  # output samples per vectorized block
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Video containers accepted by the uploader (only their audio is used)
+VIDEO_FORMATS = {"mp4", "mov", "webm"}
+
+# Block size of stream_decode() for chunked ingest of long uploads
+STREAM_BLOCK_SECONDS = 1.0
+
+# Bytes handed to ffmpeg per write when the source is a file-like object
+FEED_BLOCK_BYTES = 1 << 20
+
+
+def _feed_stdin(stdin, source):
+    """Copy a file-like source into ffmpeg's stdin (runs on a helper thread)"""
+    try:
+        while True:
+            block = source.read(FEED_BLOCK_BYTES)
+            if not block:
+                break
+            stdin.write(block)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg stopped reading (bad input); its exit code reports why
+        pass
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _start_ffmpeg(source, sample_rate):
+    """
+    Launch ffmpeg writing mono float32 at `sample_rate` to its stdout
+    Returns: (process, feeder thread or None)
+    """
+    from_path = isinstance(source, (str, bytes)) or hasattr(source, "__fspath__")
+
+    # fmt: off
+    cmd = [
+        "ffmpeg",
+        "-threads", "0",
+        "-i", source if from_path else "pipe:0",
+        "-f", "f32le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-loglevel", "error",
+        "pipe:1",
+    ]
+    # fmt: on
+
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL if from_path else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    feeder = None
+    if not from_path:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        feeder = threading.Thread(
+            target=_feed_stdin, args=(process.stdin, source), daemon=True
+        )
+        feeder.start()
+
+    return process, feeder
+
+
+def _finish_ffmpeg(process, feeder, stop=False):
+    """Wait for ffmpeg (killing it if `stop`) and raise if decoding failed"""
+    if stop:
+        process.kill()
+    process.stdout.close()
+    errors = process.stderr.read().decode(errors="replace")
+    process.wait()
+    if feeder is not None:
+        feeder.join()
+
+    if process.returncode != 0 and not stop:
+        raise RuntimeError(f"Failed to decode audio: {errors.strip()}")
+
+
+def decode_audio(source, expected_seconds=None, sample_rate=SAMPLE_RATE):
+    """
+    Decode any ffmpeg-readable file to mono float32 at `sample_rate`
+
+    `source` is a path or a file-like object (e.g. a Streamlit upload).
+    `expected_seconds` sizes the buffer up front; without it the buffer
+    starts at INITIAL_BUFFER_SECONDS and doubles when full.
+    Returns: 1-D float32 array
+    """
+    process, feeder = _start_ffmpeg(source, sample_rate)
+
+    seconds = expected_seconds if expected_seconds else INITIAL_BUFFER_SECONDS
+    # A little headroom: the resampler may emit a few extra samples
+    buffer = np.empty(int(seconds * sample_rate) + sample_rate // 10, np.float32)
+    view = memoryview(buffer).cast("B")
+    filled = 0
+
+    try:
+        while True:
+            if filled == len(view):
+                grown = np.empty(len(buffer) * 2, np.float32)
+                grown[: len(buffer)] = buffer
+                buffer = grown
+                view = memoryview(buffer).cast("B")
+
+            count = process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+    except BaseException:
+        _finish_ffmpeg(process, feeder, stop=True)
+        raise
+    _finish_ffmpeg(process, feeder)
+
+    return buffer[: filled // 4]
+
+
+def stream_decode(source, block_seconds=STREAM_BLOCK_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Decode with ffmpeg block by block, for recordings too long to hold whole
+
+    Every block is read into the same preallocated buffer, so memory stays
+    flat however long the file is. The yielded array is overwritten by the
+    next block: copy it if it has to outlive the iteration.
+    Yields: 1-D float32 arrays of `block_seconds` (the last one shorter)
+    """
+    process, feeder = _start_ffmpeg(source, sample_rate)
+    buffer = np.empty(int(block_seconds * sample_rate), np.float32)
+    view = memoryview(buffer).cast("B")
+    finished = False
+
+    try:
+        while True:
+            filled = 0
+            while filled < len(view):
+                count = process.stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+
+            if filled // 4:
+                yield buffer[: filled // 4]
+            if filled < len(view):
+                break
+        finished = True
+    finally:
+        # Stopped early (consumer broke out or failed): kill ffmpeg
+        _finish_ffmpeg(process, feeder, stop=not finished)
+
+
+def write_wav(file, audio, sample_rate=SAMPLE_RATE):
+    """
+    Write mono float32 samples as an IEEE-float WAV file (no int16 copy)
+    `file` is an open binary file; the data starts 4-byte aligned at byte 44
+    """
+    audio = np.ascontiguousarray(audio, dtype="<f4")
+    data_bytes = audio.nbytes
+
+    header = b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", 36 + data_bytes),
+            b"WAVE",
+            b"fmt ",
+            struct.pack(
+                "<IHHIIHH",
+                16,
+                WAVE_FORMAT_IEEE_FLOAT,
+                1,
+                sample_rate,
+                sample_rate * 4,
+                4,
+                32,
+            ),
+            b"data",
+            struct.pack("<I", data_bytes),
+        ]
+    )
+    file.write(header)
+    file.write(memoryview(audio).cast("B"))
+
+
+def _wav_layout(buffer):
+    """
+    Find the format and data chunks of a RIFF/WAVE buffer
+    Returns: (format_tag, channels, rate, bits, data_offset, data_bytes),
+    or None if this is not an uncompressed WAV file
+    """
+    total = len(buffer)
+    if total < 12 or buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= total:
+        chunk_id = bytes(buffer[pos : pos + 4])
+        (size,) = struct.unpack_from("<I", buffer, pos + 4)
+        body = pos + 8
+
+        if chunk_id == b"fmt " and size >= 16:
+            tag, channels, rate, _, _, bits = struct.unpack_from(
+                "<HHIIHH", buffer, body
+            )
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                (tag,) = struct.unpack_from("<H", buffer, body + 24)
+            fmt = (tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            # Browser recorders stream the file and may leave the size unset
+            return (*fmt, body, min(size, total - body))
+
+        pos = body + size + (size & 1)
+
+    return None
+
+
+def _wav_samples(buffer, tag, channels, bits, offset, data_bytes):
+    """
+    Interleaved samples as a (frames, channels) array over the buffer (no copy)
+    plus the scale and offset that map them to [-1, 1]
+    """
+    width = bits // 8
+    frames = data_bytes // (width * channels)
+    count = frames * channels
+
+    if tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        raw = np.frombuffer(buffer, f"<f{width}", count, offset)
+        scale, shift = 1.0, 0.0
+    elif tag == WAVE_FORMAT_PCM and bits == 8:
+        raw = np.frombuffer(buffer, np.uint8, count, offset)
+        scale, shift = 1 / 128, 128.0
+    elif tag == WAVE_FORMAT_PCM and bits in (16, 32):
+        raw = np.frombuffer(buffer, f"<i{width}", count, offset)
+        scale, shift = 1 / 2 ** (bits - 1), 0.0
+    elif tag == WAVE_FORMAT_PCM and bits == 24:
+        # Packed 3-byte samples: place them in the top of int32 words
+        packed = np.frombuffer(buffer, np.uint8, count * 3, offset).reshape(-1, 3)
+        words = np.zeros((count, 4), np.uint8)
+        words[:, 1:] = packed
+        raw = words.view("<i4").ravel()
+        scale, shift = 1 / 2**31, 0.0
+    else:
+        return None
+
+    return raw.reshape(frames, channels), scale, shift
+
+
+def _kaiser_lowpass(up, down):
+    """Windowed-sinc anti-aliasing filter for resampling by up/down"""
+    factor = max(up, down)
+    half_length = RESAMPLE_ZERO_CROSSINGS * factor
+    positions = np.arange(-half_length, half_length + 1) / factor
+    taps = np.sinc(positions) * np.kaiser(2 * half_length + 1, RESAMPLE_KAISER_BETA)
+    taps *= up / factor
+    return taps, half_length
+
+
+def resample_poly(audio, source_rate, target_rate=SAMPLE_RATE):
+    """
+    Polyphase resampling of a mono signal (upsample, low-pass, downsample)
+
+    Only the filter taps that hit non-zero upsampled samples are evaluated:
+    each output sample is a dot product of one filter phase with the input.
+    Outputs are computed in blocks to keep the index matrix small.
+    """
+    if source_rate == target_rate or len(audio) == 0:
+        return audio.astype(np.float32, copy=False)
+
+    common = np.gcd(source_rate, target_rate)
+    up, down = target_rate // common, source_rate // common
+
+    taps, half_length = _kaiser_lowpass(up, down)
+    # Polyphase table: phases[p, k] = taps[p + k * up]
+    phase_length = -(-len(taps) // up)
+    padded = np.zeros(phase_length * up, np.float32)
+    padded[: len(taps)] = taps
+    phases = padded.reshape(phase_length, up).T
+
+    # Zero-pad the input so every window stays in range
+    margin = phase_length
+    signal = np.zeros(len(audio) + 2 * margin, np.float32)
+    signal[margin : margin + len(audio)] = audio
+
+    output_length = -(-len(audio) * up // down)
+    output = np.empty(output_length, np.float32)
+    back = np.arange(phase_length)
+
+    for start in range(0, output_length, RESAMPLE_BLOCK):
+        n = np.arange(start, min(start + RESAMPLE_BLOCK, output_length))
+        # Upsampled index of each output, shifted by the filter delay
+        upsampled = n * down + half_length
+        base = upsampled // up + margin
+        windows = signal[base[:, None] - back[None, :]]
+        output[n] = np.einsum("ij,ij->i", windows, phases[upsampled % up])
+
+    return output
+
+
+def read_wav(source, sample_rate=SAMPLE_RATE):
+    """
+    Read an uncompressed WAV file without ffmpeg
+
+    Uploads are read in place with np.frombuffer; channels are averaged
+    and the rate is converted with resample_poly().
+    Returns: 1-D float32 array, or None if `source` is not a PCM/float WAV
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as file:
+            if file.read(4) != b"RIFF":
+                return None
+        buffer = memoryview(np.fromfile(source, np.uint8))
+        from_upload = False
+    elif hasattr(source, "getbuffer"):
+        buffer = source.getbuffer()
+        from_upload = True
+    else:
+        return None
+
+    layout = _wav_layout(buffer)
+    if layout is None:
+        return None
+    tag, channels, rate, bits, offset, data_bytes = layout
+    if channels < 1 or bits % 8:
+        return None
+
+    samples = _wav_samples(buffer, tag, channels, bits, offset, data_bytes)
+    if samples is None:
+        return None
+    frames, scale, shift = samples
+
+    # Downmix in one vectorized pass (straight to float32)
+    if channels > 1:
+        audio = frames.mean(axis=1, dtype=np.float32)
+    else:
+        audio = frames[:, 0].astype(np.float32, copy=False)
+
+    if shift or scale != 1.0:
+        audio = (audio - shift) * np.float32(scale)
+
+    audio = resample_poly(audio, rate, sample_rate)
+
+    # Never hand out a view of the upload buffer
+    if from_upload and np.shares_memory(audio, frames):
+        audio = audio.copy()
+    return audio
+
+
+def load_audio(source, expected_seconds=None):
+    """
+    16 kHz mono float32 from a path or upload
+    PCM WAV (st.audio_input recordings) is read directly; ffmpeg decodes the rest
+    """
+    audio = read_wav(source)
+    if audio is None:
+        audio = decode_audio(source, expected_seconds)
+    return audio
+
+
+def extract_audio_track(video_file):
+    """
+    Pull the first audio stream out of a video upload without decoding
+    any video frames: stream copy into Matroska audio (accepts AAC, Opus,
+    Vorbis, MP3, PCM), or an audio-only WAV decode if copying fails
+    Returns: BytesIO with the audio-only file
+    """
+    # MP4/MOV keep their index at the end, so ffmpeg needs a seekable file
+    suffix = os.path.splitext(getattr(video_file, "name", ""))[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as video:
+        video.write(video_file.getbuffer())
+
+    try:
+        attempts = [
+            ["-c:a", "copy", "-f", "matroska"],
+            ["-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "wav"],
+        ]
+        errors = ""
+        for output_options in attempts:
+            # fmt: off
+            cmd = [
+                "ffmpeg", "-nostdin", "-loglevel", "error",
+                "-i", video.name,
+                "-map", "0:a:0", "-vn", "-sn", "-dn",
+                *output_options,
+                "pipe:1",
+            ]
+            # fmt: on
+            result = subprocess.run(cmd, capture_output=True)
+            if result.returncode == 0 and result.stdout:
+                return io.BytesIO(result.stdout)
+            errors = result.stderr.decode(errors="replace").strip()
+    finally:
+        os.unlink(video.name)
+
+    if "matches no streams" in errors:
+        raise RuntimeError("The video has no audio track")
+    raise RuntimeError(f"Failed to extract audio: {errors}")
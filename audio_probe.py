@@ -0,0 +1,309 @@
+"""
+Container header probing for uploads, before any decoding
+
+Duration, sample rate and channels are read from the container headers
+alone (WAV, FLAC, MP3, M4A, OGG, MP4, MOV, WebM), so a 2-hour or corrupt
+file is rejected right away instead of after a full decode. Limits are
+configurable per format.
+"""
+
+import mmap
+import os
+import struct
+
+# Per-format upload limits; "default" covers recordings of unknown type
+UPLOAD_LIMITS = {
+    "wav": {"max_mb": 200, "max_seconds": 30 * 60},
+    "mp3": {"max_mb": 60, "max_seconds": 30 * 60},
+    "m4a": {"max_mb": 60, "max_seconds": 30 * 60},
+    "ogg": {"max_mb": 60, "max_seconds": 30 * 60},
+    "flac": {"max_mb": 120, "max_seconds": 30 * 60},
+    "mp4": {"max_mb": 200, "max_seconds": 30 * 60},
+    "mov": {"max_mb": 200, "max_seconds": 30 * 60},
+    "webm": {"max_mb": 200, "max_seconds": 30 * 60},
+    "default": {"max_mb": 200, "max_seconds": 30 * 60},
+}
+
+# MPEG audio layer III tables
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000]}
+_MP3_SCAN_BYTES = 64 * 1024  # how far to look for the first frame
+
+
+class CorruptAudioError(ValueError):
+    """The container header is missing fields or inconsistent"""
+
+
+def _source_buffer(source):
+    """Random-access view of an upload (no copy) or a file (memory-mapped)"""
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    with open(source, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def detect_format(header, name=""):
+    """Container format from the magic bytes, falling back to the file name"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:4] == b"\x1a\x45\xdf\xa3":  # EBML (WebM/Matroska)
+        return "webm"
+    if header[4:8] == b"ftyp":
+        # ISO media: the major brand tells audio-only, QuickTime and MP4 apart
+        brand = bytes(header[8:12])
+        if brand == b"qt  ":
+            return "mov"
+        if brand[:3] in (b"M4A", b"M4B"):
+            return "m4a"
+        extension = os.path.splitext(name)[1].lower().lstrip(".")
+        return extension if extension in ("m4a", "mp4", "mov") else "mp4"
+    if header[:3] == b"ID3" or (
+        len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0
+    ):
+        return "mp3"
+
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    return extension if extension in UPLOAD_LIMITS else None
+
+
+def _probe_wav(buffer):
+    total = len(buffer)
+    fmt = None
+    pos = 12
+    while pos + 8 <= total:
+        chunk_id = bytes(buffer[pos : pos + 4])
+        (size,) = struct.unpack_from("<I", buffer, pos + 4)
+        if chunk_id == b"fmt ":
+            _, channels, rate, byte_rate, _, _ = struct.unpack_from(
+                "<HHIIHH", buffer, pos + 8
+            )
+            fmt = (channels, rate, byte_rate)
+        elif chunk_id == b"data":
+            if fmt is None or fmt[2] == 0:
+                raise CorruptAudioError("WAV data before its format chunk")
+            channels, rate, byte_rate = fmt
+            # Streamed recordings may leave the size unset: use the file size
+            data_bytes = min(size, total - pos - 8)
+            return data_bytes / byte_rate, rate, channels
+        pos += 8 + size + (size & 1)
+    raise CorruptAudioError("WAV file has no data chunk")
+
+
+def _probe_flac(buffer):
+    # First metadata block must be STREAMINFO (34 bytes)
+    if len(buffer) < 42 or buffer[4] & 0x7F != 0:
+        raise CorruptAudioError("FLAC file has no STREAMINFO block")
+    fields = int.from_bytes(buffer[18:26], "big")
+    rate = fields >> 44
+    channels = ((fields >> 41) & 0x7) + 1
+    total_samples = fields & ((1 << 36) - 1)
+    if rate == 0:
+        raise CorruptAudioError("FLAC STREAMINFO has no sample rate")
+    duration = total_samples / rate if total_samples else None
+    return duration, rate, channels
+
+
+def _probe_mp3(buffer):
+    start = 0
+    if buffer[:3] == b"ID3" and len(buffer) >= 10:
+        # ID3v2 tag size is a 28-bit syncsafe integer
+        size = 0
+        for byte in buffer[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        start = 10 + size
+
+    end = min(len(buffer) - 4, start + _MP3_SCAN_BYTES)
+    for pos in range(start, max(end, start)):
+        if buffer[pos] != 0xFF or buffer[pos + 1] & 0xE0 != 0xE0:
+            continue
+        (header,) = struct.unpack_from(">I", buffer, pos)
+        version_bits = (header >> 19) & 0x3
+        layer_bits = (header >> 17) & 0x3
+        bitrate_index = (header >> 12) & 0xF
+        rate_index = (header >> 10) & 0x3
+        if version_bits == 1 or layer_bits != 1 or rate_index == 3:
+            continue
+        if bitrate_index in (0, 15):
+            continue
+
+        version = 1 if version_bits == 3 else 2
+        rate = _MP3_SAMPLE_RATES[version][rate_index]
+        if version_bits == 0:  # MPEG 2.5
+            rate //= 2
+        mono = (header >> 6) & 0x3 == 3
+        channels = 1 if mono else 2
+        samples_per_frame = 1152 if version == 1 else 576
+
+        # Xing/Info (VBR) header: exact frame count
+        side_info = (
+            (32 if not mono else 17) if version == 1 else (17 if not mono else 9)
+        )
+        xing = pos + 4 + side_info
+        if bytes(buffer[xing : xing + 4]) in (b"Xing", b"Info"):
+            (flags,) = struct.unpack_from(">I", buffer, xing + 4)
+            if flags & 0x1:
+                (frames,) = struct.unpack_from(">I", buffer, xing + 8)
+                return frames * samples_per_frame / rate, rate, channels
+
+        # VBRI (Fraunhofer) header
+        vbri = pos + 4 + 32
+        if bytes(buffer[vbri : vbri + 4]) == b"VBRI":
+            (frames,) = struct.unpack_from(">I", buffer, vbri + 14)
+            return frames * samples_per_frame / rate, rate, channels
+
+        # Constant bitrate: audio bytes / byte rate
+        bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+        return (len(buffer) - pos) * 8 / bitrate, rate, channels
+
+    raise CorruptAudioError("no MP3 frame found")
+
+
+def _probe_m4a(buffer):
+    def boxes(start, end):
+        pos = start
+        while pos + 8 <= end:
+            size, kind = struct.unpack_from(">I4s", buffer, pos)
+            header = 8
+            if size == 1:
+                (size,) = struct.unpack_from(">Q", buffer, pos + 8)
+                header = 16
+            elif size == 0:
+                size = end - pos
+            if size < header:
+                raise CorruptAudioError("invalid MP4 box size")
+            yield kind, pos + header, min(pos + size, end)
+            pos += size
+
+    for kind, body, end in boxes(0, len(buffer)):
+        if kind != b"moov":
+            continue
+        for child, child_body, _ in boxes(body, end):
+            if child != b"mvhd":
+                continue
+            if buffer[child_body] == 1:
+                timescale, duration = struct.unpack_from(">IQ", buffer, child_body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", buffer, child_body + 12)
+            if timescale == 0:
+                raise CorruptAudioError("MP4 movie header has no timescale")
+            return duration / timescale, None, None
+    raise CorruptAudioError("MP4 file has no movie header (moov)")
+
+
+def _probe_ogg(buffer):
+    # Identification header sits in the first page, after the segment table
+    segments = buffer[26]
+    packet = 27 + segments
+    if bytes(buffer[packet : packet + 7]) == b"\x01vorbis":
+        channels = buffer[packet + 11]
+        (rate,) = struct.unpack_from("<I", buffer, packet + 12)
+        pre_skip = 0
+        granule_rate = rate
+    elif bytes(buffer[packet : packet + 8]) == b"OpusHead":
+        channels = buffer[packet + 9]
+        (pre_skip,) = struct.unpack_from("<H", buffer, packet + 10)
+        (rate,) = struct.unpack_from("<I", buffer, packet + 12)
+        granule_rate = 48000  # Opus granule positions are always 48 kHz
+    else:
+        raise CorruptAudioError("unsupported Ogg codec")
+    if granule_rate == 0:
+        raise CorruptAudioError("Ogg header has no sample rate")
+
+    # Duration = granule position of the last page
+    last_page = bytes(buffer[max(0, len(buffer) - 65536) :]).rfind(b"OggS")
+    if last_page < 0:
+        return None, rate, channels
+    last_page += max(0, len(buffer) - 65536)
+    (granule,) = struct.unpack_from("<q", buffer, last_page + 6)
+    return max(granule - pre_skip, 0) / granule_rate, rate, channels
+
+
+def _probe_webm(buffer):
+    # Segment Info: TimecodeScale (2AD7B1, ns per tick) and Duration (4489,
+    # float ticks). Live browser recordings often have no Duration at all.
+    head = bytes(buffer[:_MP3_SCAN_BYTES])
+    scale = 1_000_000
+    pos = head.find(b"\x2a\xd7\xb1")
+    if pos >= 0:
+        length = head[pos + 3] & 0x7F if head[pos + 3] & 0x80 else 0
+        if 1 <= length <= 8:
+            scale = int.from_bytes(head[pos + 4 : pos + 4 + length], "big")
+
+    pos = head.find(b"\x44\x89")
+    if pos >= 0 and head[pos + 2] in (0x84, 0x88):
+        kind = ">f" if head[pos + 2] == 0x84 else ">d"
+        (ticks,) = struct.unpack_from(kind, head, pos + 3)
+        if ticks > 0:
+            return ticks * scale / 1e9, None, None
+    return None, None, None
+
+
+_PROBES = {
+    "wav": _probe_wav,
+    "flac": _probe_flac,
+    "mp3": _probe_mp3,
+    "m4a": _probe_m4a,
+    "mp4": _probe_m4a,
+    "mov": _probe_m4a,
+    "webm": _probe_webm,
+    "ogg": _probe_ogg,
+}
+
+
+def probe_audio(source):
+    """
+    Read container headers of an upload or file without decoding it
+    Returns: dict(format, size_bytes, duration_seconds, sample_rate,
+    channels); unknown fields are None
+    Raises: CorruptAudioError when a known container is broken
+    """
+    buffer = _source_buffer(source)
+    name = getattr(source, "name", source if isinstance(source, str) else "")
+    info = {
+        "format": detect_format(bytes(buffer[:12]), name),
+        "size_bytes": len(buffer),
+        "duration_seconds": None,
+        "sample_rate": None,
+        "channels": None,
+    }
+
+    probe = _PROBES.get(info["format"])
+    if probe is not None and len(buffer) >= 12:
+        try:
+            duration, rate, channels = probe(buffer)
+        except (struct.error, IndexError) as e:
+            raise CorruptAudioError(f"truncated {info['format']} header") from e
+        info.update(duration_seconds=duration, sample_rate=rate, channels=channels)
+
+    return info
+
+
+def check_upload_limits(info, limits=None):
+    """
+    Compare probed metadata with the per-format limits
+    Returns: readable reason to reject the file, or None if it is fine
+    """
+    limits = limits or UPLOAD_LIMITS
+    limit = limits.get(info["format"], limits["default"])
+    label = (info["format"] or "audio").upper()
+
+    size_mb = info["size_bytes"] / (1024 * 1024)
+    if size_mb > limit["max_mb"]:
+        return f"{label} file is {size_mb:.0f} MB (limit {limit['max_mb']} MB)."
+
+    duration = info["duration_seconds"]
+    if duration is not None and duration > limit["max_seconds"]:
+        return (
+            f"Recording is {duration / 60:.1f} minutes long "
+            f"(limit {limit['max_seconds'] / 60:.0f} minutes for {label})."
+        )
+    return None
@@ -0,0 +1,393 @@
+"""
+Batch scoring of stored transcripts, e.g. to compare rule versions
+
+`score_batch` takes a DataFrame with text, confidence, duration and topic
+columns (and optionally info, each row's transcription_info) and scores
+every row with the same rules as scoring.analyze_speech. The texts are
+tokenized together:
+every text is split with the C-level str/re methods, the tokens are
+flattened into one array, and word counts, diversity, repeats and rule phrases (n-gram
+comparisons of factorized word codes) are counted per row with NumPy. The
+thresholds, step tables and quality adjustment are array operations too.
+Feedback markdown is only built when asked for.
+"""
+
+import itertools
+import re
+
+import numpy as np
+import pandas as pd
+
+from scoring import generate_feedback, rule_file
+from signal_quality import signal_quality_penalty
+from text_analysis import analyze_text
+
+# Same tokenization as text_analysis (letters) and phrase_matcher (words)
+_NON_LETTERS_OR_SPACE = re.compile(r"[^a-z\s]")
+_WORD_OR_BREAK = re.compile(r"(\w+)|[^\w\s]+")
+
+NO_SPEECH_FEEDBACK = "⚠️ No speech detected. Please try again."
+
+CRITERIA = ["Pronunciation", "Fluency", "Grammar", "Vocabulary", "Communication"]
+
+
+def _round(values, digits):
+    """
+    np.round that agrees bit for bit with Python's round(): values whose
+    scaled fraction is within rounding error of .5 (where the two can differ)
+    are redone with round()
+    """
+    values = np.asarray(values, dtype=float)
+    scaled = values * 10.0**digits
+    rounded = np.round(values, digits)
+    tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for index in np.flatnonzero(tie):
+        rounded[index] = round(float(values[index]), digits)
+    return rounded
+
+
+def _flatten(token_lists):
+    """
+    Flatten a list of token lists
+    Returns: (object array of tokens, row number of each token)
+    """
+    lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+    tokens = np.fromiter(
+        itertools.chain.from_iterable(token_lists), dtype=object, count=lengths.sum()
+    )
+    return tokens, np.repeat(np.arange(len(lengths)), lengths)
+
+
+def _per_row(rows, mask, count):
+    """Number of masked tokens in each row"""
+    return np.bincount(rows[mask], minlength=count)
+
+
+def _text_features(texts, rules):
+    """
+    Token features of every text, computed over the flattened corpus (the
+    batch equivalent of analyze_text)
+    Returns: dict of per-row arrays, with `phrases` mapping each rule phrase
+    to a boolean array
+    """
+    texts = list(texts)
+    count = len(texts)
+    lower = list(map(str.lower, texts))
+
+    # 1. Whitespace tokens: word count and basic-verb membership
+    tokens, rows = _flatten(list(map(str.split, lower)))
+    word_count = np.bincount(rows, minlength=count)
+    verbs = pd.Series(tokens, dtype=object).isin(rules.words["basic_verbs"])
+    has_verb = _per_row(rows, verbs.to_numpy(), count) > 0
+
+    # 2. Letter-only words: length, diversity and adjacent repeats
+    stripped = map(_NON_LETTERS_OR_SPACE.sub, itertools.repeat(""), lower)
+    letters, letter_rows = _flatten(list(map(str.split, stripped)))
+    codes, _ = pd.factorize(letters)
+    long = np.fromiter(map(len, letters), dtype=np.int64, count=len(letters)) > 2
+    long_count = _per_row(letter_rows, long, count)
+    pairs = np.unique(letter_rows[long] * (codes.max(initial=0) + 1) + codes[long])
+    unique_long_count = np.bincount(
+        pairs // (codes.max(initial=0) + 1), minlength=count
+    )
+    repeated = (
+        (codes[1:] == codes[:-1]) & (letter_rows[1:] == letter_rows[:-1]) & long[:-1]
+    )
+    repeated_count = _per_row(letter_rows[1:], repeated, count)
+
+    # Every token without 3+ letters is short; non-ASCII texts count
+    # letters on the original characters, so they go through analyze_text
+    short_count = word_count - long_count
+    for index, text in enumerate(texts):
+        if not text.isascii():
+            short_count[index] = analyze_text(text).short_count
+
+    # 3. Rule phrases: consecutive words with no punctuation in between
+    words, word_rows = _flatten(list(map(_WORD_OR_BREAK.findall, lower)))
+    word_codes, vocabulary = pd.factorize(words)
+    lookup = {word: code for code, word in enumerate(vocabulary)}
+    phrases = {}
+    for phrase in rules.matcher.phrases:
+        parts = [lookup.get(word, -1) for word in phrase.split()]
+        span = len(parts) - 1
+        if -1 in parts or len(words) <= span:
+            phrases[phrase] = np.zeros(count, dtype=bool)
+            continue
+        starts = len(words) - span
+        match = word_rows[:starts] == word_rows[span:]
+        for offset, code in enumerate(parts):
+            match &= word_codes[offset : offset + starts] == code
+        phrases[phrase] = _per_row(word_rows[:starts], match, count) > 0
+
+    return {
+        "word_count": word_count,
+        "short_count": short_count,
+        "repeated_count": repeated_count,
+        "long_count": long_count,
+        "unique_long_count": unique_long_count,
+        "has_verb": has_verb,
+        "phrases": phrases,
+    }
+
+
+def _any_phrase(features, phrases):
+    present = np.zeros(len(features["word_count"]), dtype=bool)
+    for phrase in phrases:
+        present |= features["phrases"][phrase]
+    return present
+
+
+def _count_phrases(features, phrases):
+    return sum(features["phrases"][phrase].astype(np.int64) for phrase in phrases)
+
+
+def _info_column(timings, name):
+    """One timing metric per row (0 where there are no word timings)"""
+    return np.array([timing[name] if timing else 0.0 for timing in timings], float)
+
+
+def _language_warnings(infos):
+    """Per row: the "may not be in English" warning of analyze_speech, or None"""
+    if all(not info or info["language"] == "en" for info in infos):
+        return [None] * len(infos)
+    # Imported here: whisper (and torch) only load when a warning needs it
+    from whisper_cache import language_name
+
+    return [
+        (
+            f"Answer may not be in English "
+            f"(detected: {language_name(info['language'])})"
+            if info and info["language"] != "en"
+            else None
+        )
+        for info in infos
+    ]
+
+
+def score_batch(frame, rules=None, feedback=False):
+    """
+    Score a DataFrame of transcripts (columns: text, confidence, duration,
+    topic; optional info with the transcription_info of each row, None
+    where there is none)
+    Returns: DataFrame on the same index with the five criteria, Total,
+    Confidence, RawConfidence, WordCount, SpeechRate, SpeedCategory,
+    IsFluentSpeaker, SpeakerLevel, DetectedWarnings (and Feedback when
+    `feedback` is True). Rows without speech get Total 0 and NaN criteria.
+    """
+    rules = rules or rule_file().current()
+
+    texts = frame["text"].fillna("").astype(str)
+    confidence = frame["confidence"].to_numpy(dtype=float)
+    duration = frame["duration"].to_numpy(dtype=float)
+    empty = (texts.str.strip().str.len() == 0).to_numpy()
+    infos = frame["info"].tolist() if "info" in frame else [None] * len(frame)
+    timings = [info.get("timing") if info else None for info in infos]
+    has_timing = np.array([bool(timing) for timing in timings], dtype=bool)
+
+    # 1. Token features of all texts at once
+    features = _text_features(texts, rules)
+    word_count = features["word_count"]
+    words = np.maximum(word_count, 1)  # empty rows are masked at the end
+
+    # 2. Speech rate (over the speaking span when word timings exist)
+    duration = np.where(has_timing, _info_column(timings, "speaking_seconds"), duration)
+    timed = duration > 0
+    wps = np.divide(word_count, duration, out=np.zeros(len(frame)), where=timed)
+    speech_rate = np.where(timed, _round(wps, 2), 0.0)
+    speed_category = np.where(
+        timed, rules["speech_rate"]["category"].lookup(wps), "unknown"
+    )
+
+    # 3. Fluent speaker detection
+    r = rules["fluent_speaker"]
+    by_length = word_count >= r["min_words"]
+    by_rate = speech_rate >= r["min_rate"]
+    advanced = (
+        _count_phrases(features, rules.phrases["advanced_connectors"])
+        >= r["advanced_connectors"]
+    ) & (word_count >= r["advanced_min_words"])
+    is_fluent = by_length | by_rate | advanced
+    intermediate = (word_count >= r["intermediate_min_words"]) & (
+        speech_rate >= r["intermediate_min_rate"]
+    )
+    speaker_level = np.select(
+        [advanced, is_fluent, intermediate],
+        ["advanced", "fluent", "intermediate"],
+        "beginner",
+    )
+
+    # 4. Pronunciation (quality score, then protected/standard scoring)
+    r = rules["pronunciation"]
+    unclear = features["short_count"] / words > r["short_word_ratio"]
+    stuttering = features["repeated_count"] > r["repeated_words"]
+    quality = np.where(unclear, confidence - r["short_word_penalty"], confidence)
+    quality = np.where(stuttering, quality - r["repeated_penalty"], quality)
+    signal = [
+        signal_quality_penalty(info.get("signal") if info else None) for info in infos
+    ]
+    quality = quality - np.array([penalty for penalty, _ in signal], dtype=float)
+    quality = np.maximum(quality, r["quality_floor"])
+
+    fluent = r["fluent"]
+    fluent_score = fluent["base"] + fluent["confidence_penalty"].lookup(quality)
+    fluent_score = np.where(
+        quality >= fluent["clear_speech"],
+        fluent_score + fluent["clear_bonus"],
+        fluent_score,
+    )
+    fluent_score = np.minimum(np.maximum(fluent_score, fluent["floor"]), 2.0)
+    beginner = r["beginner"]
+    beginner_score = beginner["base"] + beginner["confidence_penalty"].lookup(quality)
+    beginner_score = np.minimum(np.maximum(beginner_score, beginner["floor"]), 2.0)
+    pronunciation = _round(np.where(is_fluent, fluent_score, beginner_score), 1)
+
+    # 5. Fluency
+    r = rules["fluency"]
+    fluency = r["word_count_score"].lookup(word_count)
+    fluency = fluency + r["connector_bonus"].lookup(
+        _count_phrases(features, rules.phrases["fluency_connectors"])
+    )
+    fluency = fluency + r["rate_bonus"].lookup(speech_rate)
+    # Pauses, runs and fillers of rows with word timings
+    fluency = np.where(
+        has_timing & (_info_column(timings, "mean_run_length") >= r["long_run_words"]),
+        fluency + r["long_run_bonus"],
+        fluency,
+    )
+    long_pause = has_timing & (_info_column(timings, "max_pause") >= r["long_pause"])
+    slow_pauses = has_timing & (_info_column(timings, "mean_pause") >= r["mean_pause"])
+    fluency = np.where(
+        long_pause,
+        fluency - r["long_pause_penalty"],
+        np.where(slow_pauses, fluency - r["mean_pause_penalty"], fluency),
+    )
+    fluency = np.where(
+        has_timing
+        & (_info_column(timings, "filler_count") > word_count * r["filler_ratio"]),
+        fluency - r["filler_penalty"],
+        fluency,
+    )
+    fluency = np.maximum(np.minimum(_round(fluency, 1), r["max"]), r["min"])
+
+    # 6. Grammar
+    r = rules["grammar"]
+    grammar = np.full(len(frame), float(r["base"]))
+    for wrong, _ in rules.phrases["common_errors"]:
+        grammar = np.where(
+            features["phrases"][wrong], grammar - r["error_penalty"], grammar
+        )
+    grammar = np.where(
+        ~features["has_verb"] & (word_count > r["verb_check_min_words"]),
+        grammar - r["missing_verb_penalty"],
+        grammar,
+    )
+    grammar = np.maximum(_round(grammar, 1), r["floor"])
+
+    # 7. Vocabulary
+    r = rules["vocabulary"]
+    long_count = features["long_count"]
+    diversity = features["unique_long_count"] / np.maximum(long_count, 1)
+    vocabulary = np.where(
+        long_count == 0,
+        r["empty_score"],
+        _round(r["diversity_score"].lookup(diversity).astype(float), 1),
+    )
+
+    # 8. Communication
+    r = rules["communication"]
+    communication = r["base"] + r["length_bonus"].lookup(word_count)
+    communication = np.where(
+        _any_phrase(features, rules.phrases["communication_connectors"]),
+        communication + r["connector_bonus"],
+        communication,
+    )
+    communication = np.where(
+        _any_phrase(features, rules.phrases["personal_markers"]),
+        communication + r["personal_bonus"],
+        communication,
+    )
+    communication = np.where(
+        is_fluent & (word_count >= r["fluent_detail_words"]),
+        communication + r["fluent_detail_bonus"],
+        communication,
+    )
+    communication = np.maximum(np.minimum(_round(communication, 1), r["max"]), r["min"])
+
+    # 9. Quality adjustment of everything except Pronunciation
+    r = rules["quality_adjustment"]
+    multiplier = np.where(
+        is_fluent,
+        r["fluent_multiplier"].lookup(quality),
+        r["beginner_multiplier"].lookup(quality),
+    )
+    adjust = quality < r["skip_at"]
+    scores = {"Pronunciation": pronunciation}
+    for name, values in (
+        ("Fluency", fluency),
+        ("Grammar", grammar),
+        ("Vocabulary", vocabulary),
+        ("Communication", communication),
+    ):
+        scores[name] = np.where(adjust, values * multiplier, values)
+
+    total = scores["Pronunciation"]
+    for name in CRITERIA[1:]:
+        total = total + scores[name]
+
+    warnings = [
+        (["Some words may be unclear"] if u else [])
+        + (["Audio may have stuttering"] if s else [])
+        + signal_warnings
+        + ([language] if language else [])
+        + (
+            ["Repeated or unclear phrases were removed from the transcript"]
+            if info and info.get("removed_segments")
+            else []
+        )
+        for u, s, (_, signal_warnings), language, info in zip(
+            unclear, stuttering, signal, _language_warnings(infos), infos
+        )
+    ]
+
+    result = pd.DataFrame(
+        {name: _round(scores[name], 1) for name in CRITERIA}, index=frame.index
+    )
+    result["Total"] = np.where(empty, 0.0, _round(total, 1))
+    result["Confidence"] = _round(quality * 100, 1)
+    result["RawConfidence"] = _round(confidence * 100, 1)
+    result["WordCount"] = word_count
+    result["SpeechRate"] = speech_rate
+    result["SpeedCategory"] = speed_category
+    result["IsFluentSpeaker"] = is_fluent
+    result["SpeakerLevel"] = speaker_level
+    result["DetectedWarnings"] = warnings
+
+    # Rows without speech are not scored (analyze_speech returns 0)
+    result.loc[empty, CRITERIA + ["Confidence", "RawConfidence", "SpeechRate"]] = np.nan
+
+    if feedback:
+        result["Feedback"] = [
+            (
+                NO_SPEECH_FEEDBACK
+                if skip
+                else generate_feedback(
+                    text,
+                    row,
+                    topic,
+                    quality_score,
+                    row["IsFluentSpeaker"],
+                    # analyze_speech reports an untimed rate as the integer 0
+                    (row["SpeechRate"] if has_time else 0, row["SpeedCategory"]),
+                )
+            )
+            for text, topic, quality_score, has_time, skip, row in zip(
+                texts,
+                frame["topic"],
+                quality.tolist(),
+                timed,
+                empty,
+                result.to_dict("records"),
+            )
+        ]
+
+    return result
@@ -0,0 +1,167 @@
+"""
+Bounded-memory ingest of long uploads
+
+The file is decoded block by block (stream_decode), cut into chunks of at
+most CHUNK_SECONDS at pauses found by a NumPy energy VAD, and each chunk
+with speech is transcribed on its own. Segment times are shifted back to
+the recording timeline and merged. Only about one chunk of audio is held
+in memory, however long the recording is.
+"""
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+from audio_decode import stream_decode
+from denoise import spectral_gate
+from hallucination import filtered_transcribe, shift_segment
+from signal_quality import SignalMeter, energy_speech_mask
+from whisper_cache import LANGUAGE_REJECT_PROBABILITY, detect_language
+
+# Uploads larger than this go through the chunked path
+CHUNKED_INGEST_BYTES = 5 * 1024 * 1024
+
+# Chunks are cut at the last pause in their final CUT_SEARCH_SECONDS, so
+# every chunk is between CHUNK - CUT_SEARCH and CHUNK seconds long
+CHUNK_SECONDS = 28.0
+CUT_SEARCH_SECONDS = 5.0
+
+# Energy VAD over 30 ms frames (thresholds: signal_quality.energy_speech_mask)
+VAD_FRAME_SECONDS = 0.03
+
+
+def use_chunked_ingest(audio_file):
+    """Upload is large enough that decoding it whole would use a lot of memory"""
+    if hasattr(audio_file, "getbuffer"):
+        return audio_file.getbuffer().nbytes > CHUNKED_INGEST_BYTES
+    return getattr(audio_file, "size", 0) > CHUNKED_INGEST_BYTES
+
+
+def speech_mask(audio):
+    """
+    Energy VAD over fixed frames
+    Returns: boolean array, one entry per VAD_FRAME_SECONDS frame
+    """
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    count = len(audio) // frame
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+
+    frames = audio[: count * frame].reshape(count, frame)
+    energy = np.einsum("ij,ij->i", frames, frames) / frame
+    return energy_speech_mask(10 * np.log10(energy + 1e-10))
+
+
+def _cut_point(mask, length):
+    """Sample index of the last pause in the tail of a full chunk"""
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    search = int(CUT_SEARCH_SECONDS / VAD_FRAME_SECONDS)
+    tail = np.flatnonzero(~mask[-search:])
+    if tail.size == 0:
+        return length
+    return int(len(mask) - search + tail[-1] + 1) * frame
+
+
+def speech_chunks(source, chunk_seconds=CHUNK_SECONDS):
+    """
+    Stream a file as chunks cut at pauses
+    Yields: (offset_seconds, chunk, has_speech) with chunks of at most
+    `chunk_seconds`; silent chunks are yielded so callers can keep time
+    """
+    chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+    pending = np.zeros(chunk_samples, np.float32)
+    filled = 0
+    offset = 0
+
+    for block in stream_decode(source):
+        position = 0
+        while position < len(block):
+            take = min(len(block) - position, chunk_samples - filled)
+            pending[filled : filled + take] = block[position : position + take]
+            filled += take
+            position += take
+
+            if filled < chunk_samples:
+                continue
+
+            mask = speech_mask(pending[:filled])
+            cut = _cut_point(mask, filled)
+            chunk = pending[:cut].copy()
+            has_speech = bool(mask[: cut // int(VAD_FRAME_SECONDS * SAMPLE_RATE)].any())
+            yield offset / SAMPLE_RATE, chunk, has_speech
+
+            # Carry the audio after the cut into the next chunk
+            pending[: filled - cut] = pending[cut:filled]
+            filled -= cut
+            offset += cut
+
+    if filled:
+        chunk = pending[:filled].copy()
+        yield offset / SAMPLE_RATE, chunk, bool(speech_mask(chunk).any())
+
+
+def transcribe_stream(
+    model,
+    source,
+    chunk_seconds=CHUNK_SECONDS,
+    denoise=False,
+    cancelled=None,
+    **options,
+):
+    """
+    Chunk-by-chunk transcription of a long file (hallucination filter per chunk)
+
+    The language is checked on the first chunk with speech; a confident
+    non-English result stops ingest right there. `denoise` applies spectral
+    gating per chunk; setting the `cancelled` event stops between chunks.
+    Returns: Whisper-style result dict plus "removed_segments",
+    "truncated_segments", "duration_seconds", "language",
+    "language_probability", "rejected", "signal" (signal_metrics) and
+    "envelope_db" (energy envelope of the whole recording)
+    """
+    segments = []
+    removed = 0
+    truncated = 0
+    text = ""
+    duration = 0.0
+    language, language_prob = None, 0.0
+    rejected = False
+    meter = SignalMeter()
+
+    for offset, chunk, has_speech in speech_chunks(source, chunk_seconds):
+        duration = offset + len(chunk) / SAMPLE_RATE
+        if cancelled is not None and cancelled.is_set():
+            break
+        meter.add(chunk)
+        if not has_speech:
+            continue
+        if denoise:
+            chunk = spectral_gate(chunk)
+
+        if language is None:
+            language, language_prob = detect_language(model, chunk)
+            if language != "en" and language_prob >= LANGUAGE_REJECT_PROBABILITY:
+                rejected = True
+                break
+
+        chunk_options = dict(options)
+        if text:
+            chunk_options["initial_prompt"] = text[-200:]
+
+        result = filtered_transcribe(model, chunk, **chunk_options)
+        segments.extend(shift_segment(s, offset) for s in result["segments"])
+        text = "".join(segment["text"] for segment in segments)
+        removed += result["removed_segments"]
+        truncated += result["truncated_segments"]
+
+    return {
+        "text": text.strip(),
+        "segments": segments,
+        "removed_segments": removed,
+        "truncated_segments": truncated,
+        "duration_seconds": duration,
+        "language": language or "en",
+        "language_probability": language_prob if language else 1.0,
+        "rejected": rejected,
+        "signal": meter.metrics(),
+        "envelope_db": meter.envelope_db(),
+    }
@@ -0,0 +1,95 @@
+"""
+Spectral-gating noise reduction (stationary noise such as fans or hum)
+
+The noise profile per frequency is taken from the quietest STFT frames;
+time-frequency bins that do not rise clearly above it are attenuated.
+Everything is vectorized NumPy: one batched rfft/irfft over all frames.
+"""
+
+import numpy as np
+
+N_FFT = 512  # 32 ms at 16 kHz
+HOP = N_FFT // 4
+
+# Frames at or below this energy percentile form the noise profile
+NOISE_PERCENTILE = 20
+
+# Bins this many standard deviations above the noise mean are kept
+GATE_STD = 1.5
+
+# How much gated bins are attenuated (1.0 = removed completely)
+PROP_DECREASE = 0.9
+
+# Mask smoothing radius in frequency bins and in frames
+SMOOTH_BINS = 2
+SMOOTH_FRAMES = 2
+
+
+def _box_smooth(array, radius, axis):
+    """Moving average along one axis (cumulative-sum box filter)"""
+    if radius == 0:
+        return array
+    width = 2 * radius + 1
+    pad = [(0, 0)] * array.ndim
+    pad[axis] = (radius + 1, radius)
+    padded = np.pad(array, pad, mode="edge")
+    cumulative = np.cumsum(padded, axis=axis)
+    upper = np.take(cumulative, np.arange(width, cumulative.shape[axis]), axis=axis)
+    lower = np.take(cumulative, np.arange(0, cumulative.shape[axis] - width), axis=axis)
+    return (upper - lower) / width
+
+
+def _stft(audio, window):
+    """Frames of the padded signal (strided view) -> complex spectrogram"""
+    padded = np.pad(audio, (N_FFT // 2, N_FFT // 2 + HOP))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP]
+    return np.fft.rfft(frames * window, axis=1)
+
+
+def _istft(spectrum, window, length):
+    """Weighted overlap-add, vectorized per overlap position"""
+    frames = np.fft.irfft(spectrum, n=N_FFT, axis=1) * window
+    count = len(frames)
+    overlap = N_FFT // HOP
+
+    # Frame i covers blocks i .. i + overlap - 1 of HOP samples
+    blocks = frames.reshape(count, overlap, HOP)
+    output = np.zeros((count + overlap - 1, HOP))
+    weight = np.zeros((count + overlap - 1, HOP))
+    window_blocks = (window**2).reshape(overlap, HOP)
+    for r in range(overlap):
+        output[r : r + count] += blocks[:, r]
+        weight[r : r + count] += window_blocks[r]
+
+    output = output.ravel() / np.maximum(weight.ravel(), 1e-8)
+    start = N_FFT // 2
+    return output[start : start + length]
+
+
+def spectral_gate(audio):
+    """
+    Remove stationary background noise from 16 kHz mono float32 audio
+    Returns: denoised float32 array of the same length
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < N_FFT:
+        return audio
+
+    window = np.hanning(N_FFT + 1)[:-1]  # periodic Hann
+    spectrum = _stft(audio, window)
+    level_db = 20 * np.log10(np.abs(spectrum) + 1e-10)
+
+    # Noise profile from the quietest frames
+    frame_energy = level_db.mean(axis=1)
+    quiet = frame_energy <= np.percentile(frame_energy, NOISE_PERCENTILE)
+    noise_mean = level_db[quiet].mean(axis=0)
+    noise_std = level_db[quiet].std(axis=0)
+    threshold = noise_mean + GATE_STD * noise_std
+
+    # Smoothed binary mask -> gain per time-frequency bin
+    mask = (level_db > threshold).astype(np.float32)
+    mask = _box_smooth(mask, SMOOTH_BINS, axis=1)
+    mask = _box_smooth(mask, SMOOTH_FRAMES, axis=0)
+    gain = 1.0 - PROP_DECREASE * (1.0 - mask)
+
+    return _istft(spectrum * gain, window, len(audio)).astype(np.float32)
@@ -0,0 +1,88 @@
+"""
+Benchmark of the spectral-gating denoise stage on noisy clips: its CPU cost
+against the Whisper decode time it saves (fewer temperature fallbacks).
+
+Usage:
+    python denoise_benchmark.py noisy1.wav [noisy2.mp3 ...] [--model base]
+    python denoise_benchmark.py clean.wav --add-noise-snr 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+import whisper
+
+from audio_decode import load_audio
+from denoise import spectral_gate
+from hallucination import filtered_transcribe
+from signal_quality import signal_metrics
+
+
+def add_noise(audio, snr_db, seed=0):
+    """Mix in white noise at the given SNR (relative to the clip's RMS)"""
+    rng = np.random.default_rng(seed)
+    rms = np.sqrt(np.mean(audio**2))
+    noise_rms = rms / (10 ** (snr_db / 20))
+    return (audio + rng.normal(0, noise_rms, len(audio))).astype(np.float32)
+
+
+def timed_transcribe(model, audio):
+    """Transcribe like the app does; returns (seconds, fallbacks, result)"""
+    start = time.perf_counter()
+    result = filtered_transcribe(model, audio, language="en", word_timestamps=True)
+    elapsed = time.perf_counter() - start
+    # Segments decoded above temperature 0 needed at least one fallback
+    fallbacks = sum(1 for s in result["segments"] if s.get("temperature", 0) > 0)
+    return elapsed, fallbacks, result
+
+
+def benchmark(path, model, snr_db=None):
+    audio = load_audio(path)
+    if snr_db is not None:
+        audio = add_noise(audio, snr_db)
+    seconds = len(audio) / 16000
+
+    start = time.perf_counter()
+    cleaned = spectral_gate(audio)
+    denoise_time = time.perf_counter() - start
+
+    raw_time, raw_fallbacks, raw = timed_transcribe(model, audio)
+    clean_time, clean_fallbacks, clean = timed_transcribe(model, cleaned)
+
+    print(f"\n=== {path} ({seconds:.1f}s) ===")
+    print(
+        f"SNR estimate: {signal_metrics(audio)['snr_db']} dB -> "
+        f"{signal_metrics(cleaned)['snr_db']} dB"
+    )
+    print(
+        f"Denoise:  {denoise_time * 1000:7.1f} ms "
+        f"({denoise_time / seconds * 1000:.2f} ms per audio second)"
+    )
+    print(f"Raw:      {raw_time * 1000:7.1f} ms, {raw_fallbacks} fallback segments")
+    print(f"Denoised: {clean_time * 1000:7.1f} ms, {clean_fallbacks} fallback segments")
+    saved = raw_time - clean_time
+    print(f"Net:      {(saved - denoise_time) * 1000:+7.1f} ms saved")
+    print(f"Raw text:      {raw['text'][:120]}")
+    print(f"Denoised text: {clean['text'][:120]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="audio files to benchmark")
+    parser.add_argument("--model", default="base")
+    parser.add_argument(
+        "--add-noise-snr",
+        type=float,
+        default=None,
+        help="mix white noise into clean clips at this SNR (dB)",
+    )
+    args = parser.parse_args()
+
+    model = whisper.load_model(args.model)
+    for path in args.files:
+        benchmark(path, model, args.add_noise_snr)
+
+
+if __name__ == "__main__":
+    main()
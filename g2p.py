@@ -0,0 +1,413 @@
+"""
+Offline grapheme-to-phoneme lookup and phoneme-level word diff
+
+Pronunciations come from the CMUdict-format files in lexicon/ (*.dict).
+They are compiled once into a compact binary index (sorted words, offsets
+and one byte per phoneme) that is memory-mapped, so even the full CMUdict
+costs a few MB of page cache instead of a Python dict. Words missing from
+the lexicon go through letter-to-sound rules. `phoneme_diff` aligns the
+phonemes of a reference word with the word that was heard, so feedback can
+name the sound that was wrong (/θ/ heard as /s/), not only the word.
+
+The shipped seed.dict only covers a few hundred common words; everything
+else uses the rule-based fallback, which is an approximation (add the full
+cmudict.dict to lexicon/ for dictionary pronunciations). `problem_phonemes`
+marks such results with `in_lexicon`.
+"""
+
+import functools
+import glob
+import mmap
+import os
+import re
+import struct
+import tempfile
+from collections import Counter
+
+import Levenshtein
+import numpy as np
+
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon")
+INDEX_NAME = "lexicon.idx"
+
+# ARPAbet phonemes (stress removed) and how feedback writes them
+PHONEMES = {
+    "AA": "ɑ",
+    "AE": "æ",
+    "AH": "ʌ",
+    "AO": "ɔ",
+    "AW": "aʊ",
+    "AY": "aɪ",
+    "B": "b",
+    "CH": "tʃ",
+    "D": "d",
+    "DH": "ð",
+    "EH": "ɛ",
+    "ER": "ɝ",
+    "EY": "eɪ",
+    "F": "f",
+    "G": "ɡ",
+    "HH": "h",
+    "IH": "ɪ",
+    "IY": "i",
+    "JH": "dʒ",
+    "K": "k",
+    "L": "l",
+    "M": "m",
+    "N": "n",
+    "NG": "ŋ",
+    "OW": "oʊ",
+    "OY": "ɔɪ",
+    "P": "p",
+    "R": "r",
+    "S": "s",
+    "SH": "ʃ",
+    "T": "t",
+    "TH": "θ",
+    "UH": "ʊ",
+    "UW": "u",
+    "V": "v",
+    "W": "w",
+    "Y": "j",
+    "Z": "z",
+    "ZH": "ʒ",
+}
+_PHONEME_ID = {phoneme: index for index, phoneme in enumerate(PHONEMES)}
+_PHONEME_LIST = list(PHONEMES)
+
+# A heard word is diffed only when it differs from the reference word in at
+# most this share of its sounds (a minimal pair such as think/sink); a whole
+# other word says nothing about any one sound
+MAX_DIFF_SHARE = 1 / 3
+
+# Index file: magic, word count, word bytes, phoneme count; then
+# word offsets (uint32, n+1), word bytes, phoneme offsets (uint32, n+1),
+# phoneme ids (uint8), each section padded to 8 bytes
+_MAGIC = b"G2PIDX1\0"
+_HEADER = struct.Struct("<8sQQQ")
+
+# Letter-to-sound rules for unknown words, tried in order at each position
+# (regex, phonemes); lookbehind and $ see the whole word
+_RULES = [
+    (r"^kn", "N"),
+    (r"^wr", "R"),
+    (r"^wh", "W"),
+    (r"^ps", "S"),
+    (r"tion", "SH AH N"),
+    (r"sion", "ZH AH N"),
+    (r"ture", "CH ER"),
+    (r"igh", "AY"),
+    (r"tch", "CH"),
+    (r"dge", "JH"),
+    (r"ough", "AO"),
+    (r"th", "TH"),
+    (r"sh", "SH"),
+    (r"ch", "CH"),
+    (r"ph", "F"),
+    (r"ck", "K"),
+    (r"ng", "NG"),
+    (r"n(?=k)", "NG"),
+    (r"qu", "K W"),
+    (r"gh$", ""),
+    (r"gh", "G"),
+    (r"ee", "IY"),
+    (r"ea", "IY"),
+    (r"oo", "UW"),
+    (r"a[iy]", "EY"),
+    (r"oa", "OW"),
+    (r"ou", "AW"),
+    (r"ow$", "OW"),
+    (r"ow", "AW"),
+    (r"o[iy]", "OY"),
+    (r"a[uw]", "AO"),
+    (r"ew", "UW"),
+    (r"ie$", "AY"),
+    (r"ie", "IY"),
+    (r"ey$", "IY"),
+    (r"ar", "AA R"),
+    (r"or", "AO R"),
+    (r"[eiu]r(?![aeiouy])", "ER"),
+    # Silent final e makes the vowel before it long ("make", "time")
+    (r"a(?=[^aeiou]e$)", "EY"),
+    (r"i(?=[^aeiou]e$)", "AY"),
+    (r"o(?=[^aeiou]e$)", "OW"),
+    (r"u(?=[^aeiou]e$)", "UW"),
+    (r"(?<=.[^aeiou])e$", ""),
+    (r"^y(?=[aeiou])", "Y"),
+    (r"(?<=^[^aeiou])y$", "AY"),
+    (r"(?<=^[^aeiou][^aeiou])y$", "AY"),
+    (r"y$", "IY"),
+    (r"y", "IH"),
+    (r"c(?=[eiy])", "S"),
+    (r"c", "K"),
+    (r"g(?=e$)", "JH"),
+    (r"x", "K S"),
+    (r"(?<=[aeiou])s$", "Z"),
+    (r"a", "AE"),
+    (r"e", "EH"),
+    (r"i", "IH"),
+    (r"o", "AA"),
+    (r"u", "AH"),
+    (r"b", "B"),
+    (r"d", "D"),
+    (r"f", "F"),
+    (r"g", "G"),
+    (r"h", "HH"),
+    (r"j", "JH"),
+    (r"k", "K"),
+    (r"l", "L"),
+    (r"m", "M"),
+    (r"n", "N"),
+    (r"p", "P"),
+    (r"q", "K"),
+    (r"r", "R"),
+    (r"s", "S"),
+    (r"t", "T"),
+    (r"v", "V"),
+    (r"w", "W"),
+    (r"z", "Z"),
+]
+_COMPILED_RULES = [
+    (re.compile(pattern), phonemes.split()) for pattern, phonemes in _RULES
+]
+_DOUBLE_CONSONANT = re.compile(r"([b-df-hj-np-tv-z])\1")
+
+
+def _padded_size(size):
+    return size + -size % 8
+
+
+def _padded(data):
+    return data + b"\0" * (_padded_size(len(data)) - len(data))
+
+
+def build_index(sources, index_path):
+    """
+    Compile CMUdict-format files into one binary index (earlier files win
+    for words listed twice; alternate pronunciations "WORD(2)" are skipped)
+    Returns: number of words
+    """
+    entries = {}
+    for path in sources:
+        with open(path, encoding="latin-1") as file:
+            for line in file:
+                if not line.strip() or line.startswith(";;;"):
+                    continue
+                word, *phonemes = line.split()
+                word = word.lower()
+                if "(" in word or word in entries:
+                    continue
+                ids = [_PHONEME_ID.get(p.rstrip("012")) for p in phonemes]
+                if ids and None not in ids:
+                    entries[word] = ids
+
+    keys = sorted(word.encode("utf-8") for word in entries)
+    word_offsets = np.zeros(len(keys) + 1, dtype=np.uint32)
+    word_offsets[1:] = np.cumsum([len(key) for key in keys])
+    phonemes = [entries[key.decode("utf-8")] for key in keys]
+    phoneme_offsets = np.zeros(len(keys) + 1, dtype=np.uint32)
+    phoneme_offsets[1:] = np.cumsum([len(ids) for ids in phonemes])
+    phoneme_bytes = bytes(id_ for ids in phonemes for id_ in ids)
+
+    # Write then rename, so a reader never maps half an index
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(
+            _HEADER.pack(_MAGIC, len(keys), int(word_offsets[-1]), len(phoneme_bytes))
+        )
+        file.write(_padded(word_offsets.tobytes()))
+        file.write(_padded(b"".join(keys)))
+        file.write(_padded(phoneme_offsets.tobytes()))
+        file.write(_padded(phoneme_bytes))
+    os.replace(temp_path, index_path)
+    return len(keys)
+
+
+class Lexicon:
+    """Read-only, memory-mapped pronunciation index (see build_index)"""
+
+    def __init__(self, index_path):
+        with open(index_path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, word_bytes, phoneme_count = _HEADER.unpack_from(self.map)
+        if magic != _MAGIC:
+            raise ValueError(f"{index_path} is not a lexicon index")
+        self.count = count
+
+        offset = _HEADER.size
+        self.word_offsets = np.frombuffer(
+            self.map, dtype=np.uint32, count=count + 1, offset=offset
+        )
+        offset += _padded_size(4 * (count + 1))
+        self.words_start = offset
+        offset += _padded_size(word_bytes)
+        self.phoneme_offsets = np.frombuffer(
+            self.map, dtype=np.uint32, count=count + 1, offset=offset
+        )
+        offset += _padded_size(4 * (count + 1))
+        self.phonemes_start = offset
+
+    def _word(self, index):
+        start = self.words_start + int(self.word_offsets[index])
+        return self.map[start : self.words_start + int(self.word_offsets[index + 1])]
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, word):
+        """Returns: tuple of ARPAbet phonemes, or None when the word is unknown"""
+        key = word.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:  # binary search over the sorted words
+            mid = (lo + hi) // 2
+            if self._word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count or self._word(lo) != key:
+            return None
+        start = self.phonemes_start + int(self.phoneme_offsets[lo])
+        end = self.phonemes_start + int(self.phoneme_offsets[lo + 1])
+        return tuple(_PHONEME_LIST[id_] for id_ in self.map[start:end])
+
+
+@functools.lru_cache(maxsize=None)
+def load_lexicon(lexicon_dir=LEXICON_DIR):
+    """
+    Lexicon of all *.dict files in `lexicon_dir` (seed.dict first); the
+    index is rebuilt when a source file is newer. Falls back to the temp
+    directory when lexicon/ is read-only.
+    Returns: Lexicon, or None when there are no source files
+    """
+    sources = sorted(
+        glob.glob(os.path.join(lexicon_dir, "*.dict")),
+        key=lambda path: (os.path.basename(path) != "seed.dict", path),
+    )
+    if not sources:
+        return None
+
+    newest = max(os.path.getmtime(path) for path in sources)
+    for index_path in (
+        os.path.join(lexicon_dir, INDEX_NAME),
+        os.path.join(tempfile.gettempdir(), f"g2p_{INDEX_NAME}"),
+    ):
+        try:
+            if not os.path.exists(index_path) or os.path.getmtime(index_path) < newest:
+                build_index(sources, index_path)
+            return Lexicon(index_path)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def rule_phonemes(word):
+    """Letter-to-sound rules for words the lexicon does not know"""
+    word = _DOUBLE_CONSONANT.sub(r"\1", word)
+    phonemes = []
+    position = 0
+    while position < len(word):
+        for pattern, output in _COMPILED_RULES:
+            match = pattern.match(word, position)
+            if match:
+                phonemes.extend(output)
+                position = match.end()
+                break
+        else:
+            position += 1  # letter without a rule (not a-z)
+    return tuple(phonemes)
+
+
+@functools.lru_cache(maxsize=8192)
+def in_lexicon(word):
+    """The word's pronunciation comes from the lexicon, not the rules"""
+    lexicon = load_lexicon()
+    return lexicon is not None and lexicon.lookup(word) is not None
+
+
+@functools.lru_cache(maxsize=8192)
+def pronounce(word):
+    """
+    Phonemes of a lower-case word: lexicon first, rules otherwise
+    Returns: tuple of ARPAbet phonemes (without stress)
+    """
+    lexicon = load_lexicon()
+    phonemes = lexicon.lookup(word) if lexicon is not None else None
+    return phonemes if phonemes is not None else rule_phonemes(word)
+
+
+def ipa(phoneme):
+    """Returns: '/θ/' style notation of an ARPAbet phoneme"""
+    return f"/{PHONEMES.get(phoneme, phoneme.lower())}/"
+
+
+@functools.lru_cache(maxsize=8192)
+def phoneme_diff(ref_word, heard_word):
+    """
+    Align the phonemes of a reference word with the word that was heard
+    Returns: list of (reference phoneme or None, heard phoneme or None) for
+    every difference (substitution, missing or extra sound)
+    """
+    ref = pronounce(ref_word)
+    heard = pronounce(heard_word)
+    # One character per phoneme, so the C edit distance compares phonemes
+    ref_codes = "".join(chr(65 + _PHONEME_ID[p]) for p in ref)
+    heard_codes = "".join(chr(65 + _PHONEME_ID[p]) for p in heard)
+
+    diff = []
+    for op, i, j in Levenshtein.editops(ref_codes, heard_codes):
+        if op == "replace":
+            diff.append((ref[i], heard[j]))
+        elif op == "delete":
+            diff.append((ref[i], None))
+        else:
+            diff.append((None, heard[j]))
+    return diff
+
+
+def is_minimal_pair(ref_word, heard_word):
+    """
+    The heard word differs from the reference word in a few sounds only
+    (at most MAX_DIFF_SHARE of them, at least one)
+    """
+    diff = phoneme_diff(ref_word, heard_word)
+    limit = max(1, int(len(pronounce(ref_word)) * MAX_DIFF_SHARE))
+    return 0 < len(diff) <= limit
+
+
+def problem_phonemes(word_pairs):
+    """
+    Reference sounds that were said wrong or left out, over (reference word,
+    heard word) pairs of one attempt; pairs that are not minimal pairs
+    (a completely different word) are skipped. Examples where either word
+    is not in the lexicon end with "†" (rule-based pronunciation).
+    Returns: (Counter of IPA phoneme -> count, {IPA phoneme: [examples]})
+    """
+    counts = Counter()
+    examples = {}
+    for ref_word, heard_word in word_pairs:
+        if not is_minimal_pair(ref_word, heard_word):
+            continue
+        guessed = "" if in_lexicon(ref_word) and in_lexicon(heard_word) else "†"
+        for ref_phoneme, heard_phoneme in phoneme_diff(ref_word, heard_word):
+            if ref_phoneme is None:
+                continue  # an extra sound is not a wrong reference sound
+            symbol = PHONEMES[ref_phoneme]
+            counts[symbol] += 1
+            heard = ipa(heard_phoneme) if heard_phoneme else "∅"
+            examples.setdefault(symbol, []).append(
+                f"{ref_word} → {heard_word} ({ipa(ref_phoneme)} → {heard}){guessed}"
+            )
+    return counts, examples
+
+
+def aggregate_problem_phonemes(history):
+    """
+    Problem phonemes summed over history records (breakdown
+    "ProblemPhonemes")
+    Returns: Counter of IPA phoneme -> count
+    """
+    total = Counter()
+    for record in history:
+        total.update((record.get("breakdown") or {}).get("ProblemPhonemes") or {})
+    return total
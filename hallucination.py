@@ -0,0 +1,212 @@
+"""
+Post-decode hallucination and repetition filter for Whisper segments
+
+Low-quality audio makes Whisper loop on a phrase ("thank you thank you ...")
+or invent text over silence. Such segments are dropped or truncated before
+scoring; once a loop carries on from one decoding window into the next,
+decoding stops and the rest of the recording is not transcribed.
+"""
+
+import re
+
+from whisper.audio import CHUNK_LENGTH, SAMPLE_RATE
+
+# Same limits Whisper uses to trigger temperature fallback
+COMPRESSION_RATIO_LIMIT = 2.4
+AVG_LOGPROB_LIMIT = -1.0
+NO_SPEECH_LIMIT = 0.6
+
+# An n-gram (n <= MAX_NGRAM) repeated LOOP_REPEATS+ times in a row, covering
+# at least MIN_LOOP_WORDS words, is a decoding loop ("I I I like" is not)
+MAX_NGRAM = 4
+LOOP_REPEATS = 3
+MIN_LOOP_WORDS = 6
+
+# Audio after a window's last segment is decoded again with the next window
+# when it is this short (seconds): a word or phrase cut at the clip end. A
+# longer tail is silence Whisper already skipped.
+MAX_TAIL_SECONDS = 5.0
+
+# A segment that repeats the text right before it is only dropped when the
+# decoder was also unsure or compressing (a student may repeat a sentence)
+REPEAT_LOGPROB_LIMIT = -0.7
+REPEAT_COMPRESSION_LIMIT = 2.0
+
+_NON_LETTER = re.compile(r"[^a-z]")
+
+
+def find_repetition_loop(words):
+    """
+    Find the first n-gram that repeats in a row long enough to be a loop
+    Returns: index where the first repeat starts, or None
+    """
+    count = len(words)
+    for n in range(1, MAX_NGRAM + 1):
+        repeats = max(LOOP_REPEATS, -(-MIN_LOOP_WORDS // n))
+        for i in range(count - n * repeats + 1):
+            gram = words[i : i + n]
+            if any(gram) and all(
+                words[i + k * n : i + (k + 1) * n] == gram for k in range(1, repeats)
+            ):
+                return i + n
+    return None
+
+
+def _segment_words(segment):
+    """Normalized words of a segment (from word timestamps when present)"""
+    if segment.get("words"):
+        raw = [w["word"] for w in segment["words"]]
+    else:
+        raw = segment["text"].split()
+    return [_NON_LETTER.sub("", w.lower()) for w in raw]
+
+
+def _truncate_segment(segment, cut):
+    """Keep only the first `cut` words of a segment"""
+    truncated = dict(segment)
+    if segment.get("words"):
+        truncated["words"] = segment["words"][:cut]
+        truncated["text"] = "".join(w["word"] for w in truncated["words"])
+        if truncated["words"]:
+            truncated["end"] = truncated["words"][-1]["end"]
+    else:
+        truncated["text"] = " " + " ".join(segment["text"].split()[:cut])
+    return truncated
+
+
+def is_hallucinated_segment(segment):
+    """Segment statistics say the text is not grounded in the audio"""
+    if segment.get("compression_ratio", 0) > COMPRESSION_RATIO_LIMIT:
+        return True
+    return (
+        segment.get("avg_logprob", 0) < AVG_LOGPROB_LIMIT
+        and segment.get("no_speech_prob", 0) > NO_SPEECH_LIMIT
+    )
+
+
+def is_repeated_segment(segment, words, last_words):
+    """
+    The same sentence decoded again right after itself, by a decoder that
+    was unsure or looping (a confident repeat is the student's own)
+    """
+    if len(words) < 3 or words != last_words[-len(words) :]:
+        return False
+    return (
+        segment.get("avg_logprob", 0) < REPEAT_LOGPROB_LIMIT
+        or segment.get("compression_ratio", 0) > REPEAT_COMPRESSION_LIMIT
+    )
+
+
+def filter_segments(segments, previous_text=""):
+    """
+    Drop or truncate hallucinated segments
+    Returns: (kept_segments, removed_count, truncated_count, looped), looped
+    when a segment was truncated at a loop or dropped as a repeat
+    """
+    kept = []
+    removed = 0
+    truncated = 0
+    looped = False
+    last_words = _NON_LETTER.sub(" ", previous_text.lower()).split()
+
+    for segment in segments:
+        if is_hallucinated_segment(segment):
+            removed += 1
+            continue
+
+        words = _segment_words(segment)
+        if is_repeated_segment(segment, words, last_words):
+            removed += 1
+            looped = True
+            continue
+
+        cut = find_repetition_loop(words)
+        if cut is not None:
+            segment = _truncate_segment(segment, cut)
+            words = words[:cut]
+            truncated += 1
+            looped = True
+
+        kept.append(segment)
+        last_words = words
+
+    return kept, removed, truncated, looped
+
+
+def shift_segment(segment, offset):
+    """Move a segment (and its word timings) later by `offset` seconds"""
+    shifted = dict(
+        segment, start=segment["start"] + offset, end=segment["end"] + offset
+    )
+    if segment.get("words"):
+        shifted["words"] = [
+            dict(w, start=w["start"] + offset, end=w["end"] + offset)
+            for w in segment["words"]
+        ]
+    return shifted
+
+
+def filtered_transcribe(model, audio, **options):
+    """
+    model.transcribe() one 30-second window at a time, with the hallucination
+    filter applied to each window
+
+    Each window is a clip_timestamps clip of the whole recording, so Whisper
+    keeps its own seek and timestamps (and the first window is the one
+    language ID already encoded, see the encoder cache). The next window
+    starts where the last decoded segment ended, so a word cut at the clip
+    end is decoded again whole (see MAX_TAIL_SECONDS); the filtered text so
+    far is the prompt. When a loop carries on from one window into the next,
+    decoding stops.
+    Returns: Whisper-style result dict plus "removed_segments",
+    "truncated_segments" and "stopped_early"
+    """
+    prompt = options.pop("initial_prompt", None) or ""
+    duration = len(audio) / SAMPLE_RATE
+
+    segments = []
+    removed = 0
+    truncated = 0
+    stopped_early = False
+    text = ""
+    previous_looped = False
+    start = 0.0
+
+    while start < duration:
+        end = min(start + CHUNK_LENGTH, duration)
+        window_prompt = (prompt + text)[-200:]
+        result = model.transcribe(
+            audio,
+            clip_timestamps=[start, end],
+            initial_prompt=window_prompt or None,
+            **options,
+        )
+        window = result.get("segments", [])
+
+        kept, window_removed, window_truncated, looped = filter_segments(window, text)
+        if looped and previous_looped:
+            # Looping in two windows in a row: the rest is the same loop
+            removed += len(window)
+            stopped_early = end < duration
+            break
+
+        segments.extend(kept)
+        text += "".join(segment["text"] for segment in kept)
+        removed += window_removed
+        truncated += window_truncated
+        previous_looped = looped
+
+        last_end = window[-1]["end"] if window else end
+        tail = end - last_end
+        if end < duration and last_end > start and 0 < tail <= MAX_TAIL_SECONDS:
+            start = last_end
+        else:
+            start = end
+
+    return {
+        "text": text.strip(),
+        "segments": segments,
+        "removed_segments": removed,
+        "truncated_segments": truncated,
+        "stopped_early": stopped_early,
+    }
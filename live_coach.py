@@ -0,0 +1,129 @@
+"""
+Live-coach mode: rolling-window partial transcripts of a microphone stream
+
+Audio chunks are pushed as they arrive; about once per second the last
+few seconds are re-transcribed with a small Whisper model. Text before the
+last segment boundary is committed so the window stays short. When the
+recording stops, the full audio goes through the normal analysis pipeline.
+"""
+
+import io
+import wave
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+LIVE_MODEL_SIZE = "tiny"
+WINDOW_SECONDS = 10.0  # audio re-transcribed on every update
+UPDATE_SECONDS = 1.0  # new audio needed before the next partial transcript
+
+
+def resample_linear(samples, source_rate, target_rate=SAMPLE_RATE):
+    """Resample a mono signal by linear interpolation (cheap, for live chunks)"""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    target_length = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(target_length) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_to_samples(frame):
+    """Convert a WebRTC av.AudioFrame to 16 kHz mono float32"""
+    samples = frame.to_ndarray()
+    if samples.dtype == np.int16:
+        samples = samples.astype(np.float32) / 32768.0
+
+    channels = len(frame.layout.channels)
+    if frame.format.is_planar:
+        samples = samples.mean(axis=0)
+    else:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    return resample_linear(samples, frame.sample_rate)
+
+
+def to_wav_bytes(audio):
+    """Encode 16 kHz mono float32 audio as 16-bit PCM WAV bytes"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+class RollingTranscriber:
+    """Rolling-window partial transcription of a live audio stream"""
+
+    def __init__(
+        self, model, window_seconds=WINDOW_SECONDS, update_seconds=UPDATE_SECONDS
+    ):
+        self.model = model
+        self.window_samples = int(window_seconds * SAMPLE_RATE)
+        self.update_samples = int(update_seconds * SAMPLE_RATE)
+        self.chunks = []
+        self.window = np.zeros(0, dtype=np.float32)
+        self.pending = 0
+        self.committed = ""
+        self.partial = ""
+
+    @property
+    def text(self):
+        """Committed text plus the current partial hypothesis"""
+        return (self.committed + self.partial).strip()
+
+    def push(self, samples):
+        """
+        Add 16 kHz mono samples; re-transcribe when enough new audio arrived
+        Returns: True if the partial transcript was updated
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        self.chunks.append(samples)
+        self.window = np.concatenate([self.window, samples])
+        self.pending += len(samples)
+
+        if self.pending < self.update_samples:
+            return False
+        self.update()
+        return True
+
+    def update(self):
+        """Transcribe the rolling window and commit text that is settled"""
+        self.pending = 0
+        if len(self.window) == 0:
+            return self.text
+
+        result = self.model.transcribe(
+            self.window,
+            language="en",
+            temperature=0.0,
+            condition_on_previous_text=False,
+            initial_prompt=self.committed[-200:] or None,
+            fp16=self.model.device.type == "cuda",
+        )
+        segments = result.get("segments", [])
+
+        if len(self.window) > self.window_samples:
+            if len(segments) > 1:
+                # Everything before the last segment is settled: commit it
+                # and keep only the last segment's audio in the window
+                self.committed += "".join(s["text"] for s in segments[:-1])
+                cut = int(segments[-1]["start"] * SAMPLE_RATE)
+                self.window = self.window[cut:]
+                segments = segments[-1:]
+            else:
+                # No boundary found: commit everything and start over
+                self.committed += result["text"]
+                self.window = np.zeros(0, dtype=np.float32)
+                segments = []
+
+        self.partial = "".join(s["text"] for s in segments)
+        return self.text
+
+    def finish(self):
+        """Full recorded audio (16 kHz mono float32) for the final analysis"""
+        if not self.chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self.chunks)
@@ -0,0 +1,69 @@
+"""
+Local harness for the live-coach mode: replays WAV files as a microphone
+stream through RollingTranscriber and prints each partial transcript with
+its latency.
+
+Usage:
+    python live_replay.py answer.wav [more.wav ...] [--chunk-ms 20] [--realtime]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import whisper
+
+from audio_decode import load_audio
+from live_coach import LIVE_MODEL_SIZE, RollingTranscriber
+
+
+def replay(path, model, chunk_ms, realtime):
+    """Stream one file through a fresh RollingTranscriber"""
+    audio = load_audio(path)
+    chunk = int(16000 * chunk_ms / 1000)
+    transcriber = RollingTranscriber(model)
+    latencies = []
+
+    print(f"\n=== {path} ({len(audio) / 16000:.1f}s) ===")
+    stream_start = time.perf_counter()
+
+    for start in range(0, len(audio), chunk):
+        if realtime:
+            # Wait until this chunk would have been captured by a microphone
+            due = stream_start + start / 16000
+            time.sleep(max(0.0, due - time.perf_counter()))
+
+        pushed_at = time.perf_counter()
+        if transcriber.push(audio[start : start + chunk]):
+            latency = time.perf_counter() - pushed_at
+            latencies.append(latency)
+            print(
+                f"[{start / 16000:6.1f}s +{latency * 1000:5.0f} ms] {transcriber.text}"
+            )
+
+    final_audio = transcriber.finish()
+    print(f"Final audio: {len(final_audio) / 16000:.1f}s handed to analyze_speech")
+    if latencies:
+        print(
+            f"Partial latency: mean {np.mean(latencies) * 1000:.0f} ms, "
+            f"max {np.max(latencies) * 1000:.0f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="WAV files to replay")
+    parser.add_argument("--model", default=LIVE_MODEL_SIZE)
+    parser.add_argument("--chunk-ms", type=int, default=20, help="chunk size")
+    parser.add_argument(
+        "--realtime", action="store_true", help="pace chunks like a live microphone"
+    )
+    args = parser.parse_args()
+
+    model = whisper.load_model(args.model)
+    for path in args.files:
+        replay(path, model, args.chunk_ms, args.realtime)
+
+
+if __name__ == "__main__":
+    main()
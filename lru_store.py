@@ -0,0 +1,37 @@
+"""
+Small thread-safe LRU store with hit/miss counters
+
+Dependency-free, so the pure-Python scorer can cache results without
+importing torch or whisper.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUStore:
+    """Small thread-safe LRU dict with a fixed number of entries"""
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
@@ -0,0 +1,104 @@
+"""
+Near-miss matching of reference words in reference mode
+
+Whisper often writes a word that sounds like the reference word, not the
+spelling the reference uses: "their" for "there", "two" for "to". Those are
+not pronunciation errors. Only variants of the same spoken word get credit
+(full credit, as the same word):
+
+- homophone classes. The class is the alignment key, so edit-distance
+  alignment already pairs them.
+- words the pronunciation lexicon pronounces identically
+
+Any difference in sound is a real error, so minimal pairs (three/tree,
+light/right, ship/sheep, bed/bad) get no credit even when they look or
+sound alike. Neither does a word only the letter-to-sound rules can
+pronounce: the rules are too rough to tell know from now. British/American
+spellings (colour/color) are unified earlier by text_normalizer. Keys are
+memoized per vocabulary word and precomputed once
+per reference text, so checking a transcript is linear in its length.
+"""
+
+import functools
+
+from g2p import in_lexicon, phoneme_diff
+
+# Words Whisper cannot tell apart by sound (letters only, lower case)
+HOMOPHONES = [
+    ("there", "their", "theyre"),
+    ("to", "too", "two"),
+    ("for", "four", "fore"),
+    ("one", "won"),
+    ("by", "buy", "bye"),
+    ("know", "no"),
+    ("knew", "new"),
+    ("hear", "here"),
+    ("see", "sea"),
+    ("right", "write"),
+    ("eight", "ate"),
+    ("son", "sun"),
+    ("whole", "hole"),
+    ("week", "weak"),
+    ("where", "wear"),
+    ("which", "witch"),
+    ("your", "youre"),
+    ("hi", "high"),
+    ("hour", "our"),
+    ("meet", "meat"),
+    ("flower", "flour"),
+    ("blue", "blew"),
+    ("road", "rode"),
+    ("be", "bee"),
+    ("i", "eye"),
+    ("would", "wood"),
+    ("peace", "piece"),
+    ("sale", "sail"),
+    ("tale", "tail"),
+    ("weather", "whether"),
+    ("whose", "whos"),
+    ("not", "knot"),
+    ("made", "maid"),
+    ("mail", "male"),
+    ("pair", "pear"),
+    ("plain", "plane"),
+    ("rain", "reign"),
+    ("some", "sum"),
+    ("wait", "weight"),
+    ("way", "weigh"),
+    ("night", "knight"),
+    ("allowed", "aloud"),
+    ("ok", "okay"),
+]
+
+_HOMOPHONE_CLASS = {word: words[0] for words in HOMOPHONES for word in words}
+
+
+@functools.lru_cache(maxsize=4096)
+def homophone_key(word):
+    """The word that stands for the word's homophone class (or the word)"""
+    return _HOMOPHONE_CLASS.get(word, word)
+
+
+@functools.lru_cache(maxsize=8192)
+def near_miss(ref_word, heard_word):
+    """
+    How close a heard word is to a different reference word
+    Returns: "homophone" (full credit) or None (a different sound, including
+    minimal pairs, or a word the lexicon does not know)
+    """
+    if homophone_key(ref_word) == homophone_key(heard_word):
+        return "homophone"
+    if not (in_lexicon(ref_word) and in_lexicon(heard_word)):
+        return None
+    if phoneme_diff(ref_word, heard_word):
+        return None
+    return "homophone"
+
+
+@functools.lru_cache(maxsize=64)
+def reference_keys(ref_words):
+    """
+    Alignment keys (homophone classes) of a reference, computed once per
+    reference text; `ref_words` is a tuple
+    """
+    return tuple(homophone_key(word) for word in ref_words)
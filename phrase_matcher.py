@@ -0,0 +1,91 @@
+"""
+Aho-Corasick matcher for the scoring rule phrases
+
+All connectors, error pairs, intro phrases and nonsense words are compiled
+into one automaton over whole words, so a transcript is scanned once no
+matter how many phrases there are. Working on words (not characters) gives
+correct word boundaries: "so" does not match inside "also", "and" does not
+match inside "understand", and "he are" does not match across "he. Are".
+"""
+
+import re
+from collections import deque
+
+# Words, or runs of punctuation that break a phrase
+_TOKEN = re.compile(r"(\w+)|[^\w\s]+")
+
+
+class PhraseMatcher:
+    """
+    Compiled multi-phrase matcher; phrases and text are compared lower-cased
+    """
+
+    def __init__(self, phrases):
+        # Duplicates and spacing differences collapse to one phrase
+        self.phrases = tuple(
+            dict.fromkeys(" ".join(p.lower().split()) for p in phrases)
+        )
+
+        # 1. Trie over words
+        self.goto = [{}]
+        self.output = [()]
+        for index, phrase in enumerate(self.phrases):
+            state = 0
+            for word in phrase.split():
+                next_state = self.goto[state].get(word)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.output.append(())
+                    self.goto[state][word] = next_state
+                state = next_state
+            self.output[state] += (index,)
+
+        # 2. Failure links (breadth first), inheriting the outputs of
+        # shorter phrases that end at the same word
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(word, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def finditer(self, text):
+        """
+        Scan lower-cased text once
+        Yields: (phrase, end offset) for every occurrence
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for match in _TOKEN.finditer(text):
+            word = match.group(1)
+            if word is None:  # punctuation ends any phrase in progress
+                state = 0
+                continue
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for index in output[state]:
+                yield self.phrases[index], match.end()
+
+    def found(self, text):
+        """Returns: frozenset of the phrases that occur in lower-cased text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        root = goto[0]
+        hits = set()
+        state = 0
+        for word in _TOKEN.findall(text):  # "" for punctuation
+            if state == 0:
+                state = root.get(word, 0)
+            else:
+                while state and word not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(word, 0)
+            if output[state]:
+                hits.update(output[state])
+        return frozenset(self.phrases[index] for index in hits)
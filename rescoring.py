@@ -0,0 +1,353 @@
+"""
+Re-scoring of stored history when the scoring engine or its rules change
+
+Every history record carries the `scoring_version` it was scored with.
+RescoreJob re-scores only the stale records (older version, or none at all)
+from their stored transcript, confidence, duration and transcription_info
+(signal, timing, language), a chunk at a time with batch_scoring.score_batch,
+on a worker thread. Records saved before transcription_info was stored are
+re-scored from transcript, confidence and duration alone and flagged as
+limited (no signal or timing inputs). After every chunk the new scores go
+to a checkpoint file, so an interrupted job resumes where it stopped. The
+worker only collects the new scores; `apply()` writes them into the history
+on the thread that owns it. `drift_summary` compares old and new scores per
+criterion.
+
+Usage (on a JSON backup exported from the app):
+    python rescoring.py speaking_backup.json [--chunk-size 200]
+"""
+
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import CRITERIA, score_batch
+from scoring import rule_file, scoring_version
+from speculative import content_key
+
+CHUNK_SIZE = 200
+
+# Score columns copied from score_batch into the record's breakdown
+BREAKDOWN_COLUMNS = CRITERIA + [
+    "Total",
+    "Confidence",
+    "RawConfidence",
+    "WordCount",
+    "SpeechRate",
+    "SpeedCategory",
+    "IsFluentSpeaker",
+    "SpeakerLevel",
+    "DetectedWarnings",
+]
+
+
+def record_key(record):
+    """Stable identity of a history record (for the checkpoint)"""
+    return content_key(
+        b"",
+        record.get("timestamp"),
+        record.get("user"),
+        record.get("topic"),
+        record.get("transcribed"),
+    )
+
+
+def has_recording_details(record):
+    """
+    The record stores the transcription_info it was scored with (None when
+    it was scored without one), so a re-score sees the same signal and
+    timing inputs; older records are re-scored without them
+    """
+    return "transcription_info" in record
+
+
+def stored_inputs(record):
+    """
+    Scoring inputs of a record; older records without raw confidence and
+    duration fall back to their breakdown (RawConfidence, WordCount/SpeechRate)
+    Returns: (text, confidence, duration, transcription_info), or None when
+    they are missing
+    """
+    breakdown = record.get("breakdown") or {}
+    confidence = record.get("confidence")
+    if confidence is None and breakdown.get("RawConfidence") is not None:
+        confidence = breakdown["RawConfidence"] / 100
+    duration = record.get("duration")
+    if duration is None:
+        rate = breakdown.get("SpeechRate") or 0
+        duration = breakdown.get("WordCount", 0) / rate if rate > 0 else 0
+    if not record.get("transcribed") or confidence is None:
+        return None
+    return (
+        record["transcribed"],
+        confidence,
+        duration,
+        record.get("transcription_info"),
+    )
+
+
+def stale_records(history, version):
+    """Returns: indices of the records not scored with `version`"""
+    return [
+        index
+        for index, record in enumerate(history)
+        if record.get("scoring_version") != version
+    ]
+
+
+def _old_scores(record):
+    breakdown = record.get("breakdown") or {}
+    scores = {name: breakdown.get(name) for name in CRITERIA}
+    scores["Total"] = record.get("score")
+    scores["version"] = record.get("scoring_version")
+    return scores
+
+
+def _apply(record, result):
+    """Write a re-scored result (from the checkpoint) into the record"""
+    record["score"] = result["breakdown"]["Total"]
+    record["feedback"] = result["feedback"]
+    record["breakdown"] = {**(record.get("breakdown") or {}), **result["breakdown"]}
+    record["scoring_version"] = result["version"]
+
+
+def _to_json(value):
+    """NumPy scalars from score_batch as plain JSON values"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class RescoreJob:
+    """
+    Incremental re-scoring of a history list
+
+    `start()` runs on a worker thread; `done`, `total` and `error` can be
+    polled. The worker never changes the records: once it has finished,
+    `apply()` (on the caller's thread) writes the new scores into them.
+    `checkpoint_path` (optional) keeps finished chunks across restarts; it
+    is removed once the whole history is current.
+    """
+
+    def __init__(self, history, checkpoint_path=None, rules=None, chunk_size=None):
+        self.history = history
+        self.checkpoint_path = checkpoint_path
+        self.rules = rules or rule_file().current()
+        self.version = scoring_version(self.rules)
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.results = {}  # record key -> {"old", "breakdown", "feedback", ...}
+        self.skipped = 0
+        self.limited = 0
+        self.applied = False
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.thread = None
+        self.cancelled = threading.Event()
+
+    def _load_checkpoint(self):
+        """Results of an earlier run with the same version (others are stale)"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != self.version:
+            return {}
+        return data.get("results", {})
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        # Write then rename, so a crash never leaves half a checkpoint
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"version": self.version, "results": self.results},
+                file,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _score_chunk(self, chunk):
+        """Re-score one chunk of (record, key, inputs) and keep the results"""
+        frame = pd.DataFrame(
+            [inputs for _, _, inputs in chunk],
+            columns=["text", "confidence", "duration", "info"],
+        )
+        frame["topic"] = [record.get("topic", "") for record, _, _ in chunk]
+        scored = score_batch(frame, self.rules, feedback=True)
+
+        for (record, key, _), row in zip(chunk, scored.to_dict("records")):
+            result = {
+                "old": _old_scores(record),
+                "breakdown": {name: _to_json(row[name]) for name in BREAKDOWN_COLUMNS},
+                "feedback": row["Feedback"],
+                "version": self.version,
+                "limited": not has_recording_details(record),
+            }
+            result["breakdown"]["ScoringRules"] = self.rules.tag
+            result["breakdown"]["ScoringVersion"] = self.version
+            self.results[key] = result
+
+    def run(self):
+        """Re-score every stale record, chunk by chunk (records are not changed)"""
+        history = list(self.history)
+        stale = stale_records(history, self.version)
+        self.total = len(stale)
+        self.results = self._load_checkpoint()
+
+        # 1. Records finished by an interrupted run already have their results
+        pending = []
+        for index in stale:
+            record = history[index]
+            key = record_key(record)
+            if key in self.results:
+                self.limited += bool(self.results[key].get("limited"))
+                self.done += 1
+                continue
+            inputs = stored_inputs(record)
+            if inputs is None:
+                self.skipped += 1
+                self.done += 1
+                continue
+            self.limited += not has_recording_details(record)
+            pending.append((record, key, inputs))
+
+        # 2. The rest in chunks, checkpointed after each one
+        for start in range(0, len(pending), self.chunk_size):
+            if self.cancelled.is_set():
+                return self
+            chunk = pending[start : start + self.chunk_size]
+            self._score_chunk(chunk)
+            self._save_checkpoint()
+            self.done += len(chunk)
+
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self
+
+    def apply(self):
+        """
+        Write the collected scores into the history records; call it on the
+        thread that owns the history, after the worker has finished
+        Returns: number of records updated
+        """
+        if self.applied:
+            return 0
+        updated = 0
+        for record in self.history:
+            result = self.results.get(record_key(record))
+            if result and record.get("scoring_version") != result["version"]:
+                _apply(record, result)
+                updated += 1
+        self.applied = True
+        return updated
+
+    def _run_safely(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        """Run on a worker thread; returns at once"""
+        self.thread = threading.Thread(
+            target=self._run_safely, name="rescore", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """Stop after the current chunk (finished chunks stay checkpointed)"""
+        self.cancelled.set()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def drift_summary(self):
+        """Score drift per criterion (see drift_summary)"""
+        return drift_summary(self.results.values())
+
+
+def drift_summary(results):
+    """
+    Old vs new scores of re-scored records, per criterion and Total
+    Returns: DataFrame (records, of which limited - scored without signal or
+    timing inputs, mean old/new, mean change, mean absolute change, largest
+    change, records changed), empty when nothing was re-scored
+    """
+    rows = []
+    results = list(results)
+    for name in CRITERIA + ["Total"]:
+        compared = [
+            result
+            for result in results
+            if result["old"].get(name) is not None
+            and result["breakdown"].get(name) is not None
+        ]
+        if not compared:
+            continue
+        pairs = [
+            (result["old"][name], result["breakdown"][name]) for result in compared
+        ]
+        old, new = np.array(pairs, dtype=float).T
+        change = new - old
+        rows.append(
+            {
+                "Criterion": name,
+                "Records": len(pairs),
+                "Limited": sum(1 for result in compared if result.get("limited")),
+                "MeanOld": round(float(old.mean()), 2),
+                "MeanNew": round(float(new.mean()), 2),
+                "MeanChange": round(float(change.mean()), 2),
+                "MeanAbsChange": round(float(np.abs(change).mean()), 2),
+                "MaxAbsChange": round(float(np.abs(change).max()), 2),
+                "Changed": int(np.count_nonzero(np.abs(change) >= 0.05)),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("backup", help="JSON backup exported from the app")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--output", help="where to write the re-scored backup (default: in place)"
+    )
+    args = parser.parse_args()
+
+    with open(args.backup, encoding="utf-8") as file:
+        data = json.load(file)
+
+    job = RescoreJob(
+        data.get("history", []),
+        checkpoint_path=args.backup + ".rescore.json",
+        chunk_size=args.chunk_size,
+    )
+    print(f"{job.version}: {len(stale_records(job.history, job.version))} stale")
+    job.run().apply()
+    print(
+        f"re-scored {job.done - job.skipped} "
+        f"({job.limited} without signal or timing inputs), skipped {job.skipped}"
+    )
+    summary = job.drift_summary()
+    if not summary.empty:
+        print(summary.to_string(index=False))
+
+    with open(args.output or args.backup, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,731 @@
+"""
+Fair scoring (v5) of a transcribed answer, shared by the app and batch jobs
+
+Five criteria of 0-2 points each: Pronunciation, Fluency, Grammar,
+Vocabulary and Communication. Thresholds and word lists come from
+rules/fair_scoring_v5.json (see scoring_rules).
+
+Results of analyze_speech and generate_feedback are memoized in bounded
+LRU stores, so Streamlit reruns and re-imported history with the same
+inputs (and the same rules) are not scored again.
+"""
+
+import functools
+import hashlib
+import json
+import os
+
+from lru_store import LRUStore
+from scoring_rules import RULES_DIR, RuleFile
+from signal_quality import signal_quality_penalty
+from text_analysis import analyze_text
+
+DEFAULT_RULES_FILE = "fair_scoring_v5.json"
+
+# Bump when the scoring code changes; rule files carry their own version
+SCORING_ENGINE = "v5"
+
+SCORE_CACHE_SIZE = 256  # scored answers
+FEEDBACK_CACHE_SIZE = 256  # feedback texts
+
+_score_cache = LRUStore(SCORE_CACHE_SIZE)
+_feedback_cache = LRUStore(FEEDBACK_CACHE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def rule_file(file_name=DEFAULT_RULES_FILE):
+    """Rule file shared by the whole process; it recompiles itself when edited"""
+    return RuleFile(os.path.join(RULES_DIR, file_name))
+
+
+def scoring_version(rules=None):
+    """
+    Version tag stored with every scored result, e.g. 'v5/fair-scoring@5.0.0'
+    (engine and rule file; a change of either makes old results stale)
+    """
+    rules = rules or rule_file().current()
+    return f"{SCORING_ENGINE}/{rules.tag}"
+
+
+def score_key(
+    transcribed_text, topic, whisper_confidence, duration_seconds, info, rules
+):
+    """Digest of everything an analyze_speech result depends on"""
+    payload = json.dumps(
+        [
+            transcribed_text,
+            topic,
+            whisper_confidence,
+            duration_seconds,
+            info,
+            scoring_version(rules),
+            rules.digest,
+        ],
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def scoring_cache_stats():
+    """Returns: {"analysis": (hits, misses), "feedback": (hits, misses)}"""
+    return {
+        "analysis": (_score_cache.hits, _score_cache.misses),
+        "feedback": (_feedback_cache.hits, _feedback_cache.misses),
+    }
+
+
+def calculate_speech_rate(word_count, duration_seconds, rules):
+    """
+    Calculate speaking rate (words per second)
+    Returns: words_per_second, speed_category
+    """
+    if duration_seconds <= 0:
+        return 0, "unknown"
+
+    wps = word_count / duration_seconds
+
+    # Categorize speed (fast / normal / slow / very_slow)
+    category = rules["speech_rate"]["category"](wps)
+
+    return round(wps, 2), category
+
+
+def detect_fluent_speaker(analysis, word_count, speech_rate_wps, rules):
+    """
+    Detect if student is a fluent speaker
+    Criteria (thresholds from the rule file):
+    - Word count ≥ 30
+    - OR speech rate > 2.5 words/sec
+    - OR has complex sentence structures
+
+    Returns: (is_fluent: bool, confidence_level: str)
+    """
+    r = rules["fluent_speaker"]
+    is_fluent = False
+    confidence_level = "beginner"
+
+    # Criterion 1: Word count
+    if word_count >= r["min_words"]:
+        is_fluent = True
+        confidence_level = "fluent"
+
+    # Criterion 2: Speech rate
+    if speech_rate_wps >= r["min_rate"]:
+        is_fluent = True
+        confidence_level = "fluent"
+
+    # Criterion 3: Complex structures
+    connector_count = sum(
+        1 for conn in rules.phrases["advanced_connectors"] if conn in analysis.phrases
+    )
+
+    if (
+        connector_count >= r["advanced_connectors"]
+        and word_count >= r["advanced_min_words"]
+    ):
+        is_fluent = True
+        confidence_level = "advanced"
+
+    # Intermediate level
+    if (
+        not is_fluent
+        and word_count >= r["intermediate_min_words"]
+        and speech_rate_wps >= r["intermediate_min_rate"]
+    ):
+        confidence_level = "intermediate"
+
+    return is_fluent, confidence_level
+
+
+def check_pronunciation(
+    analysis, whisper_confidence, word_count, is_fluent_speaker, rules, signal=None
+):
+    """
+    NEW FAIR PRONUNCIATION SCORING
+
+    Fluent speakers get protection:
+    - Base score: 1.5/2 (instead of 1.0)
+    - Floor score: 1.2/2 (instead of 0.3)
+    - Less penalty for low confidence
+
+    `signal` (signal_metrics of the recording) lowers the quality score
+    for noisy, clipped or very quiet audio.
+
+    Returns: score (0-2), level, quality_score, warnings
+    """
+    if word_count == 0:
+        return 0, "Needs practice", whisper_confidence, ["No speech detected"]
+
+    r = rules["pronunciation"]
+
+    # Detect basic quality issues
+    warnings = []
+    quality_score = whisper_confidence
+
+    # 1. Check for very short/fragmented words
+    very_short_ratio = analysis.short_count / word_count if word_count > 0 else 0
+
+    if very_short_ratio > r["short_word_ratio"]:
+        quality_score -= r["short_word_penalty"]
+        warnings.append("Some words may be unclear")
+
+    # 2. Check for repeated words (stuttering)
+    if analysis.repeated_count > r["repeated_words"]:
+        quality_score -= r["repeated_penalty"]
+        warnings.append("Audio may have stuttering")
+
+    # 3. Measured audio quality (noise, clipping, loudness, DC offset)
+    signal_penalty, signal_warnings = signal_quality_penalty(signal)
+    quality_score -= signal_penalty
+    warnings.extend(signal_warnings)
+
+    quality_score = max(quality_score, r["quality_floor"])
+
+    # NEW SCORING LOGIC
+    if is_fluent_speaker:
+        # FLUENT SPEAKER: Protected scoring, minimal penalty for low
+        # confidence (natural for fast speech), bonus for very clear speech
+        fluent = r["fluent"]
+        base_score = fluent["base"] + fluent["confidence_penalty"](quality_score)
+
+        if quality_score >= fluent["clear_speech"]:
+            base_score += fluent["clear_bonus"]
+
+        score = max(base_score, fluent["floor"])
+        score = min(score, 2.0)
+
+    else:
+        # BEGINNER/INTERMEDIATE: Standard scoring
+        beginner = r["beginner"]
+        base_score = beginner["base"] + beginner["confidence_penalty"](quality_score)
+
+        score = max(base_score, beginner["floor"])
+        score = min(score, 2.0)
+
+    # Determine level
+    level = r["level"](score)
+
+    return round(score, 1), level, quality_score, warnings
+
+
+def check_fluency(
+    analysis, word_count, speech_rate_wps, is_fluent_speaker, rules, timing=None
+):
+    """
+    NEW FLUENCY SCORING with bonuses
+
+    Scoring:
+    - 50+ words: 2.0/2 (perfect)
+    - 25-49 words: 1.8/2
+    - 15-24 words: 1.4/2
+    - 10-14 words: 1.0/2
+    - <10 words: 0.8/2
+
+    Bonuses:
+    - Has connectors: +0.2
+    - Fast speech (>2.5 wps): +0.2
+    - Long runs between pauses (8+ words): +0.1
+
+    Penalties (from `timing`, see speech_timing):
+    - Pause of 3s or more: -0.2 (mean pause 1s or more: -0.1)
+    - Fillers (um, uh) in more than 10% of words: -0.1
+
+    Returns: score (0-2)
+    """
+    if word_count == 0:
+        return 0
+
+    r = rules["fluency"]
+
+    # Base scoring by word count
+    score = r["word_count_score"](word_count)
+
+    # Bonus 1: Connectors (shows organized thinking)
+    has_connectors = sum(
+        1 for conn in rules.phrases["fluency_connectors"] if conn in analysis.phrases
+    )
+    score += r["connector_bonus"](has_connectors)
+
+    # Bonus 2: Fast speech rate
+    score += r["rate_bonus"](speech_rate_wps)
+
+    # Bonus 3 / penalties: pauses, runs and fillers
+    if timing:
+        if timing["mean_run_length"] >= r["long_run_words"]:
+            score += r["long_run_bonus"]
+
+        if timing["max_pause"] >= r["long_pause"]:
+            score -= r["long_pause_penalty"]
+        elif timing["mean_pause"] >= r["mean_pause"]:
+            score -= r["mean_pause_penalty"]
+
+        if timing["filler_count"] > word_count * r["filler_ratio"]:
+            score -= r["filler_penalty"]
+
+    return max(min(round(score, 1), r["max"]), r["min"])
+
+
+def check_grammar(analysis, rules):
+    """
+    Basic grammar check
+    Returns score 0-2
+    """
+    r = rules["grammar"]
+    score = r["base"]
+
+    # Check for common errors
+    error_count = 0
+
+    for wrong, correct in rules.phrases["common_errors"]:
+        if wrong in analysis.phrases:
+            error_count += 1
+            score -= r["error_penalty"]
+
+    # Check for basic sentence structure
+    has_verb = not rules.words["basic_verbs"].isdisjoint(analysis.token_set)
+
+    if not has_verb and analysis.word_count > r["verb_check_min_words"]:
+        score -= r["missing_verb_penalty"]
+
+    return max(round(score, 1), r["floor"])
+
+
+def check_vocabulary(analysis, rules):
+    """
+    Check vocabulary diversity
+    Returns score 0-2
+    """
+    r = rules["vocabulary"]
+
+    if analysis.long_count == 0:
+        return r["empty_score"]
+
+    # Calculate diversity
+    diversity = analysis.unique_long_count / analysis.long_count
+
+    score = r["diversity_score"](diversity)
+
+    return round(score, 1)
+
+
+def check_communication(analysis, topic, word_count, is_fluent_speaker, rules):
+    """
+    Check communication effectiveness
+
+    Fluent speakers get bonus for complexity
+    Returns score 0-2
+    """
+    r = rules["communication"]
+    score = r["base"]
+
+    # Length bonus
+    score += r["length_bonus"](word_count)
+
+    # Check for connectors (organized thinking)
+    has_connector = any(
+        conn in analysis.phrases for conn in rules.phrases["communication_connectors"]
+    )
+    if has_connector:
+        score += r["connector_bonus"]
+
+    # Check for personal response
+    has_personal = any(
+        marker in analysis.phrases for marker in rules.phrases["personal_markers"]
+    )
+    if has_personal:
+        score += r["personal_bonus"]
+
+    # Bonus for fluent speakers with details
+    if is_fluent_speaker and word_count >= r["fluent_detail_words"]:
+        score += r["fluent_detail_bonus"]
+
+    return max(min(round(score, 1), r["max"]), r["min"])
+
+
+def apply_quality_adjustment(
+    scores, quality_score, word_count, is_fluent_speaker, rules
+):
+    """
+    NEW SMART QUALITY ADJUSTMENT
+
+    Logic:
+    - Fluent speakers (≥30 words): Minimal penalty
+    - Beginners (<30 words): Standard penalty
+
+    Only affects: Fluency, Grammar, Vocabulary, Communication
+    Does NOT affect: Pronunciation (already handled separately)
+    """
+    r = rules["quality_adjustment"]
+    adjusted = scores.copy()
+
+    # Skip if quality is good
+    if quality_score >= r["skip_at"]:
+        return adjusted
+
+    if is_fluent_speaker:
+        # FLUENT SPEAKER: Protected from harsh penalties
+        multiplier = r["fluent_multiplier"](quality_score)
+    else:
+        # BEGINNER: Standard penalties
+        multiplier = r["beginner_multiplier"](quality_score)
+
+    # Apply to all except Pronunciation
+    adjusted["Fluency"] *= multiplier
+    adjusted["Grammar"] *= multiplier
+    adjusted["Vocabulary"] *= multiplier
+    adjusted["Communication"] *= multiplier
+
+    return adjusted
+
+
+def generate_feedback(
+    transcribed_text,
+    breakdown,
+    topic,
+    quality_score,
+    is_fluent_speaker,
+    speech_rate_info,
+):
+    """
+    Generate intelligent feedback based on student level (memoized on the
+    scores it reads; the text and topic do not change it)
+    """
+    wps, _ = speech_rate_info
+    key = (
+        breakdown["WordCount"],
+        breakdown["Fluency"],
+        breakdown["Vocabulary"],
+        breakdown["Grammar"],
+        breakdown["Pronunciation"],
+        breakdown["Communication"],
+        breakdown["Total"],
+        float(quality_score),
+        bool(is_fluent_speaker),
+        # 0 and 0.0 print differently
+        type(wps).__name__,
+        wps,
+    )
+    feedback = _feedback_cache.get(key)
+    if feedback is None:
+        feedback = _generate_feedback(
+            breakdown, quality_score, is_fluent_speaker, speech_rate_info
+        )
+        _feedback_cache.put(key, feedback)
+    return feedback
+
+
+def _generate_feedback(breakdown, quality_score, is_fluent_speaker, speech_rate_info):
+    feedback = []
+
+    word_count = breakdown["WordCount"]
+    wps, speed_category = speech_rate_info
+
+    # Quality warning (only if really bad)
+    if quality_score < 0.5 and not is_fluent_speaker:
+        feedback.append("### ⚠️ Audio Quality Notice\n")
+        feedback.append(f"**Recognition Quality: {quality_score*100:.0f}%**\n")
+        feedback.append("Some words may not be recognized correctly. Tips:")
+        feedback.append("- Speak clearly in a quiet room")
+        feedback.append("- Hold microphone close to your mouth")
+        feedback.append("- Try recording again if scores seem too low\n")
+        feedback.append("---\n")
+
+    # Fluent speaker notice (positive!)
+    if is_fluent_speaker:
+        feedback.append("### 🌟 Fluent Speaker Detected!\n")
+        feedback.append(
+            f"**Amazing!** You spoke **{word_count} words** at **{wps} words/second**!"
+        )
+        feedback.append(
+            "You're a confident English speaker! Keep up the excellent work! 🎉\n"
+        )
+        feedback.append("---\n")
+
+    feedback.append("### 📊 Your Performance\n")
+
+    # Fluency feedback
+    feedback.append("**Fluency & Speaking:**")
+    if breakdown["Fluency"] >= 1.8:
+        feedback.append(
+            "🌟 Outstanding! You spoke smoothly and naturally. Perfect fluency!"
+        )
+    elif breakdown["Fluency"] >= 1.5:
+        feedback.append("Great job! Your speech flows well. Very good!")
+    elif breakdown["Fluency"] >= 1.0:
+        feedback.append(
+            "Good effort! Try to speak a bit more to show your full ability."
+        )
+    else:
+        feedback.append("Keep practicing! Try to speak in longer, complete sentences.")
+
+    if wps >= 2.5:
+        feedback.append(
+            f"💨 **Speed Bonus!** You speak fast ({wps} words/sec) - sign of confidence!"
+        )
+
+    feedback.append("")
+
+    # Vocabulary feedback
+    feedback.append("**Vocabulary:**")
+    if breakdown["Vocabulary"] >= 1.5:
+        feedback.append("Wonderful! You used diverse and interesting words. Excellent!")
+    else:
+        feedback.append(
+            "Good! Try to use more descriptive words like 'amazing', 'beautiful', 'exciting'."
+        )
+    feedback.append("")
+
+    # Grammar feedback
+    feedback.append("**Grammar:**")
+    if breakdown["Grammar"] >= 1.5:
+        feedback.append("Excellent! Your grammar is correct. Well done!")
+    else:
+        feedback.append(
+            "Nice try! Remember complete sentences: 'I like...' instead of 'Like...'."
+        )
+    feedback.append("")
+
+    # Pronunciation feedback
+    feedback.append("**Pronunciation:**")
+    if is_fluent_speaker and quality_score < 0.7:
+        feedback.append(
+            "✅ **Note:** Lower confidence is NORMAL when speaking fast and fluently!"
+        )
+        feedback.append(
+            "Your pronunciation is likely very good - the system just had trouble keeping up with your speed!"
+        )
+    elif breakdown["Pronunciation"] >= 1.7:
+        feedback.append("Amazing! Crystal clear pronunciation. Keep it up!")
+    elif breakdown["Pronunciation"] >= 1.3:
+        feedback.append("Good! Your pronunciation is mostly clear.")
+    else:
+        feedback.append("Keep practicing! Speak slowly and clearly.")
+    feedback.append("")
+
+    # Communication feedback
+    feedback.append("**Communication:**")
+    if breakdown["Communication"] >= 1.5:
+        feedback.append(
+            "Fantastic! You communicated your ideas clearly and effectively!"
+        )
+    else:
+        feedback.append("Good start! Add more details: What? Why? How? When?")
+    feedback.append("")
+
+    # Overall suggestion
+    total_score = breakdown["Total"]
+    feedback.append("---")
+    feedback.append("### 💡 Next Steps:\n")
+
+    if is_fluent_speaker:
+        if total_score >= 8:
+            feedback.append(
+                "🏆 **You're excellent!** Challenge yourself with complex topics:"
+            )
+            feedback.append("- Debate topics (agree/disagree)")
+            feedback.append("- Story narration")
+            feedback.append("- Explain processes or ideas")
+        else:
+            feedback.append("You speak well! Focus on:")
+            feedback.append("- Expanding vocabulary")
+            feedback.append("- Using more complex sentence structures")
+            feedback.append("- Adding more details and examples")
+    else:
+        if total_score >= 7:
+            feedback.append("Great progress! To get even better:")
+            feedback.append("- Try speaking for longer (aim for 25+ words)")
+            feedback.append("- Use connecting words: 'and', 'but', 'because'")
+        elif total_score >= 5:
+            feedback.append("You're improving! Next time:")
+            feedback.append("- Speak at least 15-20 words")
+            feedback.append("- Use complete sentences")
+            feedback.append("- Don't worry about mistakes!")
+        else:
+            feedback.append("Good start! Keep practicing:")
+            feedback.append("- Speak in simple, complete sentences")
+            feedback.append("- Practice every day")
+            feedback.append("- Start with short topics you like")
+
+    feedback.append("\n**Remember:** Every practice makes you better! Keep going! 🌈")
+
+    return "\n".join(feedback)
+
+
+def analyze_speech(
+    transcribed_text,
+    topic,
+    whisper_confidence,
+    duration_seconds,
+    transcription_info=None,
+    rules=None,
+):
+    """
+    MAIN ANALYSIS FUNCTION with fair scoring system
+    `rules` defaults to the current rules/fair_scoring_v5.json; results are
+    memoized by score_key
+    """
+    if not transcribed_text or len(transcribed_text.strip()) == 0:
+        return 0, "⚠️ No speech detected. Please try again.", {}
+
+    rules = rules or rule_file().current()
+    key = score_key(
+        transcribed_text,
+        topic,
+        whisper_confidence,
+        duration_seconds,
+        transcription_info,
+        rules,
+    )
+    result = _score_cache.get(key)
+    if result is None:
+        result = _analyze_speech(
+            transcribed_text,
+            topic,
+            whisper_confidence,
+            duration_seconds,
+            transcription_info,
+            rules,
+        )
+        _score_cache.put(key, result)
+
+    # Callers may change the breakdown (history records); its only
+    # mutable value is the warnings list
+    score, feedback, breakdown = result
+    breakdown = dict(breakdown, DetectedWarnings=list(breakdown["DetectedWarnings"]))
+    return score, feedback, breakdown
+
+
+def _analyze_speech(
+    transcribed_text,
+    topic,
+    whisper_confidence,
+    duration_seconds,
+    transcription_info,
+    rules,
+):
+    # Tokenize once; every scorer reads the same analysis
+    analysis = analyze_text(transcribed_text, rules.matcher)
+    word_count = analysis.word_count
+    timing = transcription_info.get("timing") if transcription_info else None
+
+    # Calculate speech rate over the speaking span when word timings exist
+    # (leading/trailing silence does not slow the student down)
+    speech_rate_wps, speed_category = calculate_speech_rate(
+        word_count,
+        timing["speaking_seconds"] if timing else duration_seconds,
+        rules,
+    )
+
+    # Detect if fluent speaker
+    is_fluent_speaker, speaker_level = detect_fluent_speaker(
+        analysis, word_count, speech_rate_wps, rules
+    )
+
+    signal = transcription_info.get("signal") if transcription_info else None
+
+    # Score each criterion with new logic
+    pronunciation_score, pronunciation_level, quality_score, warnings = (
+        check_pronunciation(
+            analysis,
+            whisper_confidence,
+            word_count,
+            is_fluent_speaker,
+            rules,
+            signal,
+        )
+    )
+
+    # Flag answers that may not be in English (confident ones never get here)
+    if transcription_info and transcription_info["language"] != "en":
+        # Imported here: whisper (and torch) only load when a warning needs it
+        from whisper_cache import language_name
+
+        warnings.append(
+            f"Answer may not be in English "
+            f"(detected: {language_name(transcription_info['language'])})"
+        )
+
+    # Repetition loops / text over silence were removed from the transcript
+    if transcription_info and transcription_info.get("removed_segments"):
+        warnings.append("Repeated or unclear phrases were removed from the transcript")
+
+    fluency_score = check_fluency(
+        analysis, word_count, speech_rate_wps, is_fluent_speaker, rules, timing
+    )
+
+    grammar_score = check_grammar(analysis, rules)
+    vocabulary_score = check_vocabulary(analysis, rules)
+    communication_score = check_communication(
+        analysis, topic, word_count, is_fluent_speaker, rules
+    )
+
+    # Collect scores
+    scores = {
+        "Pronunciation": pronunciation_score,
+        "Fluency": fluency_score,
+        "Grammar": grammar_score,
+        "Vocabulary": vocabulary_score,
+        "Communication": communication_score,
+    }
+
+    # Apply smart quality adjustment (protects fluent speakers)
+    adjusted_scores = apply_quality_adjustment(
+        scores, quality_score, word_count, is_fluent_speaker, rules
+    )
+
+    # Calculate total
+    total_score = sum(adjusted_scores.values())
+    final_score_10 = round(total_score, 1)
+
+    # Create breakdown
+    breakdown = {
+        "Pronunciation": round(adjusted_scores["Pronunciation"], 1),
+        "Fluency": round(adjusted_scores["Fluency"], 1),
+        "Grammar": round(adjusted_scores["Grammar"], 1),
+        "Vocabulary": round(adjusted_scores["Vocabulary"], 1),
+        "Communication": round(adjusted_scores["Communication"], 1),
+        "Total": final_score_10,
+        "Confidence": round(quality_score * 100, 1),
+        "RawConfidence": round(whisper_confidence * 100, 1),
+        "WordCount": word_count,
+        "SpeechRate": speech_rate_wps,
+        "SpeedCategory": speed_category,
+        "IsFluentSpeaker": is_fluent_speaker,
+        "SpeakerLevel": speaker_level,
+        "ScoringRules": rules.tag,
+        "ScoringVersion": scoring_version(rules),
+        "DetectedWarnings": warnings,
+        "DetectedLanguage": (
+            transcription_info["language"] if transcription_info else "en"
+        ),
+        "LanguageConfidence": (
+            round(transcription_info["language_probability"] * 100, 1)
+            if transcription_info
+            else None
+        ),
+        "RemovedSegments": (
+            transcription_info.get("removed_segments", 0) if transcription_info else 0
+        ),
+        "SignalSNR": signal["snr_db"] if signal else None,
+        "ClippingRatio": signal["clipping_ratio"] if signal else None,
+        "LoudnessDBFS": signal["rms_dbfs"] if signal else None,
+        "ArticulationRate": timing["articulation_rate"] if timing else None,
+        "PauseCount": timing["pause_count"] if timing else None,
+        "MeanPause": timing["mean_pause"] if timing else None,
+        "MaxPause": timing["max_pause"] if timing else None,
+        "MeanRunLength": timing["mean_run_length"] if timing else None,
+        "FillerCount": timing["filler_count"] if timing else None,
+    }
+
+    # Generate feedback
+    feedback_text = generate_feedback(
+        transcribed_text,
+        breakdown,
+        topic,
+        quality_score,
+        is_fluent_speaker,
+        (speech_rate_wps, speed_category),
+    )
+
+    return final_score_10, feedback_text, breakdown
@@ -0,0 +1,168 @@
+"""
+Declarative scoring rules, compiled from versioned JSON files
+
+Each app keeps its thresholds, step tables and word lists in a file under
+rules/. Loading compiles the file once: step tables become bisect lookups,
+all rule phrases become one PhraseMatcher. RuleFile re-reads a file when it
+changes on disk, so rules can be tuned while the server (and the Whisper
+model) keeps running.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+from phrase_matcher import PhraseMatcher
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+
+
+class RuleError(ValueError):
+    """A rule file is missing fields or has an invalid table"""
+
+
+class StepTable:
+    """
+    Threshold table, e.g. {"at_least": [[10, 1.0], [25, 1.8]], "default": 0.8}
+    gives 1.8 for x >= 25, 1.0 for 10 <= x < 25 and 0.8 below 10.
+    {"below": [[0.5, -0.3], [0.7, -0.15]], "default": 0} gives the value of
+    the first limit that x is under.
+    """
+
+    def __init__(self, spec):
+        self.at_least = "at_least" in spec
+        steps = spec["at_least"] if self.at_least else spec["below"]
+        self.limits = [float(limit) for limit, _ in steps]
+        self.values = [value for _, value in steps]
+        self.default = spec.get("default")
+        if any(a >= b for a, b in zip(self.limits, self.limits[1:])):
+            raise RuleError(f"table limits must increase: {self.limits}")
+
+    def __call__(self, x):
+        if self.at_least:
+            index = bisect_right(self.limits, x) - 1
+            return self.values[index] if index >= 0 else self.default
+        index = bisect_right(self.limits, x)
+        return self.values[index] if index < len(self.values) else self.default
+
+    def lookup(self, x):
+        """Vectorized __call__ over a NumPy array (searchsorted = bisect_right)"""
+        index = np.searchsorted(self.limits, np.asarray(x, dtype=float), side="right")
+        if self.at_least:
+            return np.array([self.default] + self.values)[index]
+        return np.array(self.values + [self.default])[index]
+
+
+class ScoringRules:
+    """
+    Compiled rule set: `rules["fluency"]["word_count_score"](25)` and so on.
+    `phrases` are matched on word boundaries by `matcher`; `words` are
+    plain token lists.
+    """
+
+    def __init__(self, data):
+        try:
+            self.name = data["name"]
+            self.version = str(data["version"])
+            self.phrases = {
+                key: tuple(tuple(p) if isinstance(p, list) else p for p in values)
+                for key, values in data.get("phrases", {}).items()
+            }
+            self.words = {
+                key: frozenset(values) for key, values in data.get("words", {}).items()
+            }
+            self.sections = {
+                key: _compile_section(value)
+                for key, value in data.items()
+                if isinstance(value, dict) and key not in ("phrases", "words")
+            }
+        except RuleError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise RuleError(f"invalid rule file: {e!r}") from e
+
+        # Content hash: an edited file is a different rule set even when
+        # its version was not bumped
+        self.digest = hashlib.sha1(
+            json.dumps(data, sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+        # Error pairs contribute their wrong form
+        self.matcher = PhraseMatcher(
+            p[0] if isinstance(p, tuple) else p
+            for values in self.phrases.values()
+            for p in values
+        )
+
+    def __getitem__(self, section):
+        return self.sections[section]
+
+    @property
+    def tag(self):
+        """Returns: 'name@version'"""
+        return f"{self.name}@{self.version}"
+
+
+def _compile_section(value):
+    """Step-table specs become StepTables, nested sections recurse"""
+    if "at_least" in value or "below" in value:
+        return StepTable(value)
+    return {
+        key: _compile_section(item) if isinstance(item, dict) else item
+        for key, item in value.items()
+    }
+
+
+def load_rules(path):
+    """
+    Read and compile a rule file
+    Returns: ScoringRules
+    Raises: RuleError when the file is not valid
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+    except json.JSONDecodeError as e:
+        raise RuleError(f"{os.path.basename(path)}: {e}") from e
+    return ScoringRules(data)
+
+
+class RuleFile:
+    """
+    A rule file that recompiles itself when it changes on disk. A broken
+    edit keeps the last good rules and is reported in `error`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.error = None
+        self.stamp = self._stamp()
+        self.rules = load_rules(path)
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self):
+        """Returns: the compiled rules, reloaded first if the file changed"""
+        try:
+            stamp = self._stamp()
+        except OSError as e:
+            self.error = str(e)
+            return self.rules
+
+        if stamp != self.stamp:
+            with self.lock:
+                if stamp != self.stamp:
+                    try:
+                        self.rules = load_rules(self.path)
+                        self.error = None
+                    except (OSError, RuleError) as e:
+                        self.error = str(e)
+                    self.stamp = stamp
+        return self.rules
@@ -0,0 +1,154 @@
+"""
+Signal-based audio quality metrics on the decoded 16 kHz buffer
+
+Estimated SNR, clipping ratio, speech loudness and DC offset are measured
+from the samples themselves (vectorized NumPy, a few tens of microseconds
+per second of audio) instead of being guessed from the transcript.
+"""
+
+import numpy as np
+
+# whisper.audio.SAMPLE_RATE, defined here so the scorer does not import torch
+SAMPLE_RATE = 16000
+
+FRAME_SECONDS = 0.02
+
+# Samples at or above this magnitude count as clipped
+CLIP_LEVEL = 0.999
+
+# Thresholds for quality penalties (penalty, warning)
+LOW_SNR_DB = 10.0
+FAIR_SNR_DB = 20.0
+CLIPPING_RATIO = 0.01
+QUIET_DBFS = -40.0
+LOUD_DBFS = -3.0
+DC_OFFSET = 0.05
+
+# Energy VAD: speech must be above an absolute floor and clearly above the
+# recording's own noise floor
+VAD_MIN_DBFS = -50.0
+VAD_MAX_THRESHOLD_DBFS = -35.0
+VAD_NOISE_MARGIN_DB = 12.0
+
+
+def energy_speech_mask(level_db):
+    """
+    Speech/non-speech decision for frame levels in dBFS: above an absolute
+    floor and clearly above the recording's own noise floor
+    """
+    if len(level_db) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(level_db, 10)
+    threshold = min(
+        max(VAD_MIN_DBFS, noise_floor + VAD_NOISE_MARGIN_DB), VAD_MAX_THRESHOLD_DBFS
+    )
+    return level_db > threshold
+
+
+class SignalMeter:
+    """
+    Accumulates frame energies and sample counts, so long recordings can be
+    measured chunk by chunk
+    """
+
+    def __init__(self):
+        self.frame_energy = []
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.samples = 0
+        self.clipped = 0
+        self.total = 0.0
+
+    def add(self, audio):
+        """Measure another block of 16 kHz mono float32 samples"""
+        audio = np.asarray(audio, dtype=np.float32)
+        frame = int(FRAME_SECONDS * SAMPLE_RATE)
+
+        # Samples left over from the previous block start the next frame,
+        # so the envelope stays aligned with the recording timeline
+        framed = np.concatenate([self.carry, audio]) if len(self.carry) else audio
+        count = len(framed) // frame
+        if count:
+            frames = framed[: count * frame].reshape(count, frame)
+            self.frame_energy.append(np.einsum("ij,ij->i", frames, frames) / frame)
+        self.carry = framed[count * frame :].copy()
+
+        self.samples += len(audio)
+        self.clipped += int(np.count_nonzero(audio >= CLIP_LEVEL))
+        self.clipped += int(np.count_nonzero(audio <= -CLIP_LEVEL))
+        self.total += float(audio.sum(dtype=np.float64))
+        return self
+
+    def energy(self):
+        """Per-frame mean energy (FRAME_SECONDS frames), DC part removed"""
+        if self.samples == 0 or not self.frame_energy:
+            return np.zeros(0, dtype=np.float32)
+        dc_offset = self.total / self.samples
+        # Remove the DC part so an offset does not look like loud noise
+        return np.maximum(np.concatenate(self.frame_energy) - dc_offset**2, 1e-10)
+
+    def envelope_db(self):
+        """Energy envelope in dBFS, one value per FRAME_SECONDS frame"""
+        return 10 * np.log10(self.energy())
+
+    def metrics(self):
+        """
+        Returns: dict(snr_db, clipping_ratio, rms_dbfs, dc_offset), or None
+        when there was no audio
+        """
+        if self.samples == 0 or not self.frame_energy:
+            return None
+
+        dc_offset = self.total / self.samples
+        energy = self.energy()
+
+        # Loudest frames ~ speech, quietest frames ~ background noise
+        noise, median, speech = np.percentile(energy, [10, 50, 90])
+        active = energy[energy >= median]
+
+        return {
+            "snr_db": round(float(10 * np.log10(speech / noise)), 1),
+            "clipping_ratio": round(self.clipped / self.samples, 4),
+            "rms_dbfs": round(float(10 * np.log10(active.mean())), 1),
+            "dc_offset": round(dc_offset, 4),
+        }
+
+
+def signal_metrics(audio):
+    """Quality metrics of a whole recording (see SignalMeter.metrics)"""
+    return SignalMeter().add(audio).metrics()
+
+
+def signal_quality_penalty(metrics):
+    """
+    Translate signal metrics into a quality-score penalty
+    Returns: (penalty 0-1, warnings)
+    """
+    if not metrics:
+        return 0.0, []
+
+    penalty = 0.0
+    warnings = []
+
+    if metrics["snr_db"] < LOW_SNR_DB:
+        penalty += 0.15
+        warnings.append("Background noise is loud - try a quieter place")
+    elif metrics["snr_db"] < FAIR_SNR_DB:
+        penalty += 0.05
+        warnings.append("Some background noise in the recording")
+
+    if metrics["clipping_ratio"] > CLIPPING_RATIO:
+        penalty += 0.1
+        warnings.append("Audio is clipping - move further from the microphone")
+
+    if metrics["rms_dbfs"] < QUIET_DBFS:
+        penalty += 0.1
+        warnings.append("Recording is very quiet - speak closer to the microphone")
+    elif metrics["rms_dbfs"] > LOUD_DBFS:
+        penalty += 0.05
+        warnings.append("Recording is very loud")
+
+    if abs(metrics["dc_offset"]) > DC_OFFSET:
+        penalty += 0.05
+        warnings.append("Microphone signal has a DC offset")
+
+    return penalty, warnings
@@ -0,0 +1,107 @@
+"""
+Speculative background work keyed by recording content
+
+As soon as a recording is available, convert + transcribe starts on the
+session's worker thread. "Analyze" then only collects the finished result.
+When the recording changes, the stale job is cancelled.
+"""
+
+import atexit
+import hashlib
+import threading
+import weakref
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+def content_key(data, *salt):
+    """Hash of the recording bytes (plus anything else the result depends on)"""
+    digest = hashlib.sha1(data)
+    for item in salt:
+        digest.update(repr(item).encode())
+    return digest.hexdigest()
+
+
+def _shutdown_at_exit(executor_ref):
+    executor = executor_ref()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_executor():
+    """
+    Single worker thread for speculative jobs; it is shut down at exit
+    without starting the jobs still queued (only a weak reference is kept,
+    so the thread also ends when its session is gone)
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+    atexit.register(_shutdown_at_exit, weakref.ref(executor))
+    return executor
+
+
+class SpeculativeJobs:
+    """
+    One speculative job at a time per session
+
+    Each session owns a single worker thread, so its jobs run one after
+    another (a stale job still running never overlaps the next one) and
+    never wait behind another session's jobs.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or make_executor()
+        self.lock = threading.Lock()
+        self.key = None
+        self.future = None
+        self.cancelled = None
+
+    def submit(self, key, job, *args):
+        """
+        Run job(*args, cancelled=event) in the background unless the same
+        key is already running or done; any other job is cancelled first
+        """
+        with self.lock:
+            if key == self.key and self.future is not None:
+                return self.future
+
+            self._cancel_locked()
+            self.key = key
+            self.cancelled = threading.Event()
+            self.future = self.executor.submit(job, *args, cancelled=self.cancelled)
+            return self.future
+
+    def has(self, key):
+        """A job for this key is already running or done"""
+        with self.lock:
+            return key == self.key and self.future is not None
+
+    def cancel(self):
+        """Cancel the current job (queued jobs never start, running ones stop early)"""
+        with self.lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        if self.future is not None:
+            self.future.cancel()
+            self.cancelled.set()
+        self.key = None
+        self.future = None
+        self.cancelled = None
+
+    def result(self, key):
+        """
+        Wait for the job of this key
+        Returns: its result, or None if no job ran for it (or it failed)
+        """
+        with self.lock:
+            future = self.future if key == self.key else None
+
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except CancelledError:
+            return None
+        except Exception:
+            # Jobs report expected errors in their result; anything else
+            # only means nothing was prepared
+            return None
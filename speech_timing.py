@@ -0,0 +1,76 @@
+"""
+Pause, articulation-rate and filler analysis
+
+Word timestamps give the speaking span (no leading/trailing silence) and
+the word count; the energy envelope from SignalMeter marks the pauses,
+since Whisper often stretches a word's end time over the silence after
+it. Everything is computed in one vectorized pass, no extra model calls.
+"""
+
+import numpy as np
+
+from signal_quality import FRAME_SECONDS, energy_speech_mask
+
+# Silences at least this long count as pauses (shorter ones are stop
+# closures and breaths inside a phrase)
+MIN_PAUSE_SECONDS = 0.25
+
+FILLER_WORDS = {"um", "uh", "er", "erm", "ah", "hmm", "mm", "uhm"}
+
+
+def _runs(mask):
+    """Start and end indices of consecutive True runs in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def speech_timing(word_table, envelope_db=None, frame_seconds=FRAME_SECONDS):
+    """
+    Timing metrics of an answer
+    Returns: dict(speaking_seconds, articulation_rate, pause_count,
+    mean_pause, max_pause, mean_run_length, filler_count), or None when
+    there are no word timestamps
+    """
+    if word_table is None or len(word_table) == 0:
+        return None
+
+    starts = word_table["start"].to_numpy(np.float64)
+    ends = word_table["end"].to_numpy(np.float64)
+    span_start, span_end = starts[0], max(ends[-1], starts[0] + frame_seconds)
+
+    # Pause timeline over the speaking span: silent frames of the energy
+    # envelope, or the gaps between words when there is no envelope
+    first = int(span_start / frame_seconds)
+    last = int(np.ceil(span_end / frame_seconds))
+    if envelope_db is not None and len(envelope_db) >= last:
+        silent = ~energy_speech_mask(envelope_db)[first:last]
+    else:
+        covered = np.zeros(last - first + 1, dtype=np.int32)
+        np.add.at(covered, (starts / frame_seconds).astype(int) - first, 1)
+        np.add.at(covered, np.ceil(ends / frame_seconds).astype(int) - first, -1)
+        silent = np.cumsum(covered)[:-1] <= 0
+
+    run_starts, run_ends = _runs(silent)
+    lengths = (run_ends - run_starts) * frame_seconds
+    is_pause = lengths >= MIN_PAUSE_SECONDS
+    pauses = lengths[is_pause]
+
+    # Words between pauses: count word starts in each stretch of speech
+    pause_times = (run_starts[is_pause] + first) * frame_seconds
+    runs = np.bincount(np.searchsorted(pause_times, starts), minlength=1)
+    runs = runs[runs > 0]
+
+    speaking_seconds = span_end - span_start
+    phonation_seconds = max(speaking_seconds - pauses.sum(), frame_seconds)
+    word_count = len(word_table)
+    fillers = np.isin(word_table["word"].to_numpy(), list(FILLER_WORDS))
+
+    return {
+        "speaking_seconds": round(float(speaking_seconds), 2),
+        "articulation_rate": round(float(word_count / phonation_seconds), 2),
+        "pause_count": int(len(pauses)),
+        "mean_pause": round(float(pauses.mean()), 2) if len(pauses) else 0.0,
+        "max_pause": round(float(pauses.max()), 2) if len(pauses) else 0.0,
+        "mean_run_length": round(float(runs.mean()), 1),
+        "filler_count": int(fillers.sum()),
+    }
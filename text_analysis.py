@@ -0,0 +1,102 @@
+"""
+One tokenizer pass over a transcript, shared by every scorer
+
+The scorers used to lower-case, split and regex-clean the same text five or
+six times each. `analyze_text` does it once and returns a small immutable
+record; the checks then only count and look up. Rule phrases (connectors,
+error pairs, markers) come from the same call, found by one PhraseMatcher
+scan; word checks use whitespace tokens.
+"""
+
+import re
+from collections import namedtuple
+
+_NON_LETTERS = re.compile(r"[^a-z]")
+_NON_LETTERS_OR_SPACE = re.compile(r"[^a-z\s]")
+_NON_ASCII_LETTERS = re.compile(r"[^a-zA-Z]")
+_SENTENCE = re.compile(r"[^.!?]+")
+_SPECIAL_CHARS = re.compile(r"[^a-zA-Z0-9\s\.,!?\'-]")
+
+TextAnalysis = namedtuple(
+    "TextAnalysis",
+    [
+        "text",  # original transcript
+        "lower",  # text.lower(), for substring checks
+        "tokens",  # lower-cased whitespace tokens
+        "token_set",  # frozenset of tokens, for membership checks
+        "letters",  # tokens reduced to a-z, empty ones dropped
+        "word_count",
+        "short_count",  # tokens with at most 2 letters
+        "repeated_count",  # adjacent repeats of words longer than 2 letters
+        "long_count",  # letter-only words longer than 2 letters
+        "unique_long_count",  # distinct ones among them
+        "sentence_spans",  # (start, end) of each non-empty sentence
+        "sentence_tokens",  # lower-cased tokens of each sentence
+        "special_char_count",  # characters a recognizer should not produce
+        "phrases",  # rule phrases found by the matcher (word boundaries)
+    ],
+)
+
+
+def analyze_text(text, matcher=None):
+    """
+    Tokenize a transcript once for all scorers; `matcher` (PhraseMatcher)
+    fills in the rule phrases it contains
+    Returns: TextAnalysis
+    """
+    text = text or ""
+    lower = text.lower()
+
+    tokens = lower.split()
+    if text.isascii():
+        # Plain ASCII transcripts (the common case): strip non-letters from
+        # the whole text at once; tokens that had no letters simply vanish
+        letters = _NON_LETTERS_OR_SPACE.sub("", lower).split()
+        short_count = None
+    else:
+        letters = []
+        short_count = 0
+        for raw, token in zip(text.split(), tokens):
+            cleaned = _NON_LETTERS.sub("", token)
+            if len(_NON_ASCII_LETTERS.sub("", raw)) <= 2:
+                short_count += 1
+            if cleaned:
+                letters.append(cleaned)
+
+    repeated_count = sum(
+        1
+        for first, second in zip(letters, letters[1:])
+        if first == second and len(first) > 2
+    )
+    long_words = [w for w in letters if len(w) > 2]
+    if short_count is None:
+        # Every token without 3+ letters is short (letter-less ones included)
+        short_count = len(tokens) - len(long_words)
+
+    sentence_spans = []
+    sentence_tokens = []
+    for match in _SENTENCE.finditer(text):
+        sentence = match.group()
+        stripped = sentence.strip()
+        if not stripped:
+            continue
+        start = match.start() + len(sentence) - len(sentence.lstrip())
+        sentence_spans.append((start, start + len(stripped)))
+        sentence_tokens.append(tuple(stripped.lower().split()))
+
+    return TextAnalysis(
+        text=text,
+        lower=lower,
+        tokens=tuple(tokens),
+        token_set=frozenset(tokens),
+        letters=tuple(letters),
+        word_count=len(tokens),
+        short_count=short_count,
+        repeated_count=repeated_count,
+        long_count=len(long_words),
+        unique_long_count=len(set(long_words)),
+        sentence_spans=tuple(sentence_spans),
+        sentence_tokens=tuple(sentence_tokens),
+        special_char_count=len(_SPECIAL_CHARS.findall(text)),
+        phrases=matcher.found(lower) if matcher else frozenset(),
+    )
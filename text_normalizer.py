@@ -0,0 +1,290 @@
+"""
+Normalization of reference and recognized text before word alignment
+
+Whisper writes "I'm", "20" and "Mr." where a reference may say "I am",
+"twenty" and "mister" (or the other way round), and British and American
+spellings differ. Stripping non-letters turns all of these into false
+errors. Both sides go through the same table-driven steps instead:
+numbers are spelled out, contractions and abbreviations expanded, and
+British spellings mapped to American ones. The tables are compiled into
+one lookup dict and one token regex at import; a reference sentence is
+normalized once and cached.
+"""
+
+import functools
+import re
+
+ONES = [
+    "zero",
+    "one",
+    "two",
+    "three",
+    "four",
+    "five",
+    "six",
+    "seven",
+    "eight",
+    "nine",
+    "ten",
+    "eleven",
+    "twelve",
+    "thirteen",
+    "fourteen",
+    "fifteen",
+    "sixteen",
+    "seventeen",
+    "eighteen",
+    "nineteen",
+]
+TENS = [
+    "",
+    "",
+    "twenty",
+    "thirty",
+    "forty",
+    "fifty",
+    "sixty",
+    "seventy",
+    "eighty",
+    "ninety",
+]
+SCALES = [(10**9, "billion"), (10**6, "million"), (1000, "thousand")]
+
+# Ordinals that are not the cardinal + "th"
+IRREGULAR_ORDINALS = {
+    "one": "first",
+    "two": "second",
+    "three": "third",
+    "five": "fifth",
+    "eight": "eighth",
+    "nine": "ninth",
+    "twelve": "twelfth",
+}
+
+CONTRACTIONS = {
+    "i'm": "i am",
+    "won't": "will not",
+    "can't": "can not",
+    "cannot": "can not",
+    "shan't": "shall not",
+    "ain't": "is not",
+    "let's": "let us",
+    "y'all": "you all",
+    "it's": "it is",
+    "that's": "that is",
+    "what's": "what is",
+    "where's": "where is",
+    "who's": "who is",
+    "there's": "there is",
+    "here's": "here is",
+    "he's": "he is",
+    "she's": "she is",
+    "how's": "how is",
+    "gonna": "going to",
+    "wanna": "want to",
+    "gotta": "got to",
+}
+
+# Endings of regular contractions ("they're", "we've", "didn't", "I'd")
+CONTRACTION_SUFFIXES = [
+    ("n't", " not"),
+    ("'re", " are"),
+    ("'ve", " have"),
+    ("'ll", " will"),
+    ("'d", " would"),
+]
+
+ABBREVIATIONS = {
+    "mr": "mister",
+    "mrs": "missus",
+    "ms": "miss",
+    "dr": "doctor",
+    "vs": "versus",
+    "etc": "et cetera",
+    "pm": "p m",
+    "ok": "okay",
+    "tv": "t v",
+}
+
+# British -> American spellings; plural, -ed and -ing forms are derived
+BRITISH_SPELLINGS = {
+    "colour": "color",
+    "favour": "favor",
+    "favourite": "favorite",
+    "flavour": "flavor",
+    "honour": "honor",
+    "humour": "humor",
+    "labour": "labor",
+    "neighbour": "neighbor",
+    "behaviour": "behavior",
+    "harbour": "harbor",
+    "rumour": "rumor",
+    "centre": "center",
+    "theatre": "theater",
+    "metre": "meter",
+    "litre": "liter",
+    "fibre": "fiber",
+    "realise": "realize",
+    "organise": "organize",
+    "recognise": "recognize",
+    "apologise": "apologize",
+    "memorise": "memorize",
+    "practise": "practice",
+    "analyse": "analyze",
+    "travelled": "traveled",
+    "travelling": "traveling",
+    "traveller": "traveler",
+    "cancelled": "canceled",
+    "defence": "defense",
+    "licence": "license",
+    "offence": "offense",
+    "catalogue": "catalog",
+    "dialogue": "dialog",
+    "programme": "program",
+    "grey": "gray",
+    "tyre": "tire",
+    "jewellery": "jewelry",
+    "mum": "mom",
+    "aeroplane": "airplane",
+    "cheque": "check",
+}
+
+_TOKEN = re.compile(
+    # Commas only as thousands separators: in "1990, I was" the comma is punctuation
+    r"(?P<currency>\$)?(?P<number>(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)"
+    r"(?P<suffix>st|nd|rd|th|s|%)?"
+    r"|(?P<word>[a-z]+(?:'[a-z]+)*)"
+)
+
+
+def _inflections(british, american):
+    """The pair plus its -s, -ed and -ing forms"""
+    yield british, american
+    yield british + "s", american + "s"
+    stem_uk = british[:-1] if british.endswith("e") else british
+    stem_us = american[:-1] if american.endswith("e") else american
+    yield stem_uk + "ed", stem_us + "ed"
+    yield stem_uk + "ing", stem_us + "ing"
+
+
+def _compile_words():
+    """One dict: token -> tuple of normalized words"""
+    table = {}
+    for british, american in BRITISH_SPELLINGS.items():
+        for uk, us in _inflections(british, american):
+            if uk != us:
+                table.setdefault(uk, (us,))
+    for source in (ABBREVIATIONS, CONTRACTIONS):
+        for token, words in source.items():
+            table[token] = tuple(words.split())
+    return table
+
+
+_WORDS = _compile_words()
+
+
+def _under_thousand(n):
+    words = []
+    if n >= 100:
+        words += [ONES[n // 100], "hundred"]
+        n %= 100
+    if n >= 20:
+        words.append(TENS[n // 10])
+        n %= 10
+        if n:
+            words.append(ONES[n])
+    elif n or not words:
+        words.append(ONES[n])
+    return words
+
+
+def number_words(n, years=True):
+    """
+    Spell out a non-negative integer ("2024" -> two thousand twenty four);
+    with `years`, 1100-1999 are read as years ("nineteen ninety")
+    Returns: list of words
+    """
+    if years and 1100 <= n <= 1999 and n % 100:
+        return _under_thousand(n // 100) + _under_thousand(n % 100)
+    if n >= 10**12:
+        return [ONES[int(digit)] for digit in str(n)]
+
+    words = []
+    for scale, name in SCALES:
+        if n >= scale:
+            words += _under_thousand(n // scale) + [name]
+            n %= scale
+    if n or not words:
+        words += _under_thousand(n)
+    return words
+
+
+def _ordinal(words):
+    last = words[-1]
+    if last in IRREGULAR_ORDINALS:
+        last = IRREGULAR_ORDINALS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return words[:-1] + [last]
+
+
+def _expand_number(currency, number, suffix):
+    integer, _, fraction = number.replace(",", "").partition(".")
+    # "1,250" is a quantity; a bare "1990" is most likely a year
+    words = number_words(int(integer), years="," not in number and not fraction)
+    if currency:  # "$3.50" -> three dollars fifty cents
+        words.append("dollar" if int(integer) == 1 else "dollars")
+        if fraction and int(fraction[:2].ljust(2, "0")):
+            words += number_words(int(fraction[:2].ljust(2, "0"))) + ["cents"]
+        return words
+    if fraction:
+        words += ["point"] + [ONES[int(digit)] for digit in fraction]
+
+    if suffix in ("st", "nd", "rd", "th") and not fraction:
+        words = _ordinal(words)
+    elif suffix == "s":  # "1990s"
+        last = words[-1]
+        words[-1] = last[:-1] + "ies" if last.endswith("y") else last + "s"
+    elif suffix == "%":
+        words.append("percent")
+    return words
+
+
+def _expand_word(token):
+    words = _WORDS.get(token)
+    if words is not None:
+        return list(words)
+    if "'" in token:
+        for ending, expansion in CONTRACTION_SUFFIXES:
+            if token.endswith(ending):
+                token = token[: -len(ending)] + expansion
+                break
+        # Possessives and anything else keep their letters ("tom's" -> toms)
+        return [_WORDS.get(word, (word,))[0] for word in token.replace("'", "").split()]
+    return [token]
+
+
+def normalize_text(text):
+    """
+    Lower-case words of a text with numbers spelled out, contractions and
+    abbreviations expanded and British spellings made American
+    Returns: list of words (letters only)
+    """
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    words = []
+    for match in _TOKEN.finditer(text):
+        if match.group("word"):
+            words += _expand_word(match.group("word"))
+        else:
+            words += _expand_number(
+                match.group("currency"), match.group("number"), match.group("suffix")
+            )
+    return words
+
+
+@functools.lru_cache(maxsize=256)
+def normalize_reference(reference):
+    """normalize_text for a reference sentence, computed once per sentence"""
+    return tuple(normalize_text(reference))
@@ -0,0 +1,265 @@
+"""
+Bounded cache of mel spectrograms and Whisper encoder outputs
+
+Re-scoring the same recording (corrected reference, teacher-forced scoring,
+word timestamps) reuses the cached encoder output instead of running the
+audio encoder again. Language ID and teacher forcing also run on it.
+"""
+
+import hashlib
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import (
+    CHUNK_LENGTH,
+    FRAMES_PER_SECOND,
+    N_FRAMES,
+    N_SAMPLES,
+    pad_or_trim,
+)
+from whisper.tokenizer import LANGUAGES, get_tokenizer
+
+from lru_store import LRUStore
+from text_normalizer import normalize_reference, normalize_text
+from word_alignment import word_edit_ops
+
+MEL_CACHE_SIZE = 8  # recordings
+ENCODER_CACHE_SIZE = 16  # 30-second encoder windows per model
+
+# Skip decoding when another language is detected at least this confidently
+LANGUAGE_REJECT_PROBABILITY = 0.6
+
+# A teacher-forced window starts this long before its first word (seconds),
+# so an early word onset is not cut off
+WINDOW_MARGIN = 0.5
+
+
+_mel_cache = LRUStore(MEL_CACHE_SIZE)
+
+
+def audio_hash(audio):
+    """Content hash of a 16 kHz float32 waveform"""
+    samples = np.ascontiguousarray(audio, dtype=np.float32)
+    return hashlib.sha1(samples.view(np.uint8)).hexdigest()
+
+
+def _tensor_digest(tensor):
+    array = tensor.detach().cpu().contiguous().numpy()
+    return hashlib.sha1(array.view(np.uint8)).hexdigest()
+
+
+class CachedEncoder(torch.nn.Module):
+    """
+    Drop-in wrapper around model.encoder that memoizes its output per
+    30-second mel window, so every later pass over the same audio
+    (decode fallbacks, word timestamps, language ID, teacher forcing)
+    skips the encoder
+    """
+
+    def __init__(self, encoder, max_items=ENCODER_CACHE_SIZE):
+        super().__init__()
+        self.encoder = encoder
+        self.cache = LRUStore(max_items)
+
+    def forward(self, x):
+        keys = [_tensor_digest(window) for window in x]
+        cached = [self.cache.get(key) for key in keys]
+
+        if all(features is not None for features in cached):
+            return torch.stack(cached)
+
+        features = self.encoder(x)
+        for key, window_features in zip(keys, features):
+            self.cache.put(key, window_features)
+        return features
+
+
+def install_encoder_cache(model):
+    """Wrap the model encoder with CachedEncoder (idempotent)"""
+    if model is not None and not isinstance(model.encoder, CachedEncoder):
+        model.encoder = CachedEncoder(model.encoder)
+    return model
+
+
+def encoder_cache_stats(model):
+    """Return (hits, misses) of the model's encoder cache"""
+    if model is None or not isinstance(model.encoder, CachedEncoder):
+        return 0, 0
+    return model.encoder.cache.hits, model.encoder.cache.misses
+
+
+def _model_dtype(model):
+    # transcribe() runs fp16 on GPU and fp32 on CPU; match it so the
+    # window digests (and therefore cache keys) are identical
+    return torch.float16 if model.device.type == "cuda" else torch.float32
+
+
+def get_mel(model, audio, key=None):
+    """
+    Log-mel spectrogram of the recording (padded like transcribe()),
+    cached per audio hash
+    """
+    key = key or audio_hash(audio)
+    cache_key = (key, model.dims.n_mels)
+
+    mel = _mel_cache.get(cache_key)
+    if mel is None:
+        mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+        _mel_cache.put(cache_key, mel)
+    return mel
+
+
+def mel_window(model, audio, seconds=0.0, key=None):
+    """
+    30-second mel window starting `seconds` into the recording; the first
+    one is byte-identical to transcribe()'s first window
+    """
+    mel = get_mel(model, audio, key)
+    content_frames = mel.shape[-1] - N_FRAMES
+    start = min(int(seconds * FRAMES_PER_SECOND), content_frames)
+    segment = mel[:, start : min(start + N_FRAMES, content_frames)]
+    return pad_or_trim(segment, N_FRAMES).to(model.device).to(_model_dtype(model))
+
+
+def first_window(model, audio, key=None):
+    """First 30-second mel window, byte-identical to transcribe()'s first window"""
+    return mel_window(model, audio, 0.0, key)
+
+
+def detect_language(model, audio, key=None):
+    """
+    Spoken language of the first window, detected before decoding
+    (one decoder step on the encoder output, which the decode then reuses)
+    Returns: (language_code, probability)
+    """
+    if not model.is_multilingual:
+        return "en", 1.0
+
+    with torch.no_grad():
+        _, probs = model.detect_language(first_window(model, audio, key))
+
+    language = max(probs, key=probs.get)
+    return language, probs[language]
+
+
+def language_name(code):
+    """Readable language name for a Whisper language code"""
+    return LANGUAGES.get(code, code).title()
+
+
+def _window_groups(ref_count, first_ref, word_times):
+    """
+    Split the raw words of a reference into runs that fit one 30-second
+    window each, using the reference word times
+    Returns: list of (window start in seconds, first raw word, end raw word)
+    """
+    starts, ends = word_times
+    raw_count = len(first_ref) - 1
+    groups = []
+    a = 0
+    while a < raw_count:
+        offset = max(
+            0.0, float(starts[min(first_ref[a], ref_count - 1)]) - WINDOW_MARGIN
+        )
+        b = a + 1
+        while (
+            b < raw_count
+            and ends[max(first_ref[b + 1] - 1, 0)] <= offset + CHUNK_LENGTH
+        ):
+            b += 1
+        groups.append((offset, a, b))
+        a = b
+    return groups
+
+
+def _forced_token_words(model, tokenizer, window, text):
+    """
+    One teacher-forced decoder pass of `text` over a mel window
+    Returns: (words, probabilities), the words normalized ("I'm" -> i, am,
+    each with the probability of the token word); None when the text is
+    too long for the decoder
+    """
+    text_tokens = tokenizer.encode(" " + text.strip())
+    if len(text_tokens) > model.dims.n_text_ctx // 2:
+        return None
+
+    tokens = torch.tensor(
+        [*tokenizer.sot_sequence, tokenizer.no_timestamps, *text_tokens]
+    ).to(model.device)
+
+    with torch.no_grad():
+        features = model.embed_audio(window.unsqueeze(0))
+        logits = model.logits(tokens.unsqueeze(0), features)[0]
+        sampled_logits = logits[len(tokenizer.sot_sequence) :, : tokenizer.eot]
+        token_probs = sampled_logits.float().softmax(dim=-1)
+        text_token_probs = token_probs[np.arange(len(text_tokens)), text_tokens]
+        text_token_probs = text_token_probs.cpu().numpy()
+
+    # Average token probabilities per word
+    words, word_tokens = tokenizer.split_to_word_tokens(text_tokens)
+    boundaries = np.cumsum([0] + [len(t) for t in word_tokens])
+    tf_words = []
+    tf_probs = []
+    for word, start, end in zip(words, boundaries[:-1], boundaries[1:]):
+        pieces = normalize_text(word)
+        tf_words += pieces
+        tf_probs += [float(text_token_probs[start:end].mean())] * len(pieces)
+    return tf_words, tf_probs
+
+
+def teacher_forced_word_probs(model, audio, text, key=None, word_times=None):
+    """
+    Probability Whisper assigns to each word of `text` given the audio
+    (teacher forcing, encoder output from the cache)
+
+    `word_times` = (starts, ends) of the reference words (force_align_reference)
+    lets the decode slide over successive 30-second windows; without it only
+    a recording that fits one window is scored.
+    Returns: list of (word, probability) aligned to normalize_reference(text),
+    probability None for words that could not be scored; None when the
+    recording is longer than one window and there are no word times
+    """
+    ref_words = normalize_reference(text)
+    if not ref_words:
+        return []
+    key = key or audio_hash(audio)
+
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language="en",
+        task="transcribe",
+    )
+
+    # 1. Raw words of the text and where their reference words begin
+    raw_words = text.split()
+    first_ref = np.cumsum([0] + [len(normalize_text(w)) for w in raw_words])
+    if word_times is not None and first_ref[-1] == len(ref_words):
+        groups = _window_groups(len(ref_words), first_ref, word_times)
+    elif len(audio) <= N_SAMPLES:
+        raw_words = [text]
+        first_ref = [0, len(ref_words)]
+        groups = [(0.0, 0, 1)]
+    else:
+        return None
+
+    # 2. One decoder pass per window, mapped onto that run of reference words
+    probs = [None] * len(ref_words)
+    for offset, a, b in groups:
+        scored = _forced_token_words(
+            model,
+            tokenizer,
+            mel_window(model, audio, offset, key),
+            " ".join(raw_words[a:b]),
+        )
+        if scored is None:
+            continue
+        tf_words, tf_probs = scored
+        ref_start = first_ref[a]
+        run = ref_words[ref_start : first_ref[b]]
+        for op, i, j in word_edit_ops(run, tf_words):
+            if op == "match":
+                probs[ref_start + i] = tf_probs[j]
+
+    return list(zip(ref_words, probs))
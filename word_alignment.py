@@ -0,0 +1,255 @@
+"""
+Word-level timing tables and forced alignment of a reference text
+against the word timestamps returned by Whisper (word_timestamps=True)
+"""
+
+import re
+
+import Levenshtein
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Matched words recognized below this probability only get half credit
+UNCLEAR_WORD_CONFIDENCE = 0.4
+
+# Shortest duration a word can weigh in the recognition confidence (1 token)
+MIN_WORD_DURATION = 0.02
+
+_NON_LETTER = re.compile(r"[^a-z\s]")
+
+WORD_TABLE_COLUMNS = ["word", "start", "end", "confidence"]
+
+
+def normalize_words(text):
+    """Lowercase text, keep only letters and spaces, split into words"""
+    return _NON_LETTER.sub("", text.lower()).split()
+
+
+def empty_word_table():
+    """Word table with no rows (used when Whisper returns no words)"""
+    return pd.DataFrame(
+        {
+            "word": pd.Series([], dtype=object),
+            "start": np.zeros(0, dtype=np.float32),
+            "end": np.zeros(0, dtype=np.float32),
+            "confidence": np.zeros(0, dtype=np.float32),
+        }
+    )
+
+
+def build_word_table(segments, normalize=None):
+    """
+    Collect Whisper word timestamps into a compact per-word table
+    `normalize` (optional) turns one Whisper word into a list of words
+    ("I'm" -> i, am); the word's time span is split evenly between them.
+    Returns: DataFrame(word, start, end, confidence) with float32 columns
+    """
+    words = []
+    times = []
+
+    for segment in segments:
+        for item in segment.get("words", []):
+            if normalize is None:
+                pieces = _NON_LETTER.sub("", item["word"].lower()).split()
+            else:
+                pieces = normalize(item["word"])
+            if not pieces:
+                continue
+            start, end = item["start"], item["end"]
+            step = (end - start) / len(pieces)
+            for k, word in enumerate(pieces):
+                words.append(word)
+                times.append(
+                    (
+                        start + k * step,
+                        start + (k + 1) * step,
+                        item.get("probability", 0.0),
+                    )
+                )
+
+    if not words:
+        return empty_word_table()
+
+    times = np.asarray(times, dtype=np.float32)
+    return pd.DataFrame(
+        {
+            "word": words,
+            "start": times[:, 0],
+            "end": times[:, 1],
+            "confidence": times[:, 2],
+        }
+    )
+
+
+def recognition_confidence(word_table, segments):
+    """
+    Duration-weighted mean of Whisper word probabilities (0-1)
+    Falls back to exp(avg_logprob) per segment when there are no word timings
+    """
+    if len(word_table) > 0:
+        durations = np.maximum(
+            word_table["end"].to_numpy() - word_table["start"].to_numpy(),
+            MIN_WORD_DURATION,
+        )
+        return float(np.average(word_table["confidence"].to_numpy(), weights=durations))
+
+    if segments:
+        durations = [max(s["end"] - s["start"], MIN_WORD_DURATION) for s in segments]
+        probs = np.exp([s.get("avg_logprob", -np.inf) for s in segments])
+        return float(np.average(probs, weights=durations))
+
+    return 0.0
+
+
+def word_table_to_record(word_table):
+    """Compact JSON-friendly copy of a word table (for history storage)"""
+    if word_table is None:
+        return {}
+    return {
+        "word": word_table["word"].tolist(),
+        "start": np.round(word_table["start"].to_numpy(np.float64), 2).tolist(),
+        "end": np.round(word_table["end"].to_numpy(np.float64), 2).tolist(),
+        "confidence": np.round(
+            word_table["confidence"].to_numpy(np.float64), 3
+        ).tolist(),
+    }
+
+
+def word_ids(ref_words, hyp_words):
+    """
+    Map both word sequences onto integer IDs from one shared vocabulary
+    Returns: (ref_ids, hyp_ids)
+    """
+    vocabulary = {}
+    ref_ids = [vocabulary.setdefault(word, len(vocabulary)) for word in ref_words]
+    hyp_ids = [vocabulary.setdefault(word, len(vocabulary)) for word in hyp_words]
+    return ref_ids, hyp_ids
+
+
+def word_edit_ops(ref_words, hyp_words):
+    """
+    Full word-level alignment by edit distance, computed in C by
+    python-Levenshtein on integer word IDs (thousands of words in a few ms)
+    Returns: list of (op, ref_index, hyp_index); op is "match", "substitute",
+    "delete" (reference word not said) or "insert" (extra word), and None
+    marks the missing side
+    """
+    ops = []
+    for tag, i1, i2, j1, j2 in Levenshtein.opcodes(*word_ids(ref_words, hyp_words)):
+        if tag == "equal":
+            ops.extend(("match", i, j) for i, j in zip(range(i1, i2), range(j1, j2)))
+            continue
+        # A replace block may pair unequal runs; the surplus is a gap
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        ops.extend(("substitute", i1 + k, j1 + k) for k in range(paired))
+        ops.extend(("delete", i, None) for i in range(i1 + paired, i2))
+        ops.extend(("insert", None, j) for j in range(j1 + paired, j2))
+    return ops
+
+
+def word_error_rate(ops):
+    """
+    WER = (substitutions + deletions + insertions) / reference words
+    Returns: float (0 for an empty reference)
+    """
+    ref_count = sum(1 for _, i, _ in ops if i is not None)
+    errors = sum(1 for op, _, _ in ops if op != "match")
+    return errors / ref_count if ref_count else 0.0
+
+
+def force_align_reference(reference_words, word_table):
+    """
+    Map every reference word onto the recognized word timings
+
+    Returns: DataFrame(word, start, end, confidence, heard, status)
+    status is "match", "substitute" or "missing". Missing words get a
+    zero-length slot at the interpolated position and confidence 0.
+    """
+    n = len(reference_words)
+    hyp_words = word_table["word"].tolist()
+
+    # Exact alignment, so long skipped passages do not shift later words
+    hyp_index = np.full(n, -1, dtype=np.int64)
+    for op, i, j in word_edit_ops(reference_words, hyp_words):
+        if op in ("match", "substitute"):
+            hyp_index[i] = j
+
+    has_hyp = hyp_index >= 0
+    picked = hyp_index[has_hyp]
+
+    starts = np.zeros(n, dtype=np.float32)
+    ends = np.zeros(n, dtype=np.float32)
+    confidence = np.zeros(n, dtype=np.float32)
+    heard = np.full(n, "", dtype=object)
+
+    if picked.size:
+        starts[has_hyp] = word_table["start"].to_numpy()[picked]
+        ends[has_hyp] = word_table["end"].to_numpy()[picked]
+        heard[has_hyp] = np.asarray(hyp_words, dtype=object)[picked]
+
+        # Missing words sit where the neighbouring spoken words put them
+        positions = np.arange(n)
+        gap_times = np.interp(positions[~has_hyp], positions[has_hyp], starts[has_hyp])
+        starts[~has_hyp] = gap_times
+        ends[~has_hyp] = gap_times
+
+    is_match = has_hyp & (heard == np.asarray(reference_words, dtype=object))
+    if picked.size:
+        confidence[is_match] = word_table["confidence"].to_numpy()[hyp_index[is_match]]
+
+    status = np.where(is_match, "match", np.where(has_hyp, "substitute", "missing"))
+
+    return pd.DataFrame(
+        {
+            "word": list(reference_words),
+            "start": starts,
+            "end": ends,
+            "confidence": confidence,
+            "heard": heard,
+            "status": status,
+        }
+    )
+
+
+def create_word_timeline_chart(word_table, title="⏱️ Word Timeline"):
+    """Create per-word timeline chart (bar = word duration, color = confidence)"""
+    if word_table is None or len(word_table) == 0:
+        return None
+
+    starts = word_table["start"].to_numpy()
+    durations = np.maximum(word_table["end"].to_numpy() - starts, 0.02)
+    confidence = word_table["confidence"].to_numpy()
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Bar(
+            x=durations,
+            base=starts,
+            y=["Words"] * len(word_table),
+            orientation="h",
+            text=word_table["word"],
+            textposition="inside",
+            marker=dict(
+                color=confidence,
+                colorscale="RdYlGn",
+                cmin=0,
+                cmax=1,
+                colorbar=dict(title="Confidence"),
+            ),
+            customdata=np.stack([starts, starts + durations, confidence], axis=-1),
+            hovertemplate="<b>%{text}</b><br>%{customdata[0]:.2f}s - %{customdata[1]:.2f}s"
+            "<br>Confidence: %{customdata[2]:.0%}<extra></extra>",
+        )
+    )
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Time (seconds)",
+        yaxis=dict(showticklabels=False),
+        height=220,
+        showlegend=False,
+    )
+
+    return fig